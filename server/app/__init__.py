@@ -1,21 +1,112 @@
-from flask import Flask
+from contextlib import ExitStack
+
+from flask import Flask, current_app, g, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
-import os
+from sqlalchemy import event
+
+import sharding
+import storage
+from app.config import Config
+
+# Initialize extensions (bound to an app in create_app)
+db = SQLAlchemy()
+ma = Marshmallow()
+
+
+def _register_sqlite_pragmas(engine, pragmas):
+    """Run the configured PRAGMAs on every new SQLite connection"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def creates_shard(view):
+    """Mark a route that may create the shard of a new ?learner_id="""
+    view.creates_shard = True
+    return view
+
+
+def _lease_shard():
+    """Lease the ?learner_id= shard for the rest of the request
+
+    Answers 404 for a learner without a shard, unless the route adds words.
+    """
+    learner_id = request.args.get('learner_id')
+    shards = current_app.extensions['word_shards']
+    if learner_id is None or shards is None:
+        return None
+    view = current_app.view_functions.get(request.endpoint)
+    leases = g.word_shard_leases = ExitStack()
+    try:
+        g.word_shard = leases.enter_context(
+            shards.lease(learner_id, create=getattr(view, 'creates_shard', False)))
+    except (sharding.UnknownLearnerError, ValueError) as e:
+        status = 404 if isinstance(e, sharding.UnknownLearnerError) else 400
+        return jsonify({'status': 'error', 'message': str(e)}), status
+    return None
+
+
+def _release_shard(exc=None):
+    leases = g.pop('word_shard_leases', None)
+    if leases is not None:
+        leases.close()
+
+
+def get_store():
+    """Storage engine shared with the MCP server, or the ?learner_id= shard"""
+    if request.args.get('learner_id') is None:
+        return current_app.extensions['word_storage']
+    if 'word_shard' not in g:
+        raise ValueError('learner_id requires multi-learner mode (set WORDS_SHARD_DIR)')
+    return g.word_shard
+
+
+def create_app(config=None):
+    """Create and configure the Flask app
+
+    Args:
+        config: Optional Config instance; defaults to one read from the environment
+
+    Returns:
+        Configured Flask application
+    """
+    config = config or Config()
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    db.init_app(app)
+    ma.init_app(app)
 
-# Initialize Flask app
-app = Flask(__name__)
+    with app.app_context():
+        _register_sqlite_pragmas(db.engine, config.sqlite_pragmas)
 
-# Configure database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///english_words.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Routes read and write through the storage engine shared with mcp_server.py
+    word_storage = storage.get_storage(
+        config.WORDS_DB_PATH, pool_size=config.WORDS_DB_POOL_SIZE, pragmas=config.sqlite_pragmas)
+    word_storage.init_db()
+    if config.WORDS_MEMORY_REPLICA:
+        word_storage.start_replica()
+    app.extensions['word_storage'] = word_storage
+    # Per-learner shards, selected with ?learner_id= (None when the mode is off)
+    app.extensions['word_shards'] = sharding.get_router(
+        config.WORDS_SHARD_DIR, max_open=config.WORDS_SHARD_MAX_OPEN, pragmas=config.sqlite_pragmas)
+    app.before_request(_lease_shard)
+    app.teardown_request(_release_shard)
 
-# Initialize extensions
-db = SQLAlchemy(app)
-ma = Marshmallow(app)
+    # Import routes to register blueprints
+    from app.word_management import routes as word_routes
+    from app.learning_progress import routes as learning_routes
 
-# Import routes to register blueprints
-from app.word_management import routes as word_routes
+    # Register blueprints
+    app.register_blueprint(word_routes.word_bp, url_prefix='/api/words')
+    app.register_blueprint(learning_routes.learning_bp, url_prefix='/api/learning')
 
-# Register blueprints
-app.register_blueprint(word_routes.word_bp, url_prefix='/api/words') 
\ No newline at end of file
+    return app
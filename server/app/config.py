@@ -0,0 +1,78 @@
+import os
+
+import scheduling
+import sharding
+import storage
+
+
+def _env_int(name, default):
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default=False):
+    """Read a boolean setting from the environment"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Config:
+    """Application configuration read from the environment.
+
+    Every setting can be overridden with an environment variable of the same
+    name, so the same code serves development (``run.py``) and production
+    (``serve.py``) without edits.
+    """
+
+    def __init__(self):
+        self.DEBUG = _env_bool('FLASK_DEBUG', False)
+        # The word database shared with mcp_server.py through storage.py
+        self.WORDS_DB_PATH = os.path.abspath(os.environ.get('WORDS_DB_PATH', storage.DB_PATH))
+        self.WORDS_DB_POOL_SIZE = _env_int('WORDS_DB_POOL_SIZE', storage.POOL_SIZE)
+        # Serve word and schedule reads from an in-memory replica of the database
+        self.WORDS_MEMORY_REPLICA = _env_bool('WORDS_MEMORY_REPLICA', False)
+        # Multi-learner mode: one shard database per learner in this directory
+        self.WORDS_SHARD_DIR = os.environ.get('WORDS_SHARD_DIR') or None
+        self.WORDS_SHARD_MAX_OPEN = _env_int('WORDS_SHARD_MAX_OPEN', sharding.MAX_OPEN_SHARDS)
+        # Scheduler for study routes, as for mcp_server.py: 'sm2' or 'fsrs'
+        self.WORDS_SCHEDULER = os.environ.get('WORDS_SCHEDULER', 'sm2')
+        self.WORDS_FSRS_RETENTION = float(os.environ.get('WORDS_FSRS_RETENTION', scheduling.DEFAULT_RETENTION))
+        # Most words or reviews accepted by one batch request
+        self.WORDS_MAX_BATCH = _env_int('WORDS_MAX_BATCH', 1000)
+        self.SQLALCHEMY_DATABASE_URI = os.environ.get(
+            'DATABASE_URL', f"sqlite:///{self.WORDS_DB_PATH}")
+        self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+        # SQLite tuning, applied to every new DBAPI connection
+        self.SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+        self.SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+        self.SQLITE_MMAP_SIZE = _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        # Negative values are KiB, as documented for PRAGMA cache_size
+        self.SQLITE_CACHE_SIZE = _env_int('SQLITE_CACHE_SIZE', -64 * 1024)
+        self.SQLITE_BUSY_TIMEOUT = _env_int('SQLITE_BUSY_TIMEOUT', 5000)
+
+        self.SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': _env_int('DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _env_int('DB_POOL_RECYCLE', 3600),
+            'connect_args': {
+                # Connections are handed between request threads by the pool
+                'check_same_thread': False,
+                'timeout': self.SQLITE_BUSY_TIMEOUT / 1000.0,
+            },
+        }
+
+    @property
+    def sqlite_pragmas(self):
+        """PRAGMA statements run on connect, in order"""
+        return storage.sqlite_pragmas(
+            journal_mode=self.SQLITE_JOURNAL_MODE,
+            synchronous=self.SQLITE_SYNCHRONOUS,
+            mmap_size=self.SQLITE_MMAP_SIZE,
+            cache_size=self.SQLITE_CACHE_SIZE,
+            busy_timeout=self.SQLITE_BUSY_TIMEOUT,
+        )
@@ -0,0 +1,2 @@
+# Learning Progress package
+# This package handles the Learning Progress API functionality
\ No newline at end of file
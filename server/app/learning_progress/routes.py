@@ -0,0 +1,257 @@
+from flask import Blueprint, current_app, request, jsonify
+from datetime import datetime, timezone
+
+from app import get_store
+from scheduling import fsrs_retrievability, load_fsrs_weights, load_sm2_params, review_step
+from storage import format_timestamp, to_dicts
+
+# Blueprint for learning progress routes
+learning_bp = Blueprint('learning_progress', __name__)
+
+@learning_bp.route('/forecast', methods=['GET'])
+def get_review_forecast():
+    """
+    API endpoint for the number of reviews due on each upcoming day
+    ---
+    Implements the getReviewForecast functionality as defined in the MCP interface
+    """
+    try:
+        days = request.args.get('days', 7, type=int)
+
+        if days < 1 or days > 366:
+            return jsonify({
+                'status': 'error',
+                'message': 'days must be between 1 and 366'
+            }), 400
+
+        today = datetime.utcnow().date().isoformat()
+        forecast = get_store().get_review_forecast(today, days)
+
+        return jsonify({
+            'status': 'success',
+            'overdue': forecast['overdue'],
+            'days': forecast['days']
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@learning_bp.route('/progress', methods=['GET'])
+def get_learning_progress():
+    """
+    API endpoint for an overview of learning progress
+    ---
+    Implements the getLearningProgress functionality as defined in the MCP interface
+    """
+    try:
+        days = request.args.get('days', 30, type=int)
+
+        if days < 1 or days > 366:
+            return jsonify({
+                'status': 'error',
+                'message': 'days must be between 1 and 366'
+            }), 400
+
+        store = get_store()
+        today = datetime.utcnow().date().isoformat()
+        progress = store.get_learning_progress(today, days, load_sm2_params(store).pass_score)
+
+        return jsonify(dict({'status': 'success'}, **progress)), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def _parse_review(item):
+    """Validate one review object; returns (word_id, study_time, recall, studied_at)
+
+    ``studied_at`` is optional (default now) so clients that batch reviews
+    can report when each one actually happened.
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Each review must be an object')
+    word_id, study_time, recall = item.get('word_id'), item.get('study_time'), item.get('recall')
+    # bool is an int subclass; JSON true/false must not pass as 1/0
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (word_id, study_time, recall)):
+        raise ValueError('word_id, study_time and recall are required integers')
+    if not 1 <= recall <= 5:
+        raise ValueError('recall must be between 1 and 5')
+    if study_time < 0:
+        raise ValueError('study_time must not be negative')
+    studied_at = item.get('studied_at')
+    if studied_at is None:
+        studied_at = datetime.utcnow()
+    else:
+        studied_at = datetime.fromisoformat(studied_at)
+        if studied_at.tzinfo is not None:
+            studied_at = studied_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return word_id, study_time, recall, studied_at
+
+def _record_reviews(store, reviews):
+    """Schedule and store parsed reviews in one transaction, in order
+
+    Returns per-review results and errors for words that do not exist.
+    """
+    word_ids = [review[0] for review in reviews]
+    existing = {word.id for word in store.get_words(word_ids)}
+    schedules = store.get_schedules(word_ids)
+    scheduler = current_app.config['WORDS_SCHEDULER']
+    params = load_sm2_params(store)
+    weights = load_fsrs_weights(store) if scheduler == 'fsrs' else None
+
+    rows, results, errors = [], [], []
+    for index, (word_id, study_time, recall, studied_at) in enumerate(reviews):
+        if word_id not in existing:
+            errors.append({'index': index, 'word_id': word_id, 'message': f'Word with ID {word_id} not found'})
+            continue
+        step = review_step(schedules.get(word_id), recall, studied_at, scheduler, weights,
+                           current_app.config['WORDS_FSRS_RETENTION'], params)
+        studied, next_review = format_timestamp(studied_at), format_timestamp(step['next_review'])
+        rows.append((word_id, study_time, recall, studied, next_review, step['ease_factor'],
+                     step['interval'], step['stability'], step['difficulty']))
+        # Later reviews of the same word in this batch build on this one
+        schedules[word_id] = dict(step, next_review=next_review, last_review=studied)
+        result = {
+            'word_id': word_id,
+            'study_time': study_time,
+            'recall': recall,
+            'next_review': next_review,
+            'interval': step['interval'],
+            'ease_factor': step['ease_factor']
+        }
+        if scheduler == 'fsrs':
+            result['stability'] = step['stability']
+            result['difficulty'] = step['difficulty']
+        results.append(result)
+
+    if rows:
+        store.record_studies(rows)
+    return results, errors
+
+@learning_bp.route('/study', methods=['POST'])
+def track_word_study():
+    """
+    API endpoint for recording a study session and scheduling the next review
+    ---
+    Implements the trackWordStudy functionality as defined in the MCP interface
+    """
+    try:
+        try:
+            review = _parse_review(request.json)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        results, errors = _record_reviews(get_store(), [review])
+        if errors:
+            return jsonify({
+                'status': 'error',
+                'message': errors[0]['message']
+            }), 404
+
+        return jsonify(dict({
+            'status': 'success',
+            'message': 'Study session recorded'
+        }, **results[0])), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@learning_bp.route('/study/batch', methods=['POST'])
+def track_word_studies():
+    """
+    API endpoint for recording many study sessions in one request
+    ---
+    Reviews are applied in order and stored in one transaction; reviews of
+    unknown words are skipped and listed under errors
+    """
+    try:
+        reviews = (request.json or {}).get('reviews')
+        if not isinstance(reviews, list):
+            return jsonify({
+                'status': 'error',
+                'message': 'reviews must be a list'
+            }), 400
+
+        max_batch = current_app.config['WORDS_MAX_BATCH']
+        if len(reviews) > max_batch:
+            return jsonify({
+                'status': 'error',
+                'message': f'At most {max_batch} reviews per batch'
+            }), 400
+
+        try:
+            reviews = [_parse_review(item) for item in reviews]
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        results, errors = _record_reviews(get_store(), reviews)
+
+        return jsonify({
+            'status': 'success',
+            'message': f'Recorded {len(results)} study sessions',
+            'recorded': len(results),
+            'results': results,
+            'errors': errors
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@learning_bp.route('/review', methods=['GET'])
+def get_next_review_words():
+    """
+    API endpoint for the words to review next
+    ---
+    Implements the getNextReviewWords functionality as defined in the MCP interface
+    """
+    try:
+        count = request.args.get('count', 10, type=int)
+        cursor = request.args.get('cursor', 0, type=int)
+
+        if count < 1 or count > current_app.config['WORDS_MAX_BATCH']:
+            return jsonify({
+                'status': 'error',
+                'message': f"count must be between 1 and {current_app.config['WORDS_MAX_BATCH']}"
+            }), 400
+
+        if cursor < 0:
+            return jsonify({
+                'status': 'error',
+                'message': 'cursor must not be negative'
+            }), 400
+
+        # Served from today's review plan (Storage.plan_reviews)
+        fsrs = current_app.config['WORDS_SCHEDULER'] == 'fsrs'
+        now = datetime.utcnow()
+        words, cursor = get_store().get_planned_words(now.date().isoformat(), count, cursor, by_retrievability=fsrs)
+
+        if fsrs:
+            for word in words:
+                if word.get('stability') and word.get('last_review'):
+                    elapsed = (now - datetime.fromisoformat(word['last_review'])).total_seconds() / 86400
+                    word['retrievability'] = fsrs_retrievability(elapsed, word['stability'])
+
+        return jsonify({
+            'status': 'success',
+            'count': len(words),
+            'cursor': cursor,
+            'words': to_dicts(words)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
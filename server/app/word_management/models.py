@@ -1,7 +1,30 @@
 from app import db
 from datetime import datetime
+from sqlalchemy.types import BigInteger, TypeDecorator
 import json
 
+import storage
+
+
+class EpochTimestamp(TypeDecorator):
+    """UTC datetime stored as integer epoch milliseconds
+
+    Also reads the ISO text of databases not yet migrated with
+    ``manage.py migrate-timestamps``.
+    """
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return storage.to_epoch_ms(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, datetime):
+            return value
+        return datetime.fromisoformat(storage.from_epoch_ms(value))
+
+
 class Word(db.Model):
     """Model for English words and their related information."""
     
@@ -14,8 +37,8 @@ class Word(db.Model):
     definitions = db.Column(db.Text)   # Stored as JSON string
     examples = db.Column(db.Text)      # Stored as JSON string
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(EpochTimestamp, default=datetime.utcnow)
+    updated_at = db.Column(EpochTimestamp, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __init__(self, word, pronunciation=None, translations=None, definitions=None, 
                  examples=None, notes=None):
@@ -1,13 +1,15 @@
-from flask import Blueprint, request, jsonify
-from app import db
-from app.word_management.models import Word
+from flask import Blueprint, current_app, request, jsonify
+from app import creates_shard, get_store
 from app.word_management.schemas import word_schema, words_schema
+from indexes import word_changed, words_changed
+from storage import DuplicateWordError, ON_CONFLICT_ERROR, ON_CONFLICT_MODES, UPDATABLE_FIELDS, WordConflictError
 import json
 
 # Blueprint for word management routes
 word_bp = Blueprint('word_management', __name__)
 
 @word_bp.route('/', methods=['POST'])
+@creates_shard
 def save_word():
     """
     API endpoint for saving a new word
@@ -17,39 +19,113 @@ def save_word():
     try:
         # Get data from request
         data = request.json
-        
-        # Check if word already exists
-        existing_word = Word.query.filter_by(word=data.get('word')).first()
-        if existing_word:
+        on_conflict = request.args.get('on_conflict', ON_CONFLICT_ERROR)
+        if on_conflict not in ON_CONFLICT_MODES:
+            return jsonify({
+                'status': 'error',
+                'message': f"on_conflict must be one of {', '.join(ON_CONFLICT_MODES)}"
+            }), 400
+        store = get_store()
+
+        # Save to database (by default fails if the word already exists)
+        try:
+            word_id, created = store.upsert_word(data, on_conflict)
+        except DuplicateWordError as e:
             return jsonify({
                 'status': 'error',
                 'message': 'Word already exists',
-                'word_id': existing_word.id
+                'word_id': e.word_id
             }), 409
-        
-        # Create new word instance
-        word = Word(
-            word=data.get('word'),
-            pronunciation=data.get('pronunciation'),
-            translations=data.get('translations'),
-            definitions=data.get('definitions'),
-            examples=data.get('examples'),
-            notes=data.get('notes')
-        )
-        
-        # Save to database
-        db.session.add(word)
-        db.session.commit()
-        
+        word_changed(store, word_id)
+
         # Return response
         return jsonify({
             'status': 'success',
-            'message': 'Word saved successfully',
-            'word_id': word.id,
-            'word': word_schema.dump(word)
+            'message': 'Word saved successfully' if created else f'Existing word updated ({on_conflict})',
+            'word_id': word_id,
+            'created': created,
+            'word': word_schema.dump(store.get_word(word_id))
+        }), 201 if created else 200
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@word_bp.route('/batch', methods=['POST'])
+@creates_shard
+def save_words():
+    """
+    API endpoint for saving many words in one request
+    ---
+    Saves every word in one transaction. Words that already exist (or
+    repeat within the batch) are skipped and listed in the response, or
+    with ?on_conflict=merge|replace merged into or replacing the stored word
+    """
+    try:
+        data = request.json or {}
+        words = data.get('words')
+
+        if not isinstance(words, list) or not all(isinstance(word, dict) and word.get('word') for word in words):
+            return jsonify({
+                'status': 'error',
+                'message': 'words must be a list of objects with a word field'
+            }), 400
+
+        max_batch = current_app.config['WORDS_MAX_BATCH']
+        if len(words) > max_batch:
+            return jsonify({
+                'status': 'error',
+                'message': f'At most {max_batch} words per batch'
+            }), 400
+
+        on_conflict = request.args.get('on_conflict', ON_CONFLICT_ERROR)
+        if on_conflict not in ON_CONFLICT_MODES:
+            return jsonify({
+                'status': 'error',
+                'message': f"on_conflict must be one of {', '.join(ON_CONFLICT_MODES)}"
+            }), 400
+
+        store = get_store()
+        result = store.save_words(words, on_conflict)
+        words_changed(store, [*result['saved'].values(), *result['updated'].values()])
+
+        return jsonify({
+            'status': 'success',
+            'message': f"Saved {len(result['saved'])} words",
+            'saved': result['saved'],
+            'updated': result['updated'],
+            'skipped': result['skipped']
         }), 201
     except Exception as e:
-        db.session.rollback()
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@word_bp.route('/changes', methods=['GET'])
+def get_changes():
+    """
+    API endpoint for incremental sync
+    ---
+    Implements the getChangesSince functionality as defined in the MCP
+    interface: changes after ?cursor= (default 0), at most ?limit= log
+    entries (default 500)
+    """
+    try:
+        cursor = request.args.get('cursor', 0, type=int)
+        limit = request.args.get('limit', 500, type=int)
+        if cursor < 0 or not 1 <= limit <= 5000:
+            return jsonify({
+                'status': 'error',
+                'message': 'cursor must not be negative and limit must be between 1 and 5000'
+            }), 400
+
+        return jsonify({
+            'status': 'success',
+            **get_store().get_changes(cursor, limit)
+        }), 200
+    except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
@@ -64,14 +140,14 @@ def get_word(word_id):
     """
     try:
         # Find word by ID
-        word = Word.query.get(word_id)
-        
+        word = get_store().get_word(word_id)
+
         if not word:
             return jsonify({
                 'status': 'error',
                 'message': 'Word not found'
             }), 404
-        
+
         # Return word information
         return jsonify({
             'status': 'success',
@@ -93,22 +169,22 @@ def search_word_by_text():
     try:
         # Get word text from query parameter
         word_text = request.args.get('word')
-        
+
         if not word_text:
             return jsonify({
                 'status': 'error',
                 'message': 'Word parameter is required'
             }), 400
-        
+
         # Find word by text
-        word = Word.query.filter_by(word=word_text).first()
-        
+        word = get_store().get_word_by_text(word_text)
+
         if not word:
             return jsonify({
                 'status': 'error',
                 'message': 'Word not found'
             }), 404
-        
+
         # Return word information
         return jsonify({
             'status': 'success',
@@ -120,58 +196,86 @@ def search_word_by_text():
             'message': str(e)
         }), 500
 
-@word_bp.route('/<int:word_id>', methods=['PUT'])
+@word_bp.route('/<int:word_id>', methods=['PUT', 'PATCH'])
 def update_word(word_id):
     """
     API endpoint for updating a word
     ---
-    Implements the updateWord functionality as defined in the MCP interface
+    Implements the updateWord functionality as defined in the MCP interface:
+    either fieldToUpdate/newValue (returns the whole word), or changes, a
+    mapping of fields updated together (returns only those), optionally
+    with expected_updated_at
     """
     try:
         # Get data from request
-        data = request.json
-        
-        # Find word by ID
-        word = Word.query.get(word_id)
-        
-        if not word:
+        data = request.json or {}
+        store = get_store()
+
+        if 'changes' in data:
+            changes = data.get('changes')
+            if not isinstance(changes, dict) or not changes:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'changes must be an object of fields to update'
+                }), 400
+        else:
+            # Get field to update and new value
+            field_to_update = data.get('fieldToUpdate')
+            new_value = data.get('newValue')
+
+            if not field_to_update or new_value is None:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'fieldToUpdate and newValue, or changes, are required'
+                }), 400
+            changes = {field_to_update: new_value}
+
+        # Check if fields exist in the model
+        invalid = [field for field in changes if field not in UPDATABLE_FIELDS]
+        if invalid:
             return jsonify({
                 'status': 'error',
-                'message': 'Word not found'
-            }), 404
-        
-        # Get field to update and new value
-        field_to_update = data.get('fieldToUpdate')
-        new_value = data.get('newValue')
-        
-        if not field_to_update or new_value is None:
+                'message': f"Invalid field: {', '.join(invalid)}"
+            }), 400
+
+        # Update every field in one statement
+        try:
+            updated = store.patch_word(word_id, changes, data.get('expected_updated_at'))
+        except WordConflictError as e:
             return jsonify({
                 'status': 'error',
-                'message': 'fieldToUpdate and newValue are required'
-            }), 400
-        
-        # Check if field exists in the model
-        if field_to_update not in ['word', 'pronunciation', 'translations', 
-                                 'definitions', 'examples', 'notes']:
+                'message': 'Word was changed since expected_updated_at',
+                'updated_at': e.updated_at
+            }), 409
+        except DuplicateWordError as e:
             return jsonify({
                 'status': 'error',
-                'message': f'Invalid field: {field_to_update}'
-            }), 400
-        
-        # Update field
-        word.update_field(field_to_update, new_value)
-        
-        # Save changes
-        db.session.commit()
-        
+                'message': 'Word already exists',
+                'word_id': e.word_id
+            }), 409
+        if updated is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Word not found'
+            }), 404
+        word_changed(store, word_id)
+
+        if 'changes' in data:
+            return jsonify({
+                'status': 'success',
+                'message': 'Word updated successfully',
+                'word_id': word_id,
+                'updated_at': updated['updated_at'],
+                'changed': {field: updated[field] for field in changes}
+            }), 200
+
         # Return updated word
         return jsonify({
             'status': 'success',
             'message': 'Word updated successfully',
-            'word': word_schema.dump(word)
+            'word': word_schema.dump(store.get_word(word_id))
         }), 200
     except Exception as e:
-        db.session.rollback()
         return jsonify({
             'status': 'error',
             'message': str(e)
@@ -181,7 +285,7 @@ def update_word(word_id):
 def get_all_words():
     """API endpoint for retrieving all words"""
     try:
-        words = Word.query.all()
+        words = get_store().get_all_words()
         return jsonify({
             'status': 'success',
             'count': len(words),
@@ -191,4 +295,4 @@ def get_all_words():
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
\ No newline at end of file
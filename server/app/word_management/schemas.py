@@ -1,8 +1,14 @@
 from app import ma
 from app.word_management.models import Word
+from storage import WordRecord
 from marshmallow import fields, post_load, pre_dump
+from datetime import datetime
 import json
 
+def _isoformat(value):
+    """Render model timestamps the way the storage engine stores them."""
+    return value.isoformat() if isinstance(value, datetime) else value
+
 class WordSchema(ma.SQLAlchemyAutoSchema):
     """Schema for Word model serialization/deserialization."""
     
@@ -15,6 +21,10 @@ class WordSchema(ma.SQLAlchemyAutoSchema):
     translations = fields.List(fields.String(), required=False)
     definitions = fields.List(fields.String(), required=False)
     examples = fields.List(fields.String(), required=False)
+
+    # Timestamps arrive as ISO strings from the storage engine
+    created_at = fields.String()
+    updated_at = fields.String()
     
     # Add URL for the resource
     url = ma.URLFor('word_management.get_word', values=dict(word_id='<id>'))
@@ -22,6 +32,9 @@ class WordSchema(ma.SQLAlchemyAutoSchema):
     @pre_dump
     def _pre_dump(self, word, **kwargs):
         """Convert JSON strings to Python lists before serialization."""
+        if isinstance(word, (dict, WordRecord)):
+            # From the storage engine; records decode their fields as they are read
+            return word
         word_dict = {
             'id': word.id,
             'word': word.word,
@@ -30,8 +43,8 @@ class WordSchema(ma.SQLAlchemyAutoSchema):
             'definitions': word.get_definitions(),
             'examples': word.get_examples(),
             'notes': word.notes,
-            'created_at': word.created_at,
-            'updated_at': word.updated_at
+            'created_at': _isoformat(word.created_at),
+            'updated_at': _isoformat(word.updated_at)
         }
         return word_dict
 
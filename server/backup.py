@@ -0,0 +1,297 @@
+"""Online backups with the SQLite backup API
+
+``backup_database`` copies a live database page range by page range
+(``sqlite3.Connection.backup`` with ``pages`` per step and a pause between
+steps), so each step holds its read snapshot only briefly and servers keep
+reading and writing. SQLite restarts a stepwise copy whenever another
+connection writes to the source; after ``max_restarts`` restarts the rest
+is copied in one step, which in WAL mode still does not block writers (they
+append to the WAL while the copy reads its snapshot).
+
+Each backup is a self-contained generation ``<name>-<UTC time>.db`` (or
+``.db.gz``) in the backup directory; the newest ``keep`` are kept. A lock
+file makes concurrent backups of one database (several server processes,
+cron) take turns. ``verify_backup`` runs ``PRAGMA integrity_check`` on a
+generation and ``restore_backup`` copies a verified generation back with the
+backup API.
+
+``BackupScheduler`` runs backups in a background thread every
+``WORDS_BACKUP_INTERVAL_MINUTES``; a generation younger than the interval
+(written by another process) counts as done.
+"""
+import fcntl
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from storage import SELECT_WORDS_VERSION
+
+# Directory for generations (default: backups/ next to the database)
+BACKUP_DIR = os.environ.get('WORDS_BACKUP_DIR')
+
+# Generations kept per database
+BACKUP_KEEP = int(os.environ.get('WORDS_BACKUP_KEEP', 7))
+
+# Pages copied per step, and milliseconds to pause between steps
+BACKUP_PAGES = int(os.environ.get('WORDS_BACKUP_PAGES', 256))
+BACKUP_PAUSE = int(os.environ.get('WORDS_BACKUP_PAUSE_MS', 5)) / 1000
+
+# gzip generations
+BACKUP_COMPRESS = os.environ.get('WORDS_BACKUP_COMPRESS', '').lower() in ('1', 'true', 'yes')
+
+# Minutes between scheduled backups; 0 turns the scheduler off
+BACKUP_INTERVAL = float(os.environ.get('WORDS_BACKUP_INTERVAL_MINUTES', 0))
+
+# Restarts caused by concurrent writes before the rest is copied in one step
+MAX_RESTARTS = 3
+
+_STAMP_FORMAT = '%Y%m%dT%H%M%S%fZ'
+
+UPDATE_WORDS_VERSION = 'UPDATE words_version SET n = ? WHERE id = 1'
+
+
+def backup_dir_for(path: str) -> str:
+    return BACKUP_DIR or os.path.join(os.path.dirname(os.path.abspath(path)), 'backups')
+
+
+def _prefix(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0] + '-'
+
+
+def list_backups(path: str, directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Generations of a database, newest first"""
+    directory = directory or backup_dir_for(path)
+    files = [name for name in glob.glob(os.path.join(glob.escape(directory), glob.escape(_prefix(path)) + '*'))
+             if name.endswith(('.db', '.db.gz'))]
+    backups = []
+    for name in sorted(files, reverse=True):
+        stamp = os.path.basename(name)[len(_prefix(path)):].split('.', 1)[0]
+        try:
+            created = datetime.strptime(stamp, _STAMP_FORMAT)
+        except ValueError:
+            continue
+        backups.append({"path": name, "created_at": created.isoformat(), "bytes": os.path.getsize(name)})
+    return backups
+
+
+@contextmanager
+def _backup_lock(directory: str, path: str):
+    with open(os.path.join(directory, f".{_prefix(path)}lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _fsync(path: str):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def backup_database(path: str, directory: Optional[str] = None, pages: int = BACKUP_PAGES,
+                    pause: float = BACKUP_PAUSE, compress: bool = BACKUP_COMPRESS, keep: int = BACKUP_KEEP,
+                    max_restarts: int = MAX_RESTARTS, log=None) -> Dict[str, Any]:
+    """Copy a live database into a new generation and drop the oldest ones
+
+    Args:
+        path: Database to back up
+        directory: Where generations go (default: backup_dir_for(path))
+        pages: Pages copied per step (-1: everything in one step)
+        pause: Seconds between steps, leaving the database to the servers
+        compress: gzip the generation
+        keep: Generations kept; older ones are deleted
+        max_restarts: Restarts by concurrent writes before the rest of the
+            copy is done in one step
+        log: Optional callable receiving progress messages
+
+    Returns:
+        The generation's path and size, pages copied, steps, restarts,
+        seconds taken and generations deleted
+    """
+    directory = directory or backup_dir_for(path)
+    os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    started = time.perf_counter()
+    stamp = datetime.utcnow().strftime(_STAMP_FORMAT)
+    final = os.path.join(directory, f"{_prefix(path)}{stamp}.db" + ('.gz' if compress else ''))
+    partial = os.path.join(directory, f".{_prefix(path)}{stamp}.partial")
+    progress = {"steps": 0, "restarts": 0, "remaining": None, "total": 0}
+
+    def on_step(status, remaining, total):
+        progress["steps"] += 1
+        # More left than after the last step: a write elsewhere restarted the copy
+        if progress["remaining"] is not None and remaining > progress["remaining"]:
+            progress["restarts"] += 1
+        progress["remaining"], progress["total"] = remaining, total
+        if log and progress["steps"] % 100 == 0:
+            log(f"backup: {total - remaining} of {total} pages")
+        if progress["restarts"] >= max_restarts:
+            # Stop stepping: the rest is copied below in one step
+            raise _Restarted()
+        if remaining and pause > 0:
+            time.sleep(pause)
+
+    with _backup_lock(directory, path):
+        source = sqlite3.connect(path, timeout=30)
+        target = sqlite3.connect(partial)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=on_step)
+            except _Restarted:
+                if log:
+                    log(f"backup: restarted {progress['restarts']} times by writes, copying the rest in one step")
+                source.backup(target, pages=-1)
+            # A self-contained file: no WAL needed next to it
+            target.execute("PRAGMA journal_mode=DELETE")
+            total_pages = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        try:
+            if compress:
+                with open(partial, 'rb') as raw, gzip.open(partial + '.gz', 'wb', compresslevel=6) as packed:
+                    shutil.copyfileobj(raw, packed, 1 << 20)
+                os.remove(partial)
+                partial += '.gz'
+            _fsync(partial)
+            os.replace(partial, final)
+        except BaseException:
+            for leftover in (partial, partial[:-3] if partial.endswith('.gz') else None):
+                if leftover and os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        deleted = [backup["path"] for backup in list_backups(path, directory)[max(keep, 1):]]
+        for old in deleted:
+            os.remove(old)
+    return {
+        "path": final,
+        "bytes": os.path.getsize(final),
+        "pages": total_pages,
+        "steps": progress["steps"],
+        "restarts": progress["restarts"],
+        "seconds": round(time.perf_counter() - started, 3),
+        "deleted": deleted,
+    }
+
+
+class _Restarted(Exception):
+    pass
+
+
+@contextmanager
+def _opened_backup(backup_path: str):
+    """Path of a plain database file holding the generation (decompressed to a temp file)"""
+    if not backup_path.endswith('.gz'):
+        yield backup_path
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, 'restore.db')
+        with gzip.open(backup_path, 'rb') as packed, open(plain, 'wb') as raw:
+            shutil.copyfileobj(packed, raw, 1 << 20)
+        yield plain
+
+
+def verify_backup(backup_path: str) -> Dict[str, Any]:
+    """Integrity check of a generation, with its table sizes"""
+    with _opened_backup(backup_path) as plain:
+        conn = sqlite3.connect(f"file:{plain}?mode=ro", uri=True)
+        try:
+            problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            ok = problems == ['ok']
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            counts = {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables} \
+                if ok else {}
+            user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+    return {"path": backup_path, "ok": ok, "problems": [] if ok else problems[:20],
+            "user_version": user_version, "rows": counts}
+
+
+def restore_backup(backup_path: str, target: str) -> Dict[str, Any]:
+    """Verify a generation and copy it over ``target`` with the backup API
+
+    Servers using ``target`` can stay up: the copy takes the database's
+    write lock and they see the restored contents with their next
+    transaction. ``words_version`` is moved past both the live and the
+    restored count, so their row caches and in-memory indexes reload.
+
+    Raises:
+        ValueError: if the generation fails its integrity check
+    """
+    verified = verify_backup(backup_path)
+    if not verified["ok"]:
+        raise ValueError(f"Backup {backup_path} failed its integrity check: {verified['problems']}")
+    started = time.perf_counter()
+    with _opened_backup(backup_path) as plain:
+        source = sqlite3.connect(f"file:{plain}?mode=ro", uri=True)
+        destination = sqlite3.connect(target, timeout=30)
+        try:
+            live_version = _words_version(destination)
+            source.backup(destination)
+            restored_version = _words_version(destination)
+            if restored_version is not None:
+                destination.execute(UPDATE_WORDS_VERSION, (max(live_version or 0, restored_version) + 2,))
+                destination.commit()
+        finally:
+            destination.close()
+            source.close()
+    return {"restored": backup_path, "target": target, "rows": verified["rows"],
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def _words_version(conn: sqlite3.Connection) -> Optional[int]:
+    try:
+        row = conn.execute(SELECT_WORDS_VERSION).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+class BackupScheduler:
+    """Backs a database up every ``interval`` seconds in a daemon thread"""
+
+    def __init__(self, path: str, interval: float, log=None, **options):
+        self.path = path
+        self.interval = interval
+        self.options = options
+        self.log = log
+        self.last: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='backup', daemon=True)
+        self._thread.start()
+
+    def _due_in(self) -> float:
+        """Seconds until the next backup is due, judged by the newest generation"""
+        newest = list_backups(self.path, self.options.get('directory'))
+        if not newest:
+            return 0.0
+        age = (datetime.utcnow() - datetime.fromisoformat(newest[0]["created_at"])).total_seconds()
+        return max(0.0, self.interval - age)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                wait = self._due_in()
+                if wait <= 0:
+                    self.last = backup_database(self.path, **self.options)
+                    wait = self.interval
+                    if self.log:
+                        self.log(f"backup: wrote {self.last['path']} in {self.last['seconds']} s")
+            except Exception as e:
+                wait = min(self.interval, 300)
+                if self.log:
+                    self.log(f"backup failed: {e}")
+            self._stop.wait(wait)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,135 @@
+"""Request latency while an online backup runs
+
+Seeds a throwaway database with ``--words`` words and their study history,
+then keeps ``--threads`` threads issuing requests (a due-words read or a
+recorded review, alternately) and reports p50/p99/max request latency with
+no backup running and while ``backup_database`` copies the database:
+stepwise (``--pages`` per step, ``--pause-ms`` between steps) and in one
+step. For each backup it also reports how long it took and how often the
+clients' writes restarted the stepwise copy.
+
+    python bench_backup.py --words 100000 --threads 4
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import storage
+from backup import backup_database
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark request latency during online backups')
+    parser.add_argument('--words', type=int, default=100000,
+                      help='Number of words to seed')
+    parser.add_argument('--threads', type=int, default=4,
+                      help='Threads issuing requests')
+    parser.add_argument('--pages', type=int, default=256,
+                      help='Pages per step of the stepwise backup')
+    parser.add_argument('--pause-ms', type=float, default=5,
+                      help='Pause between steps of the stepwise backup')
+    parser.add_argument('--baseline-seconds', type=float, default=5,
+                      help='Duration of the run without a backup')
+    parser.add_argument('--compress', action='store_true',
+                      help='gzip the backups')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+def text(rng, words):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(words))
+
+
+def seed(store, count, rng):
+    for start in range(0, count, 5000):
+        store.save_words([{
+            "word": f"{text(rng, 1)}{i}",
+            "translations": [text(rng, 2)],
+            "definitions": [text(rng, 12)],
+            "examples": [text(rng, 10)],
+        } for i in range(start, min(start + 5000, count))])
+    now = datetime.utcnow()
+    store.record_studies([
+        (word_id, 30, 3, storage.format_timestamp(now - timedelta(days=2)),
+         storage.format_timestamp(now + timedelta(hours=rng.randint(-48, 48))), 2.5, 1)
+        for word_id in range(1, count + 1)])
+
+
+def load(store, args, done: threading.Event, seconds=None):
+    """Issue requests from all threads until ``done`` is set (or for ``seconds``); returns latencies"""
+    latencies = []
+    deadline = time.perf_counter() + seconds if seconds else None
+
+    def work(t):
+        rng = random.Random(t)
+        mine = []
+        i = 0
+        while not done.is_set() and (deadline is None or time.perf_counter() < deadline):
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            if i % 2:
+                store.record_study(rng.randint(1, args.words), 30, rng.randint(1, 5), storage.format_timestamp(now),
+                                   storage.format_timestamp(now + timedelta(days=1)), 2.5, 1)
+            else:
+                store.get_due_words(storage.format_timestamp(now), 10)
+            mine.append(time.perf_counter() - started)
+            i += 1
+        latencies.extend(mine)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def show(label, latencies, extra=''):
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{label:<16} {len(latencies):>9} {q[49] * 1000:>8.2f} {q[98] * 1000:>8.2f} "
+          f"{max(latencies) * 1000:>8.1f}  {extra}")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        store = storage.Storage(path)
+        store.init_db()
+        seed(store, args.words, rng)
+        print(f"{args.words} words, {os.path.getsize(path) / 1e6:.0f} MB, {args.threads} threads, "
+              f"{os.cpu_count()} CPUs\n")
+        print(f"{'backup':<16} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        show('none', load(store, args, threading.Event(), args.baseline_seconds))
+
+        for label, pages, pause in (('stepwise', args.pages, args.pause_ms / 1000), ('one step', -1, 0)):
+            done = threading.Event()
+            result = {}
+
+            def run_backup():
+                try:
+                    result.update(backup_database(path, os.path.join(tmp, 'backups'), pages=pages, pause=pause,
+                                                  compress=args.compress, keep=1))
+                finally:
+                    done.set()
+
+            backup = threading.Thread(target=run_backup)
+            backup.start()
+            latencies = load(store, args, done)
+            backup.join()
+            show(label, latencies, f"{result['seconds']:.1f} s, {result['steps']} steps, "
+                                   f"{result['restarts']} restarts")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
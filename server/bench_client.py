@@ -0,0 +1,119 @@
+"""Throughput benchmark for word_client against a local server
+
+Starts ``serve.py`` on a throwaway database and performs the same work (save
+N words, then record N reviews) four ways:
+
+- plain: module-level ``requests.post`` per call, as example_client.py did
+  (a new TCP connection every time)
+- pooled: ``WordClient``, one call after another on keep-alive connections
+- async: ``AsyncWordClient`` with ``--concurrency`` calls in flight
+- batched: ``BatchWriter``, ``--batch-size`` items per request
+
+    python bench_client.py --operations 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+from bench_serving import start_server, stop_server, wait_for_server
+from word_client import AsyncWordClient, BatchWriter, WordClient
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark word_client modes against serve.py')
+    parser.add_argument('--operations', type=int, default=2000,
+                      help='Words saved and reviews recorded per mode')
+    parser.add_argument('--concurrency', type=int, default=32,
+                      help='Calls in flight for the async client')
+    parser.add_argument('--batch-size', type=int, default=100,
+                      help='Items per request for the batch writer')
+    parser.add_argument('--port', type=int, default=5077,
+                      help='Port for the benchmark server')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Worker processes for serve.py (default: serve.py default)')
+    return parser.parse_args()
+
+
+def word(mode, i):
+    return {"word": f"{mode}-word{i}", "translations": ["基准"], "definitions": [f"benchmark word {i}"],
+            "examples": [f"Sentence {i}."]}
+
+
+def run_plain(base_url, n):
+    ids = []
+    for i in range(n):
+        ids.append(requests.post(f"{base_url}/api/words/", json=word('plain', i)).json()['word_id'])
+    for i in range(n):
+        requests.post(f"{base_url}/api/learning/study",
+                      json={"word_id": ids[i], "study_time": 30, "recall": 1 + i % 5}).raise_for_status()
+
+
+def run_pooled(base_url, n):
+    with WordClient(base_url) as client:
+        ids = [client.save_word(**word('pooled', i))['id'] for i in range(n)]
+        for i in range(n):
+            client.record_study(ids[i], 30, 1 + i % 5)
+
+
+def run_async(base_url, n, concurrency):
+    async def work():
+        async with AsyncWordClient(base_url, concurrency=concurrency) as client:
+            saved = await asyncio.gather(*(client.save_word(**word('async', i)) for i in range(n)))
+            await asyncio.gather(*(client.record_study(w['id'], 30, 1 + i % 5) for i, w in enumerate(saved)))
+    asyncio.run(work())
+
+
+def run_batched(base_url, n, batch_size):
+    with WordClient(base_url) as client:
+        with BatchWriter(client, batch_size=batch_size) as batch:
+            for i in range(n):
+                batch.save_word(**word('batched', i))
+        # The writer does not return IDs; one listing request finds them
+        ids = [w['id'] for w in client.get_all_words() if w['word'].startswith('batched-')]
+        with BatchWriter(client, batch_size=batch_size) as batch:
+            for i in range(n):
+                batch.record_study(ids[i], 30, 1 + i % 5)
+    if batch.totals['recorded'] != n:
+        raise RuntimeError(f"recorded {batch.totals['recorded']} of {n} reviews")
+
+
+def main():
+    args = parse_args()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, WORDS_DB_PATH=os.path.join(tmp, 'bench.db'))
+        command = [sys.executable, 'serve.py', '--bind', f"127.0.0.1:{args.port}"]
+        if args.workers:
+            command += ['--workers', str(args.workers)]
+        server = start_server(command, env)
+        try:
+            wait_for_server(base_url)
+            modes = [
+                ('plain', lambda: run_plain(base_url, args.operations)),
+                ('pooled', lambda: run_pooled(base_url, args.operations)),
+                (f'async x{args.concurrency}', lambda: run_async(base_url, args.operations, args.concurrency)),
+                (f'batched x{args.batch_size}', lambda: run_batched(base_url, args.operations, args.batch_size)),
+            ]
+            print(f"{args.operations} saves + {args.operations} reviews per mode, {os.cpu_count()} CPUs\n")
+            print(f"{'mode':<14} {'seconds':>8} {'ops/s':>9} {'vs plain':>9}")
+            baseline = None
+            for label, run in modes:
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+                rate = 2 * args.operations / elapsed
+                baseline = baseline or rate
+                print(f"{label:<14} {elapsed:>8.2f} {rate:>9.0f} {rate / baseline:>8.1f}x")
+        finally:
+            stop_server(server)
+
+
+if __name__ == '__main__':
+    main()
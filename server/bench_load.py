@@ -0,0 +1,289 @@
+"""End-to-end load generator replaying simulated study traffic
+
+Starts the Flask app (``serve.py``) or ``mcp_server.py --transport sse`` on a
+throwaway database and runs N concurrent simulated learners against it. Each
+learner saves some words, then loops until the phase ends: ask for the words
+due (getNextReviewWords), study each one (trackWordStudy) with a recall score
+drawn from ``--recall-weights``, and now and then save a new word (saveWord).
+Every learner has one call in flight at a time, like a real client.
+
+Each ``--learners`` level is a separate phase. For every tool it reports
+calls, throughput, error rate and p50/p95/p99 latency, then a summary of
+total throughput per level that marks where adding learners stops adding
+throughput (the saturation point).
+
+    python bench_load.py --target flask --learners 1,4,16,64 --duration 15
+    python bench_load.py --target mcp --learners 1,8,32 --sharded
+    python bench_load.py --url http://127.0.0.1:5000 --target flask   (running server)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from bench_serving import start_server, stop_server
+from word_client import AsyncWordClient
+
+TOOLS = ('saveWord', 'getNextReviewWords', 'trackWordStudy')
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Replay simulated study traffic against the API or MCP server')
+    parser.add_argument('--target', choices=['flask', 'mcp'], default='flask',
+                      help='Server to load: serve.py or mcp_server.py --transport sse')
+    parser.add_argument('--learners', type=str, default='1,4,16',
+                      help='Comma-separated concurrent learner counts, one phase each')
+    parser.add_argument('--duration', type=float, default=10.0,
+                      help='Seconds per phase')
+    parser.add_argument('--words-per-learner', type=int, default=20,
+                      help='Words each learner saves before studying')
+    parser.add_argument('--review-batch', type=int, default=10,
+                      help='Words asked for per getNextReviewWords call')
+    parser.add_argument('--recall-weights', type=str, default='5,10,25,35,25',
+                      help='Relative frequency of recall scores 1-5')
+    parser.add_argument('--new-word-rate', type=float, default=0.2,
+                      help='Chance of saving a new word after each review round')
+    parser.add_argument('--think-time', type=float, default=0.0,
+                      help='Mean seconds a learner waits between calls (exponential)')
+    parser.add_argument('--sharded', action='store_true',
+                      help='Multi-learner mode: every learner in their own shard (learner_id)')
+    parser.add_argument('--url', type=str, default=None,
+                      help='Load an already running server instead of starting one')
+    parser.add_argument('--port', type=int, default=5078,
+                      help='Port for the server started by this tool')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Worker processes for serve.py (default: serve.py default)')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+class FlaskLearner:
+    """One learner talking to the REST API"""
+
+    def __init__(self, base_url, learner_id):
+        self.client = AsyncWordClient(base_url, learner_id=learner_id, retries=0, concurrency=1)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.close()
+
+    async def save_word(self, text):
+        return (await self.client.save_word(text, translations=['负载'], definitions=[f'load test word {text}']))['id']
+
+    async def due_words(self, count):
+        return [word['id'] for word in await self.client.get_review_words(count)]
+
+    async def study(self, word_id, study_time, recall):
+        await self.client.record_study(word_id, study_time, recall)
+
+
+class MCPLearner:
+    """One learner with its own MCP session over SSE"""
+
+    def __init__(self, base_url, learner_id):
+        self.url = f"{base_url}/sse"
+        self.learner_id = learner_id
+        self._contexts = []
+
+    async def __aenter__(self):
+        from mcp import ClientSession
+        from mcp.client.sse import sse_client
+
+        streams = sse_client(self.url, timeout=30)
+        read, write = await streams.__aenter__()
+        self._contexts.append(streams)
+        session = ClientSession(read, write)
+        self.session = await session.__aenter__()
+        self._contexts.append(session)
+        await self.session.initialize()
+        return self
+
+    async def __aexit__(self, *exc):
+        while self._contexts:
+            await self._contexts.pop().__aexit__(None, None, None)
+
+    async def _call(self, tool, **params):
+        if self.learner_id is not None:
+            params['learner_id'] = self.learner_id
+        result = await self.session.call_tool(tool, params)
+        payload = json.loads(result.content[0].text) if result.content else {}
+        if result.isError or payload.get('status') != 'success':
+            raise RuntimeError(f"{tool}: {payload.get('message') or payload}")
+        return payload
+
+    async def save_word(self, text):
+        payload = await self._call('saveWord', word=text, pronunciation='', translations=['负载'],
+                                   definitions=[f'load test word {text}'], examples=[], notes='')
+        return payload['word_id']
+
+    async def due_words(self, count):
+        return [word['id'] for word in (await self._call('getNextReviewWords', count=count))['words']]
+
+    async def study(self, word_id, study_time, recall):
+        await self._call('trackWordStudy', word_id=word_id, studyTime=study_time, recall=recall)
+
+
+class Stats:
+    """Latencies and errors per tool"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.messages = {}
+
+    async def timed(self, tool, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        except Exception as e:
+            self.errors[tool] += 1
+            self.messages.setdefault(tool, str(e))
+            return None
+        finally:
+            self.latencies[tool].append(time.perf_counter() - started)
+
+
+async def simulate_learner(learner_class, base_url, name, learner_id, args, stats, deadline, rng):
+    weights = [float(w) for w in args.recall_weights.split(',')]
+    word_count = 0
+
+    async def think():
+        if args.think_time > 0:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+    async def save():
+        nonlocal word_count
+        word_count += 1
+        return await stats.timed('saveWord', learner.save_word(f"{name}-word{word_count}"))
+
+    learner = learner_class(base_url, learner_id)
+    try:
+        await stats.timed('connect', learner.__aenter__())
+    except Exception:
+        return
+    try:
+        for _ in range(args.words_per_learner):
+            await save()
+            await think()
+        while time.perf_counter() < deadline:
+            due = await stats.timed('getNextReviewWords', learner.due_words(args.review_batch))
+            await think()
+            for word_id in due or ():
+                if time.perf_counter() >= deadline:
+                    break
+                recall = rng.choices(range(1, 6), weights)[0]
+                await stats.timed('trackWordStudy', learner.study(word_id, rng.randint(5, 120), recall))
+                await think()
+            # Nothing due (or a failed call): learners add words when idle
+            if not due or rng.random() < args.new_word_rate:
+                await save()
+                await think()
+    finally:
+        await learner.__aexit__(None, None, None)
+
+
+async def run_phase(learner_class, base_url, level, args, rng):
+    stats = Stats()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        simulate_learner(learner_class, base_url, f"p{level}-learner{i}",
+                         f"p{level}-learner{i}" if args.sharded else None,
+                         args, stats, deadline, random.Random(rng.random()))
+        for i in range(level)))
+    return stats, time.perf_counter() - started
+
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100, method='inclusive')[q - 1] if len(samples) > 1 else samples[0]
+
+
+def report(level, stats, elapsed):
+    """Print one phase; returns (total calls/s, overall p99 ms)"""
+    print(f"\n{level} learners, {elapsed:.1f} s")
+    print(f"{'tool':<20} {'calls':>7} {'calls/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for tool in TOOLS:
+        samples = stats.latencies.get(tool)
+        if not samples:
+            continue
+        everything += samples
+        print(f"{tool:<20} {len(samples):>7} {len(samples) / elapsed:>8.1f} "
+              f"{stats.errors[tool] / len(samples):>7.1%} {percentile(samples, 50) * 1000:>8.1f} "
+              f"{percentile(samples, 95) * 1000:>8.1f} {percentile(samples, 99) * 1000:>8.1f}")
+    if stats.errors.get('connect'):
+        print(f"{'connect':<20} {stats.errors['connect']} of {len(stats.latencies['connect'])} learners failed")
+    for tool, message in stats.messages.items():
+        print(f"  first {tool} error: {message}")
+    if not everything:
+        return 0.0, 0.0
+    return len(everything) / elapsed, percentile(everything, 99) * 1000
+
+
+def wait_for_port(port, timeout=30.0):
+    """Poll until something listens on 127.0.0.1:port"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def main():
+    args = parse_args()
+    levels = [int(level) for level in args.learners.split(',')]
+    learner_class = MCPLearner if args.target == 'mcp' else FlaskLearner
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        base_url = args.url.rstrip('/') if args.url else f"http://127.0.0.1:{args.port}"
+        if not args.url:
+            env = dict(os.environ, WORDS_DB_PATH=os.path.join(tmp, 'load.db'))
+            if args.sharded:
+                env['WORDS_SHARD_DIR'] = os.path.join(tmp, 'shards')
+            if args.target == 'mcp':
+                command = [sys.executable, 'mcp_server.py', '--transport', 'sse',
+                           '--host', '127.0.0.1', '--port', str(args.port)]
+            else:
+                command = [sys.executable, 'serve.py', '--bind', f"127.0.0.1:{args.port}"]
+                if args.workers:
+                    command += ['--workers', str(args.workers)]
+            server = start_server(command, env)
+        try:
+            if server is not None:
+                wait_for_port(args.port)
+            print(f"{args.target} at {base_url}, {os.cpu_count()} CPUs, {args.duration:.0f} s per phase, "
+                  f"recall weights {args.recall_weights}{', sharded' if args.sharded else ''}")
+            summary = []
+            for level in levels:
+                stats, elapsed = asyncio.run(run_phase(learner_class, base_url, level, args, rng))
+                summary.append((level, *report(level, stats, elapsed)))
+        finally:
+            if server is not None:
+                stop_server(server)
+
+    print(f"\n{'learners':>8} {'calls/s':>9} {'p99 ms':>8}")
+    previous = None
+    for level, rate, p99 in summary:
+        # Under 10% more throughput for more learners: the server is saturated
+        note = '  <- saturated' if previous and rate < previous * 1.1 else ''
+        print(f"{level:>8} {rate:>9.1f} {p99:>8.1f}{note}")
+        previous = rate
+
+
+if __name__ == '__main__':
+    main()
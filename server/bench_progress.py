@@ -0,0 +1,132 @@
+"""getLearningProgress latency as the study history grows
+
+Seeds a throwaway database with ``--words`` words and adds study sessions
+in steps up to ``--sessions``, spread over the last ``--history-days``
+days. After each step it times ``get_learning_progress`` (the progress
+counters and one row per day) against the same overview aggregated from
+words, review_schedule and study_sessions. Also reports the cost of a
+recorded review with and without the progress triggers.
+
+    python bench_progress.py --words 50000 --sessions 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark getLearningProgress against live aggregates')
+    parser.add_argument('--words', type=int, default=50000,
+                      help='Number of words to seed')
+    parser.add_argument('--sessions', type=int, default=1000000,
+                      help='Study sessions after the last step')
+    parser.add_argument('--steps', type=int, default=4,
+                      help='Steps the sessions are added in')
+    parser.add_argument('--history-days', type=int, default=365,
+                      help='Days the sessions are spread over')
+    parser.add_argument('--runs', type=int, default=200,
+                      help='Calls timed per kind and step')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+# The overview computed from the base tables, as a report without the
+# counters would
+LIVE_TOTAL = "SELECT COUNT(*) FROM words"
+LIVE_BUCKETS = f"SELECT {storage._BUCKET.format('review_schedule')}, COUNT(*) FROM review_schedule GROUP BY 1"
+LIVE_DAYS = """
+    SELECT {0}, COUNT(*), SUM(study_time), AVG(recall_score)
+    FROM study_sessions
+    WHERE studied_at >= ?
+    GROUP BY 1
+""".format(storage.UTC_DAY.format('studied_at'))
+
+
+def text(rng, words):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(words))
+
+
+def seed_words(store, count, rng):
+    for start in range(0, count, 5000):
+        store.save_words([{
+            "word": f"{text(rng, 1)}{i}",
+            "translations": [text(rng, 2)],
+        } for i in range(start, min(start + 5000, count))])
+
+
+def add_sessions(store, count, words, history_days, rng):
+    now = datetime.utcnow()
+    for start in range(0, count, 50000):
+        store.record_studies([
+            (rng.randint(1, words), rng.randint(5, 90), rng.randint(1, 5),
+             storage.format_timestamp(now - timedelta(minutes=rng.randint(0, history_days * 1440))),
+             storage.format_timestamp(now + timedelta(days=rng.randint(1, 60))), 2.5,
+             rng.choice((1, 3, 6, 12, 25, 60)))
+            for _ in range(min(50000, count - start))])
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def p99(samples):
+    return statistics.quantiles(samples, n=100)[98] if len(samples) > 2 else max(samples)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = storage.Storage(os.path.join(tmp, 'bench.db'))
+        store.init_db()
+        seed_words(store, args.words, rng)
+        now = datetime.utcnow()
+        today = now.date().isoformat()
+        since = storage.format_timestamp(now - timedelta(days=30))
+
+        def live():
+            with store.pool.connection() as conn:
+                conn.execute(LIVE_TOTAL).fetchone()
+                conn.execute(LIVE_BUCKETS).fetchall()
+                conn.execute(LIVE_DAYS, (since,)).fetchall()
+
+        print(f"{args.words} words, sessions over {args.history_days} days\n")
+        print(f"{'sessions':>10} {'counters p50 ms':>16} {'p99':>8} {'live p50 ms':>12} {'p99':>8}")
+        per_step = args.sessions // args.steps
+        for step in range(1, args.steps + 1):
+            add_sessions(store, per_step, args.words, args.history_days, rng)
+            counters = timed(lambda: store.get_learning_progress(today), args.runs)
+            aggregated = timed(live, max(args.runs // 20, 3))
+            print(f"{step * per_step:>10} {statistics.median(counters) * 1000:>16.3f} {p99(counters) * 1000:>8.3f} "
+                  f"{statistics.median(aggregated) * 1000:>12.1f} {p99(aggregated) * 1000:>8.1f}")
+
+        stamp = storage.format_timestamp(now)
+        review = lambda: store.record_studies([(rng.randint(1, args.words), 30, 4, stamp, stamp, 2.5, 8)])
+        with_triggers = timed(review, args.runs)
+        with store.pool.connection() as conn:
+            for name in ('trg_progress_study', 'trg_progress_schedule_insert',
+                         'trg_progress_schedule_update', 'trg_progress_schedule_delete'):
+                conn.execute(f"DROP TRIGGER {name}")
+            conn.commit()
+        without = timed(review, args.runs)
+        print(f"\nrecord a review: {statistics.median(with_triggers) * 1000:.3f} ms p50 with the progress triggers, "
+              f"{statistics.median(without) * 1000:.3f} ms without")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Latency benchmark for quiz generation
+
+Seeds a throwaway database with ``--words`` words (random translations and
+definitions of varied parts of speech, a share of them due), then reports
+the one-off time to load the distractor pool and the median and p99 time
+of building a ``--questions`` question quiz as getQuiz does: reading the due
+words and sampling distractors from the in-memory buckets. For contrast it
+also times reading every word, what a client picking its own distractors
+from getAllWords needs at least.
+
+    python bench_quiz.py --words 100000 --questions 20
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+from quiz import build_quiz, get_quiz_pool
+
+_DEFINITION_STARTS = ['to ', 'a ', 'having ', 'in a way that is ', '']
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark quiz generation')
+    parser.add_argument('--words', type=int, default=100000,
+                      help='Number of words to seed')
+    parser.add_argument('--questions', type=int, default=20,
+                      help='Questions per quiz')
+    parser.add_argument('--runs', type=int, default=200,
+                      help='Quizzes timed')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+def text(rng, words):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(words))
+
+
+def seed(store, count, rng):
+    for start in range(0, count, 5000):
+        store.save_words([{
+            "word": f"{text(rng, 1)}{i}",
+            "translations": [f"译{rng.randrange(count)}"],
+            "definitions": [rng.choice(_DEFINITION_STARTS) + text(rng, 6)],
+        } for i in range(start, min(start + 5000, count))])
+    # A tenth of the words due, so quizzes come from the schedule
+    now = datetime.utcnow()
+    store.record_studies([
+        (word_id, 30, 3, storage.format_timestamp(now - timedelta(days=2)),
+         storage.format_timestamp(now - timedelta(hours=rng.randint(1, 48))), 2.5, 1)
+        for word_id in rng.sample(range(1, count + 1), count // 10)])
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = storage.Storage(os.path.join(tmp, 'bench.db'))
+        store.init_db()
+        seed(store, args.words, rng)
+        now = storage.format_timestamp(datetime.utcnow())
+        pool = get_quiz_pool(store)
+
+        started = time.perf_counter()
+        build_quiz(pool, store.get_due_words(now, 1), rng=rng)
+        print(f"{args.words} words; distractor pool loaded in {(time.perf_counter() - started) * 1000:.0f} ms\n")
+
+        quiz = timed(lambda: build_quiz(pool, store.get_due_words(now, args.questions), rng=rng), args.runs)
+        every_word = timed(store.get_all_words, 3)
+        print(f"{'':<24} {'median ms':>10} {'p99 ms':>8}")
+        print(f"{f'{args.questions}-question quiz':<24} {statistics.median(quiz) * 1000:>10.2f} "
+              f"{statistics.quantiles(quiz, n=100)[98] * 1000:>8.2f}")
+        print(f"{'read every word':<24} {statistics.median(every_word) * 1000:>10.2f}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Memory and CPU benchmark for lazily decoded word records
+
+Seeds a throwaway database and reads every word the way getAllWords did
+before WordRecord (sqlite3.Row, then a dict with its JSON lists decoded
+eagerly) and the way it does now (slotted records built from plain tuples,
+converted to dicts at the response boundary). For each it reports the peak
+Python heap (tracemalloc) and median CPU time of:
+
+- fetch: reading the rows, e.g. to filter or count them before responding
+- response: building the getAllWords response dicts
+- json: serializing that response as FastMCP does
+
+    python bench_records.py --words 100000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+import tracemalloc
+
+import pydantic_core
+
+import storage
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark lazily decoded word records')
+    parser.add_argument('--words', type=int, default=100000,
+                      help='Number of words to seed')
+    parser.add_argument('--runs', type=int, default=5,
+                      help='Runs per CPU measurement')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+def sentence(rng, words):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+                    for _ in range(words))
+
+
+def seed(path, count, rng):
+    store = storage.Storage(path)
+    store.init_db()
+    batch = []
+    for i in range(count):
+        batch.append({
+            "word": f"word{i:06d}",
+            "pronunciation": f"/w{i}/",
+            "translations": [sentence(rng, 1) for _ in range(3)],
+            "definitions": [sentence(rng, 8) for _ in range(2)],
+            "examples": [sentence(rng, 10) for _ in range(2)],
+            "notes": sentence(rng, 5),
+        })
+        if len(batch) == 5000:
+            store.save_words(batch)
+            batch = []
+    store.save_words(batch)
+    store.close()
+
+
+def legacy_fetch(store):
+    """Rows decoded eagerly into dicts, as get_all_words did before"""
+    with store.pool.connection() as conn:
+        rows = conn.execute(storage.SELECT_ALL_WORDS).fetchall()
+    words = []
+    for row in rows:
+        word = dict(row)
+        for column in storage.INTERNAL_WORD_COLUMNS:
+            word.pop(column, None)
+        for field in storage.JSON_FIELDS:
+            word[field] = storage.decode_list(word[field])
+        words.append(storage.decode_timestamps(word))
+    return words
+
+
+def legacy_response(store):
+    words = legacy_fetch(store)
+    return {"status": "success", "count": len(words), "words": words}
+
+
+def record_fetch(store):
+    return store.get_all_words()
+
+
+def record_response(store):
+    words = store.get_all_words()
+    return {"status": "success", "count": len(words), "words": storage.to_dicts(words)}
+
+
+def serialize(response):
+    return pydantic_core.to_json(response, fallback=str, indent=2)
+
+
+def peak_memory(fn):
+    """Peak traced bytes while fn() runs"""
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def cpu_time(fn, runs):
+    """Median CPU seconds of fn()"""
+    samples = []
+    for _ in range(runs):
+        gc.collect()
+        started = time.process_time()
+        fn()
+        samples.append(time.process_time() - started)
+    return statistics.median(samples)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path, args.words, rng)
+        store = storage.Storage(path, row_cache_size=0)
+        print(f"{args.words} words, {os.path.getsize(path) / 2**20:.0f} MiB database\n")
+
+        cases = [
+            ('fetch', lambda: legacy_fetch(store), lambda: record_fetch(store)),
+            ('response', lambda: legacy_response(store), lambda: record_response(store)),
+            ('json', lambda: serialize(legacy_response(store)), lambda: serialize(record_response(store))),
+        ]
+        assert json.loads(serialize(legacy_response(store))) == json.loads(serialize(record_response(store)))
+
+        print(f"{'':<10} {'peak dicts':>12} {'peak records':>13} {'ratio':>7}   "
+              f"{'cpu dicts':>10} {'cpu records':>12} {'ratio':>7}")
+        for label, legacy, records in cases:
+            legacy_peak, records_peak = peak_memory(legacy), peak_memory(records)
+            legacy_cpu, records_cpu = cpu_time(legacy, args.runs), cpu_time(records, args.runs)
+            print(f"{label:<10} {legacy_peak / 2**20:>8.1f} MiB {records_peak / 2**20:>9.1f} MiB "
+                  f"{records_peak / legacy_peak:>6.0%}   "
+                  f"{legacy_cpu * 1000:>7.0f} ms {records_cpu * 1000:>9.0f} ms {records_cpu / legacy_cpu:>6.0%}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
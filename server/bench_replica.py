@@ -0,0 +1,116 @@
+"""Read latency with and without the in-memory replica
+
+Seeds a throwaway database with ``--words`` words (a tenth of them
+scheduled), then times the reads behind getWord (by ID and by text),
+getNextReviewWords and getAllWords against the file (with the row cache)
+and against a replica started with ``Storage.start_replica``. Reports
+median and p99 latency of each, and the replica's memory cost: the size of
+its in-memory database and the growth of the process's resident set.
+
+    python bench_replica.py --words 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark reads from the in-memory replica')
+    parser.add_argument('--words', type=int, default=100000,
+                      help='Number of words to seed')
+    parser.add_argument('--runs', type=int, default=2000,
+                      help='Reads timed per kind')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+def text(rng, words):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(words))
+
+
+def seed(store, count, rng):
+    for start in range(0, count, 5000):
+        store.save_words([{
+            "word": f"{text(rng, 1)}{i}",
+            "translations": [text(rng, 2)],
+            "definitions": [text(rng, 12)],
+            "examples": [text(rng, 10)],
+        } for i in range(start, min(start + 5000, count))])
+    now = datetime.utcnow()
+    store.record_studies([
+        (word_id, 30, 3, storage.format_timestamp(now - timedelta(days=2)),
+         storage.format_timestamp(now + timedelta(hours=rng.randint(-48, 48))), 2.5, 1)
+        for word_id in rng.sample(range(1, count + 1), count // 10)])
+
+
+def resident_bytes():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def p99(samples):
+    return statistics.quantiles(samples, n=100)[98] if len(samples) > 2 else max(samples)
+
+
+def measure(store, args, texts):
+    rng = random.Random(args.seed)
+    now = storage.format_timestamp(datetime.utcnow())
+    return {
+        'getWord by ID': timed(lambda: store.get_word(rng.randint(1, args.words)), args.runs),
+        'getWord by text': timed(lambda: store.get_word_by_text(rng.choice(texts)), args.runs),
+        'getNextReviewWords 20': timed(lambda: store.get_due_words(now, 20), args.runs // 10),
+        'getAllWords': timed(store.get_all_words, 3),
+    }
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        store = storage.Storage(path)
+        store.init_db()
+        seed(store, args.words, rng)
+        texts = [word.word for word in store.get_all_words()]
+
+        on_disk = measure(store, args, texts)
+        before = resident_bytes()
+        started = time.perf_counter()
+        store.start_replica(interval=0)
+        loaded = time.perf_counter() - started
+        grown = resident_bytes() - before
+        in_memory = measure(store, args, texts)
+
+        print(f"{args.words} words; replica loaded in {loaded * 1000:.0f} ms, "
+              f"{store.replica.memory_bytes() / 1e6:.1f} MB in memory, resident set +{grown / 1e6:.1f} MB\n")
+        print(f"{'':<24} {'file p50 ms':>12} {'p99':>8} {'replica p50 ms':>15} {'p99':>8}")
+        for name in on_disk:
+            disk, memory = on_disk[name], in_memory[name]
+            print(f"{name:<24} {statistics.median(disk) * 1000:>12.3f} {p99(disk) * 1000:>8.3f} "
+                  f"{statistics.median(memory) * 1000:>15.3f} {p99(memory) * 1000:>8.3f}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark for bulk rescheduling
+
+Seeds a throwaway database with random study history, checks the vectorized
+replay against sm2_step on a sample of words, then times a full
+``reschedule`` (load, replay, write).
+
+    python bench_reschedule.py --sessions 1000000 --words 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+from scheduling import DEFAULT_SM2, replay_sm2, reschedule, sm2_step
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark bulk SM-2 rescheduling')
+    parser.add_argument('--sessions', type=int, default=1000000,
+                      help='Number of study sessions to seed')
+    parser.add_argument('--words', type=int, default=20000,
+                      help='Number of words to seed')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+def seed(db_path, words, sessions, rng):
+    store = storage.Storage(db_path)
+    store.init_db()
+    store.save_words([{"word": f"word{i}", "translations": [], "definitions": [], "examples": []}
+                      for i in range(words)])
+    store.close()
+
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO study_sessions (word_id, study_time, recall_score, studied_at) VALUES (?, ?, ?, ?)",
+        ((rng.randint(1, words), 30, rng.choice((1, 2, 3, 3, 4, 4, 4, 5, 5)),
+          (start + timedelta(minutes=i)).isoformat()) for i in range(sessions)))
+    conn.commit()
+    conn.close()
+
+
+def check_against_scalar(store, sample, rng):
+    """Compare replay_sm2 with sm2_step on a sample of words"""
+    word_ids, recalls, _ = store.load_review_history()
+    unique_ids, ease, interval = replay_sm2(word_ids, recalls)
+    vectorized = {w: (e, i) for w, e, i in zip(unique_ids.tolist(), ease.tolist(), interval.tolist())}
+
+    history = {}
+    for word_id, recall in zip(word_ids.tolist(), recalls.tolist()):
+        history.setdefault(word_id, []).append(recall)
+
+    for word_id in rng.sample(sorted(history), min(sample, len(history))):
+        e, i = DEFAULT_SM2.initial_ease, DEFAULT_SM2.initial_interval
+        for recall in history[word_id]:
+            e, i = sm2_step(e, i, recall)
+        assert (e, i) == vectorized[word_id], (word_id, (e, i), vectorized[word_id])
+    print(f"Vectorized replay matches sm2_step on {min(sample, len(history))} sampled words")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        started = time.perf_counter()
+        seed(db_path, args.words, args.sessions, rng)
+        print(f"Seeded {args.sessions} sessions over {args.words} words in "
+              f"{time.perf_counter() - started:.1f}s")
+
+        store = storage.Storage(db_path)
+        check_against_scalar(store, 500, rng)
+
+        started = time.perf_counter()
+        result = reschedule(store)
+        total = time.perf_counter() - started
+        store.close()
+
+    print(f"Rescheduled {result['words']} words from {result['sessions']} sessions in {total:.2f}s "
+          f"(load {result['load_seconds']:.2f}s, replay {result['replay_seconds']:.2f}s, "
+          f"write {result['write_seconds']:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
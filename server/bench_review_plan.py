@@ -0,0 +1,111 @@
+"""getNextReviewWords latency: live due query against the daily review plan
+
+Seeds a throwaway database with ``--words`` words, ``--due-share`` of them
+due today and most of the rest scheduled later (so the new-word padding has
+to look past them), then times reading ``--count`` words the way
+getNextReviewWords did (``get_due_words``: the due query plus new words)
+and from the day's plan (``get_planned_words``), with SM-2 and FSRS
+ordering. Also reports how long planning the day takes, and the cost of a
+recorded review with the plan's done-marking trigger.
+
+    python bench_review_plan.py --words 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark serving reviews from the daily plan')
+    parser.add_argument('--words', type=int, default=100000,
+                      help='Number of words to seed')
+    parser.add_argument('--due-share', type=float, default=0.05,
+                      help='Share of the words due today')
+    parser.add_argument('--count', type=int, default=10,
+                      help='Words per getNextReviewWords call')
+    parser.add_argument('--runs', type=int, default=2000,
+                      help='Calls timed per kind')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+def text(rng, words):
+    return ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(words))
+
+
+def seed(store, count, due_share, rng):
+    for start in range(0, count, 5000):
+        store.save_words([{
+            "word": f"{text(rng, 1)}{i}",
+            "translations": [text(rng, 2)],
+            "definitions": [text(rng, 12)],
+        } for i in range(start, min(start + 5000, count))])
+    now = datetime.utcnow()
+    reviews = []
+    # A tenth left unstudied, at the end of the created_at order
+    for word_id in range(1, int(count * 0.9) + 1):
+        due = rng.random() < due_share / 0.9
+        next_review = now - timedelta(hours=rng.randint(1, 72)) if due else now + timedelta(days=rng.randint(1, 60))
+        reviews.append((word_id, 30, 3, storage.format_timestamp(now - timedelta(days=3)),
+                        storage.format_timestamp(next_review), 2.5, 3, 5.0, 5.0))
+    store.record_studies(reviews)
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def p99(samples):
+    return statistics.quantiles(samples, n=100)[98] if len(samples) > 2 else max(samples)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = storage.Storage(os.path.join(tmp, 'bench.db'))
+        store.init_db()
+        seed(store, args.words, args.due_share, rng)
+        now = datetime.utcnow()
+        today = now.date().isoformat()
+
+        print(f"{args.words} words, {args.due_share * 100:g}% due\n")
+        print(f"{'':<28} {'p50 ms':>8} {'p99 ms':>8}")
+        for fsrs in (False, True):
+            name = 'FSRS' if fsrs else 'SM-2'
+            started = time.perf_counter()
+            planned = store.plan_reviews(today, by_retrievability=fsrs)
+            print(f"{name} plan ({planned['due']} due, {planned['new']} new) built in "
+                  f"{(time.perf_counter() - started) * 1000:.0f} ms")
+            for label, fn in (
+                    ('live due query', lambda: store.get_due_words(storage.format_timestamp(now), args.count,
+                                                                   by_retrievability=fsrs)),
+                    ('daily plan', lambda: store.get_planned_words(today, args.count, by_retrievability=fsrs))):
+                samples = timed(fn, args.runs)
+                print(f"{f'{name} {label}':<28} {statistics.median(samples) * 1000:>8.3f} "
+                      f"{p99(samples) * 1000:>8.3f}")
+
+        word_ids = [word.id for word in store.get_planned_words(today, 200)[0]]
+        stamp = storage.format_timestamp(now)
+        samples = timed(lambda: store.record_studies([(rng.choice(word_ids), 30, 4, stamp, stamp, 2.5, 3)]),
+                        args.runs // 4)
+        print(f"{'record a review':<28} {statistics.median(samples) * 1000:>8.3f} {p99(samples) * 1000:>8.3f}")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
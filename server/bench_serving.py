@@ -0,0 +1,169 @@
+"""Load test comparing the development server (run.py) with serve.py
+
+Starts each server against a throwaway database, seeds a few words, then
+hammers the read endpoints from concurrent clients and prints requests per
+second and latency percentiles for both.
+
+    python bench_serving.py --clients 32 --duration 10
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Compare run.py and serve.py throughput')
+    parser.add_argument('--clients', type=int, default=32,
+                      help='Number of concurrent client threads')
+    parser.add_argument('--duration', type=float, default=10.0,
+                      help='Seconds to run each load phase')
+    parser.add_argument('--words', type=int, default=200,
+                      help='Number of words to seed')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Worker processes for serve.py (default: serve.py default)')
+    return parser.parse_args()
+
+
+def wait_for_server(base_url, timeout=30.0):
+    """Poll until the server answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/api/words/", timeout=1)
+            return
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+def start_server(command, env):
+    """Start a server in its own process group so it can be stopped cleanly"""
+    return subprocess.Popen(command, cwd=HERE, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(process):
+    """Stop a server and any children it spawned (e.g. the reloader)"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def seed(base_url, count):
+    """Insert sample words and return their IDs"""
+    ids = []
+    with requests.Session() as session:
+        for i in range(count):
+            response = session.post(f"{base_url}/api/words/", json={
+                "word": f"benchword{i}",
+                "pronunciation": "bɛntʃ",
+                "translations": ["基准"],
+                "definitions": [f"benchmark word number {i}"],
+                "examples": [f"This is benchmark sentence {i}."],
+                "notes": "seeded by bench_serving.py"
+            })
+            ids.append(response.json().get('word_id'))
+    return [word_id for word_id in ids if word_id is not None]
+
+
+def run_load(base_url, word_ids, clients, duration):
+    """Run concurrent GET traffic and return (requests, errors, latencies)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        local = []
+        local_errors = 0
+        i = offset
+        with requests.Session() as session:
+            while time.perf_counter() < stop_at:
+                # Mix single-word reads with the occasional full listing
+                if i % 10 == 0:
+                    url = f"{base_url}/api/words/"
+                else:
+                    url = f"{base_url}/api/words/{word_ids[i % len(word_ids)]}"
+                start = time.perf_counter()
+                try:
+                    if session.get(url, timeout=10).status_code != 200:
+                        local_errors += 1
+                except requests.exceptions.RequestException:
+                    local_errors += 1
+                local.append(time.perf_counter() - start)
+                i += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies), errors[0], sorted(latencies)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def bench(name, command, port, args):
+    """Benchmark one server command against a fresh database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env['WORDS_DB_PATH'] = os.path.join(tmp, 'bench.db')
+        base_url = f"http://127.0.0.1:{port}"
+        process = start_server(command, env)
+        try:
+            wait_for_server(base_url)
+            word_ids = seed(base_url, args.words)
+            total, errors, latencies = run_load(base_url, word_ids, args.clients, args.duration)
+        finally:
+            stop_server(process)
+
+    rps = total / args.duration
+    print(f"{name:<10} {rps:>10.1f} req/s  "
+          f"p50 {percentile(latencies, 50) * 1000:>7.2f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:>7.2f} ms  "
+          f"errors {errors}")
+    return rps
+
+
+def main():
+    args = parse_args()
+
+    print(f"{args.clients} clients, {args.duration:.0f}s per server, {args.words} words\n")
+
+    dev_rps = bench('run.py', [sys.executable, 'run.py'], 5000, args)
+
+    serve_command = [sys.executable, 'serve.py', '--bind', '127.0.0.1:5001']
+    if args.workers:
+        serve_command += ['--workers', str(args.workers)]
+    prod_rps = bench('serve.py', serve_command, 5001, args)
+
+    if dev_rps:
+        print(f"\nserve.py is {prod_rps / dev_rps:.1f}x run.py")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Write throughput benchmark for per-learner shards
+
+Runs one writer process per learner, each recording study sessions as
+trackWordStudy does (session insert plus schedule upsert in one
+transaction), first with every learner in one shared database and then
+with every learner in their own shard. With a shared file the writers
+queue on its single write lock; with shards they commit independently, so
+throughput grows with the number of learners until CPU or disk saturates.
+
+    python bench_sharding.py --learners 1,2,4,8 --writes 2000
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+from sharding import ShardRouter
+
+WORDS_PER_LEARNER = 200
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark write throughput of per-learner shards')
+    parser.add_argument('--learners', type=str, default='1,2,4,8',
+                      help='Comma separated learner counts to measure')
+    parser.add_argument('--writes', type=int, default=2000,
+                      help='Study sessions recorded per learner')
+    parser.add_argument('--synchronous', type=str, default='NORMAL',
+                      help='PRAGMA synchronous for the writers (FULL syncs on every commit)')
+    return parser.parse_args()
+
+
+def seed(path, learner):
+    store = storage.Storage(path)
+    store.init_db()
+    store.save_words([{"word": f"{learner}-word{i}", "translations": [], "definitions": [], "examples": []}
+                      for i in range(WORDS_PER_LEARNER)])
+    ids = [store.find_word_id(f"{learner}-word{i}") for i in range(WORDS_PER_LEARNER)]
+    store.close()
+    return ids
+
+
+def writer(path, word_ids, writes, synchronous, start_event, results):
+    pragmas = storage.sqlite_pragmas(synchronous=synchronous)
+    store = storage.Storage(path, pool_size=1, pragmas=pragmas, row_cache_size=0)
+    now = datetime(2024, 1, 1)
+    start_event.wait()
+    started = time.perf_counter()
+    for i in range(writes):
+        studied_at = now + timedelta(seconds=i)
+        store.record_study(word_ids[i % len(word_ids)], 30, 4, studied_at.isoformat(),
+                           (studied_at + timedelta(days=1)).isoformat(), 2.5, 1)
+    results.put(time.perf_counter() - started)
+    store.close()
+
+
+def run(paths, word_ids, writes, synchronous):
+    """Start one writer per (path, word_ids) together; return sessions per second"""
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=writer, args=(path, ids, writes, synchronous, start_event, results))
+               for path, ids in zip(paths, word_ids)]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.5)
+    started = time.perf_counter()
+    start_event.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return len(workers) * writes / elapsed
+
+
+def main():
+    args = parse_args()
+    counts = [int(n) for n in args.learners.split(',')]
+    print(f"{args.writes} study sessions per learner, synchronous={args.synchronous}, "
+          f"{os.cpu_count()} CPUs\n")
+    print(f"{'learners':>8}   {'shared db':>12}   {'sharded':>12}   speedup")
+
+    for count in counts:
+        learners = [f"learner{i}" for i in range(count)]
+        with tempfile.TemporaryDirectory() as tmp:
+            shared_path = os.path.join(tmp, 'shared.db')
+            shared_ids = [seed(shared_path, learner) for learner in learners]
+            shared = run([shared_path] * count, shared_ids, args.writes, args.synchronous)
+
+            router = ShardRouter(os.path.join(tmp, 'shards'))
+            shard_paths = [router.path_for(learner) for learner in learners]
+            shard_ids = [seed(path, learner) for path, learner in zip(shard_paths, learners)]
+            sharded = run(shard_paths, shard_ids, args.writes, args.synchronous)
+
+        print(f"{count:>8}   {shared:>8.0f} w/s   {sharded:>8.0f} w/s   {sharded / shared:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
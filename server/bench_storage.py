@@ -0,0 +1,183 @@
+"""Latency benchmark for the shared storage engine
+
+Compares the MCP tools and Flask routes running on storage.py against the
+data access they used before it: a fresh sqlite3 connection per MCP call
+(with N+1 schedule lookups in getNextReviewWords) and SQLAlchemy ORM queries
+in the Flask routes. Runs against a throwaway database.
+
+    python bench_storage.py --words 5000 --iterations 2000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark storage.py against the legacy data layers')
+    parser.add_argument('--words', type=int, default=5000,
+                      help='Number of words to seed')
+    parser.add_argument('--iterations', type=int, default=2000,
+                      help='Calls per measured operation')
+    return parser.parse_args()
+
+
+# Legacy MCP data access, as mcp_server.py did it before storage.py
+
+def legacy_get_word(db_path, word_id):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM words WHERE id = ?", (word_id,)).fetchone()
+    word = dict(row)
+    word['translations'] = json.loads(word['translations'])
+    word['definitions'] = json.loads(word['definitions'])
+    word['examples'] = json.loads(word['examples'])
+    conn.close()
+    return word
+
+
+def legacy_next_review(db_path, count):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    now = datetime.utcnow().isoformat()
+    cursor.execute("""
+        SELECT w.* FROM words w
+        JOIN review_schedule rs ON w.id = rs.word_id
+        WHERE rs.next_review <= ?
+        ORDER BY rs.next_review
+        LIMIT ?
+    """, (now, count))
+    rows = cursor.fetchall()
+    words = []
+    for row in rows:
+        word = dict(row)
+        word['translations'] = json.loads(word['translations'])
+        word['definitions'] = json.loads(word['definitions'])
+        word['examples'] = json.loads(word['examples'])
+        cursor.execute("SELECT next_review, interval FROM review_schedule WHERE word_id = ?", (word['id'],))
+        schedule = cursor.fetchone()
+        if schedule:
+            word['next_review'] = schedule['next_review']
+            word['interval'] = schedule['interval']
+        words.append(word)
+    conn.close()
+    return words
+
+
+def legacy_track(db_path, word_id, study_time, recall):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM words WHERE id = ?", (word_id,))
+    cursor.fetchone()
+    now = datetime.utcnow()
+    cursor.execute(
+        "INSERT INTO study_sessions (word_id, study_time, recall_score, studied_at) VALUES (?, ?, ?, ?)",
+        (word_id, study_time, recall, now.isoformat()))
+    cursor.execute("SELECT ease_factor, interval FROM review_schedule WHERE word_id = ?", (word_id,))
+    schedule = cursor.fetchone()
+    ease_factor, interval = schedule if schedule else (2.5, 1)
+    next_review = (now + timedelta(days=interval)).isoformat()
+    if schedule:
+        cursor.execute("UPDATE review_schedule SET next_review = ?, ease_factor = ?, interval = ? WHERE word_id = ?",
+                       (next_review, ease_factor, interval, word_id))
+    else:
+        cursor.execute("INSERT INTO review_schedule (word_id, next_review, ease_factor, interval) VALUES (?, ?, ?, ?)",
+                       (word_id, next_review, ease_factor, interval))
+    conn.commit()
+    conn.close()
+
+
+def measure(fn, iterations):
+    """Return per-call latencies in microseconds"""
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def report(name, legacy, current):
+    legacy_median = statistics.median(legacy)
+    current_median = statistics.median(current)
+    print(f"{name:<28} legacy {legacy_median:>9.1f} us   storage {current_median:>9.1f} us   "
+          f"{legacy_median / current_median:>5.2f}x")
+
+
+def seed(db_path, count):
+    import storage
+    store = storage.Storage(db_path)
+    store.init_db()
+    store.save_words([{
+        "word": f"word{i:06d}",
+        "pronunciation": "wɜːd",
+        "translations": ["词", "单词"],
+        "definitions": [f"definition number {i}", "a unit of language"],
+        "examples": [f"Example sentence {i}.", "Another example."],
+        "notes": "benchmark"
+    } for i in range(count)])
+    # Half of the words are due for review
+    past = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    store.record_studies([(i, 30, 4, past, past, 2.5, 1) for i in range(1, count // 2)])
+    store.close()
+
+
+def main():
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        os.environ['WORDS_DB_PATH'] = db_path
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        seed(db_path, args.words)
+
+        import mcp_server
+        n = args.iterations
+        ids = [1 + (i * 7919) % args.words for i in range(n)]
+
+        print(f"{args.words} words, {n} calls per operation (median latency)\n")
+        print("MCP tools")
+        report("getWord",
+               measure(lambda i: legacy_get_word(db_path, ids[i]), n),
+               measure(lambda i: mcp_server.getWord(word_id=ids[i]), n))
+        report("getNextReviewWords(20)",
+               measure(lambda i: legacy_next_review(db_path, 20), n // 10),
+               measure(lambda i: mcp_server.getNextReviewWords(20), n // 10))
+        report("trackWordStudy",
+               measure(lambda i: legacy_track(db_path, ids[i], 30, 4), n // 4),
+               measure(lambda i: mcp_server.trackWordStudy(ids[i], 30, 4), n // 4))
+
+        from app import create_app, db
+        from app.word_management.models import Word
+        from app.word_management.schemas import word_schema, words_schema
+
+        app = create_app()
+        client = app.test_client()
+        print("\nFlask routes")
+        with app.test_request_context():
+            report("GET /api/words/<id>",
+                   measure(lambda i: word_schema.dump(db.session.get(Word, ids[i])), n),
+                   measure(lambda i: word_schema.dump(app.extensions['word_storage'].get_word(ids[i])), n))
+            report("GET /api/words/search",
+                   measure(lambda i: word_schema.dump(Word.query.filter_by(word=f"word{ids[i] - 1:06d}").first()), n),
+                   measure(lambda i: word_schema.dump(
+                       app.extensions['word_storage'].get_word_by_text(f"word{ids[i] - 1:06d}")), n))
+            report("GET /api/words/",
+                   measure(lambda i: words_schema.dump(Word.query.all()), 5),
+                   measure(lambda i: words_schema.dump(app.extensions['word_storage'].get_all_words()), 5))
+        samples = measure(lambda i: client.get(f"/api/words/{ids[i]}"), n)
+        print(f"\nEnd-to-end GET /api/words/<id> through the test client: "
+              f"{statistics.median(samples):.1f} us median")
+
+        mcp_server.store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark for the epoch-millisecond timestamp migration
+
+Seeds a throwaway database in the old ISO-text format, measures the size of
+the timestamp indexes and the latency of the getNextReviewWords due query
+(the SQL alone, and ``get_due_words`` including rendering timestamps back
+to ISO strings for the API), runs ``migrate_timestamps`` and measures again
+(in place, and after a VACUUM that rebuilds the indexes compactly).
+
+    python bench_timestamps.py --words 100000 --sessions 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+
+TIMESTAMP_INDEXES = ('idx_review_schedule_next', 'idx_review_schedule_day', 'idx_study_sessions_word')
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark ISO-text against epoch-millisecond timestamps')
+    parser.add_argument('--words', type=int, default=100000,
+                      help='Number of words (and review schedules) to seed')
+    parser.add_argument('--sessions', type=int, default=1000000,
+                      help='Number of study sessions to seed')
+    parser.add_argument('--queries', type=int, default=2000,
+                      help='Due queries per measurement')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed')
+    return parser.parse_args()
+
+
+def seed_text_database(path, words, sessions, rng):
+    """Create a database laid out as releases before the migration wrote it"""
+    store = storage.Storage(path)
+    store.init_db()
+    store.close()
+    conn = sqlite3.connect(path)
+    storage.Storage._write_user_version(conn, timestamps=storage.TIMESTAMPS_TEXT)
+    now = datetime.utcnow()
+    conn.executemany(
+        "INSERT INTO words (word, translations, definitions, examples, created_at, updated_at) "
+        "VALUES (?, '[]', '[]', '[]', ?, ?)",
+        ((f"word{i}", (now - timedelta(days=400)).isoformat(), (now - timedelta(days=400)).isoformat())
+         for i in range(words)))
+    conn.executemany(
+        "INSERT INTO study_sessions (word_id, study_time, recall_score, studied_at) VALUES (?, ?, ?, ?)",
+        ((rng.randint(1, words), 30, rng.randint(1, 5),
+          (now - timedelta(seconds=rng.randint(0, 365 * 86400), microseconds=rng.randint(0, 999999))).isoformat())
+         for _ in range(sessions)))
+    conn.executemany(
+        "INSERT INTO review_schedule (word_id, next_review, ease_factor, interval, last_review) "
+        "VALUES (?, ?, 2.5, 1, ?)",
+        ((i, (now + timedelta(seconds=rng.randint(-30 * 86400, 60 * 86400))).isoformat(),
+          (now - timedelta(days=1)).isoformat()) for i in range(1, words + 1)))
+    conn.commit()
+    conn.close()
+
+
+def index_sizes(path):
+    """Bytes used by each timestamp index, or None without the dbstat table"""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    sizes = dict(rows)
+    return {name: sizes.get(name, 0) for name in TIMESTAMP_INDEXES}
+
+
+def latency(fn, queries):
+    """Median and p99 microseconds of fn()"""
+    samples = []
+    for _ in range(queries):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def due_latency(store, queries):
+    """Latency of the due query alone, and of get_due_words with ISO rendering"""
+    now = datetime.utcnow()
+    with store.pool.connection() as conn:
+        param = store._encoder(conn)(now)
+        query = latency(lambda: conn.execute(storage.SELECT_DUE_WORDS, (param, 20)).fetchall(), queries)
+    call = latency(lambda: store.get_due_words(storage.format_timestamp(now), 20), queries)
+    return query, call
+
+
+def report(label, path, store, queries):
+    sizes = index_sizes(path)
+    (query_median, query_p99), (call_median, call_p99) = due_latency(store, queries)
+    print(f"\n{label}")
+    if sizes is None:
+        print("  index sizes: SQLite built without dbstat")
+    else:
+        for name, size in sizes.items():
+            print(f"  {name:<28} {size / 1024:>10.0f} KiB")
+    print(f"  database file                {os.path.getsize(path) / 1024:>10.0f} KiB")
+    print(f"  due query, SQL only          median {query_median:.1f} us, p99 {query_p99:.1f} us")
+    print(f"  get_due_words(20)            median {call_median:.1f} us, p99 {call_p99:.1f} us")
+    return sizes
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        started = time.perf_counter()
+        seed_text_database(path, args.words, args.sessions, rng)
+        print(f"Seeded {args.words} words and {args.sessions} sessions as ISO text in "
+              f"{time.perf_counter() - started:.1f}s")
+
+        store = storage.Storage(path, row_cache_size=0)
+        before = report("ISO text", path, store, args.queries)
+
+        started = time.perf_counter()
+        result = store.migrate_timestamps()
+        print(f"\nMigrated {sum(result['converted'].values())} rows in {time.perf_counter() - started:.1f}s")
+        report("Epoch milliseconds (migrated in place)", path, store, args.queries)
+
+        store.close()
+        conn = sqlite3.connect(path)
+        conn.execute("VACUUM")
+        conn.close()
+        store = storage.Storage(path, row_cache_size=0)
+        after = report("Epoch milliseconds (after VACUUM)", path, store, args.queries)
+        store.close()
+
+    if before and after:
+        print()
+        for name in TIMESTAMP_INDEXES:
+            if before[name]:
+                print(f"{name:<28} {after[name] / before[name]:.0%} of its ISO-text size")
+
+
+if __name__ == '__main__':
+    main()
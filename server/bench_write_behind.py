@@ -0,0 +1,101 @@
+"""Benchmark for write-behind study logging
+
+Records the same reviews on a throwaway database from ``--threads``
+threads, first one transaction per review (``Storage.record_study``, what
+trackWordStudy does by default), then through ``WriteBehindLog``. Reports
+acknowledged reviews per second and p50/p99 acknowledgement latency, and
+for write-behind the group commits it took and the time until everything
+acknowledged was committed.
+
+    python bench_write_behind.py --reviews 20000 --threads 8
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import storage
+from write_behind import WriteBehindLog
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Benchmark write-behind study logging')
+    parser.add_argument('--reviews', type=int, default=20000,
+                      help='Reviews recorded per mode')
+    parser.add_argument('--threads', type=int, default=8,
+                      help='Threads recording reviews')
+    parser.add_argument('--words', type=int, default=1000,
+                      help='Words the reviews are spread over')
+    parser.add_argument('--batch-size', type=int, default=256,
+                      help='Reviews per group commit')
+    parser.add_argument('--interval-ms', type=int, default=200,
+                      help='Milliseconds a review waits for its batch to fill')
+    parser.add_argument('--fsync', action='store_true',
+                      help='fsync every spill file write')
+    return parser.parse_args()
+
+
+def review(word_id, i):
+    studied = storage.format_timestamp(datetime(2025, 1, 1) + timedelta(seconds=i))
+    return (word_id, 30, 1 + i % 5, studied, studied, 2.5, 1, None, None)
+
+
+def run(record, args):
+    """Record reviews from all threads; returns (seconds, ack latencies)"""
+    latencies = []
+    per_thread = args.reviews // args.threads
+
+    def work(t):
+        mine = []
+        for i in range(per_thread):
+            n = t * per_thread + i
+            started = time.perf_counter()
+            record(review(1 + n % args.words, n))
+            mine.append(time.perf_counter() - started)
+        latencies.extend(mine)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def show(label, elapsed, latencies, extra=''):
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{label:<14} {len(latencies) / elapsed:>9.0f} {q[49] * 1e6:>8.0f} {q[98] * 1e6:>8.0f}  {extra}")
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        store = storage.Storage(path)
+        store.init_db()
+        store.save_words([{"word": f"word{i}"} for i in range(args.words)])
+
+        print(f"{args.reviews} reviews, {args.threads} threads, {os.cpu_count()} CPUs\n")
+        print(f"{'mode':<14} {'acks/s':>9} {'p50 us':>8} {'p99 us':>8}")
+        elapsed, latencies = run(lambda r: store.record_study(*r), args)
+        show('sync', elapsed, latencies)
+
+        log = WriteBehindLog(store, batch_size=args.batch_size, interval=args.interval_ms / 1000,
+                             fsync=args.fsync)
+        elapsed, latencies = run(lambda r: log.record(r, {}), args)
+        started = time.perf_counter()
+        log.flush()
+        drained = time.perf_counter() - started
+        show('write-behind', elapsed, latencies,
+             f"{log.stats['batches']} commits, drained {drained * 1000:.0f} ms after the last ack")
+        log.close()
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""Upkeep of the per-database indexes after word writes
+
+Related-word neighbors (``related``) and quiz buckets (``quiz``) are derived
+from the words table. Every process that saves, changes or deletes words
+(the MCP server and the Flask API) calls ``word_changed`` after the write, so
+the stored neighbor lists and the in-memory pools follow it.
+"""
+from typing import Iterable
+
+from quiz import refresh_quiz
+from related import refresh_related
+from storage import Storage
+
+
+def word_changed(store: Storage, word_id: int):
+    """Bring derived indexes up to date after a word was saved, changed or deleted"""
+    refresh_related(store, word_id)
+    refresh_quiz(store, word_id)
+
+
+def words_changed(store: Storage, word_ids: Iterable[int]):
+    """word_changed for every word of a batch write"""
+    for word_id in word_ids:
+        word_changed(store, word_id)
@@ -0,0 +1,351 @@
+"""Maintenance commands for the English Word Learning database
+
+    python manage.py reschedule [--dry-run] [--ease-floor 1.3] ...
+    python manage.py fit-fsrs [--processes 4]
+    python manage.py evaluate-fsrs
+    python manage.py compact-sessions [--older-than-days 365]
+    python manage.py maintain [--enable-incremental-vacuum]
+    python manage.py migrate-timestamps [--status]
+    python manage.py backfill-lookup-keys [--all]
+    python manage.py backfill-phonetic-keys [--all]
+    python manage.py build-related
+    python manage.py plan-reviews [--day 2024-05-01] [--due-limit 200] [--new-limit 20]
+    python manage.py backup [--compress] [--keep 7]
+    python manage.py list-backups
+    python manage.py verify-backup [PATH]
+    python manage.py restore-backup PATH
+    python manage.py --learner alice reschedule    (multi-learner mode)
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import backup
+import sharding
+import storage
+from related import RelatedIndex
+from scheduling import (DEFAULT_FSRS_WEIGHTS, DEFAULT_RETENTION, DEFAULT_SM2, evaluate_fsrs, fit_fsrs,
+                        load_fsrs_weights, load_sm2_params, reschedule, save_sm2_params)
+
+
+def parse_seed_intervals(value):
+    """Parse "1:1,2:6" into ((1, 1), (2, 6))"""
+    pairs = []
+    for item in value.split(','):
+        current, following = item.split(':')
+        pairs.append((int(current), int(following)))
+    return tuple(pairs)
+
+
+SM2_OPTIONS = ('initial_ease', 'initial_interval', 'ease_floor', 'lapse_penalty', 'pass_score', 'seed_intervals')
+
+
+def cmd_reschedule(store, args):
+    # Options left out keep the database's saved values
+    params = DEFAULT_SM2 if args.reset_params else load_sm2_params(store)
+    params = params._replace(**{name: getattr(args, name) for name in SM2_OPTIONS
+                                if getattr(args, name) is not None})
+    weights = None
+    if args.scheduler == 'fsrs':
+        weights = load_fsrs_weights(store)
+    result = reschedule(store, params, dry_run=args.dry_run, scheduler=args.scheduler,
+                        fsrs_weights=weights, retention=args.retention)
+    if not args.dry_run:
+        # trackWordStudy and the study routes schedule with the same parameters
+        save_sm2_params(store, params)
+    result['sm2_params'] = params._asdict()
+    return result
+
+
+def cmd_fit_fsrs(store, args):
+    word_ids, recalls, days, _ = store.load_review_history(with_times=True)
+    start_weights = DEFAULT_FSRS_WEIGHTS if args.from_defaults else load_fsrs_weights(store)
+    log = (lambda message: print(message, file=sys.stderr)) if args.verbose else None
+    weights, initial_loss, final_loss = fit_fsrs(
+        word_ids, recalls, days, start_weights, iterations=args.iterations,
+        learning_rate=args.learning_rate, processes=args.processes, log=log)
+    metrics = evaluate_fsrs(word_ids, recalls, days, weights)
+    metrics.pop('calibration', None)
+    if not args.dry_run:
+        store.save_scheduler_params('fsrs', list(weights), metrics)
+    return {
+        "reviews": metrics.get('reviews', 0),
+        "initial_log_loss": round(initial_loss, 5),
+        "final_log_loss": round(final_loss, 5),
+        "weights": [round(w, 4) for w in weights],
+        "saved": not args.dry_run
+    }
+
+
+def cmd_evaluate_fsrs(store, args):
+    word_ids, recalls, days, _ = store.load_review_history(with_times=True)
+    weights = DEFAULT_FSRS_WEIGHTS if args.default_weights else load_fsrs_weights(store)
+    return evaluate_fsrs(word_ids, recalls, days, weights, bins=args.bins)
+
+
+def cmd_rebuild_forecast(store, args):
+    return {"days": store.rebuild_review_forecast()}
+
+
+def cmd_rebuild_progress(store, args):
+    return {"days": store.rebuild_progress()}
+
+
+def cmd_compact_sessions(store, args):
+    cutoff = storage.format_timestamp(datetime.utcnow() - timedelta(days=args.older_than_days))
+    return store.compact_sessions(cutoff, batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+def cmd_maintain(store, args):
+    if args.enable_incremental_vacuum:
+        store.enable_incremental_vacuum()
+    return store.maintain(batch_size=args.batch_size, vacuum_pages=args.vacuum_pages)
+
+
+def cmd_migrate_timestamps(store, args):
+    if args.status:
+        return store.timestamp_status()
+    log = (lambda message: print(message, file=sys.stderr)) if args.verbose else None
+    return store.migrate_timestamps(batch_size=args.batch_size, log=log)
+
+
+def cmd_backfill_lookup_keys(store, args):
+    log = (lambda message: print(message, file=sys.stderr)) if args.verbose else None
+    return {"written": store.backfill_lookup_keys(batch_size=args.batch_size, recompute=args.all, log=log)}
+
+
+def cmd_backfill_phonetic_keys(store, args):
+    log = (lambda message: print(message, file=sys.stderr)) if args.verbose else None
+    return {"written": store.backfill_phonetic_keys(batch_size=args.batch_size, recompute=args.all, log=log)}
+
+
+def cmd_plan_reviews(store, args):
+    return store.plan_reviews(args.day or datetime.utcnow().date().isoformat(),
+                              by_retrievability=args.scheduler == 'fsrs',
+                              due_limit=args.due_limit, new_limit=args.new_limit)
+
+
+def cmd_build_related(store, args):
+    log = (lambda message: print(message, file=sys.stderr)) if args.verbose else None
+    return RelatedIndex(store).rebuild(log=log)
+
+
+def cmd_backup(store, args):
+    log = (lambda message: print(message, file=sys.stderr)) if args.verbose else None
+    return backup.backup_database(store.path, args.backup_dir, pages=args.pages, pause=args.pause_ms / 1000,
+                                  compress=args.compress, keep=args.keep, log=log)
+
+
+def cmd_list_backups(store, args):
+    return backup.list_backups(store.path, args.backup_dir)
+
+
+def cmd_verify_backup(store, args):
+    path = args.path
+    if path is None:
+        generations = backup.list_backups(store.path, args.backup_dir)
+        if not generations:
+            sys.exit(f'No backups of {store.path}')
+        path = generations[0]["path"]
+    result = backup.verify_backup(path)
+    if not result["ok"]:
+        print(json.dumps(result, indent=2), file=sys.stderr)
+        sys.exit(1)
+    return result
+
+
+def cmd_restore_backup(store, args):
+    store.close()
+    return backup.restore_backup(args.path, store.path)
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='English Word Learning maintenance commands')
+    parser.add_argument('--db', type=str, default=storage.DB_PATH,
+                      help='Path to the SQLite database')
+    parser.add_argument('--learner', type=str, default=None,
+                      help="Run against this learner's shard instead of --db")
+    parser.add_argument('--shard-dir', type=str, default=sharding.SHARD_DIR,
+                      help='Shard directory of multi-learner mode (default: $WORDS_SHARD_DIR)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sub = commands.add_parser(
+        'reschedule', help='Rebuild review_schedule by replaying SM-2 over study_sessions',
+        description='SM-2 parameters given here are saved in the database and used by every later '
+                    'review; parameters left out keep their saved values.')
+    sub.add_argument('--dry-run', action='store_true',
+                     help='Compute the schedule without writing it')
+    sub.add_argument('--initial-ease', type=float, default=None,
+                     help=f'(default: {DEFAULT_SM2.initial_ease})')
+    sub.add_argument('--initial-interval', type=int, default=None,
+                     help=f'(default: {DEFAULT_SM2.initial_interval})')
+    sub.add_argument('--ease-floor', type=float, default=None,
+                     help=f'(default: {DEFAULT_SM2.ease_floor})')
+    sub.add_argument('--lapse-penalty', type=float, default=None,
+                     help=f'(default: {DEFAULT_SM2.lapse_penalty})')
+    sub.add_argument('--pass-score', type=int, default=None,
+                     help=f'(default: {DEFAULT_SM2.pass_score})')
+    sub.add_argument('--seed-intervals', type=parse_seed_intervals, default=None,
+                     help='Fixed interval transitions as current:next pairs (default: "1:1,2:6")')
+    sub.add_argument('--reset-params', action='store_true',
+                     help='Start from the default SM-2 parameters instead of the saved ones')
+    sub.add_argument('--scheduler', choices=['sm2', 'fsrs'], default=os.environ.get('WORDS_SCHEDULER', 'sm2'),
+                     help='Scheduler whose intervals are written (fsrs uses the fitted weights; '
+                          'sm2 clears FSRS state)')
+    sub.add_argument('--retention', type=float, default=DEFAULT_RETENTION,
+                     help='FSRS target retention')
+    sub.set_defaults(handler=cmd_reschedule)
+
+    sub = commands.add_parser('fit-fsrs', help='Fit FSRS weights to the study_sessions recall history')
+    sub.add_argument('--iterations', type=int, default=100)
+    sub.add_argument('--learning-rate', type=float, default=0.02)
+    sub.add_argument('--processes', type=int, default=1,
+                     help='Worker processes; the history is split between them by word')
+    sub.add_argument('--from-defaults', action='store_true',
+                     help='Start from the default weights instead of the last fit')
+    sub.add_argument('--dry-run', action='store_true',
+                     help='Fit without saving the weights')
+    sub.add_argument('--verbose', action='store_true',
+                     help='Print the loss of every iteration to stderr')
+    sub.set_defaults(handler=cmd_fit_fsrs)
+
+    sub = commands.add_parser('evaluate-fsrs', help='Report predicted retention against actual recall')
+    sub.add_argument('--default-weights', action='store_true',
+                     help='Evaluate the default weights instead of the fitted ones')
+    sub.add_argument('--bins', type=int, default=10,
+                     help='Number of calibration bins')
+    sub.set_defaults(handler=cmd_evaluate_fsrs)
+
+    sub = commands.add_parser('rebuild-forecast', help='Recount the per-day review forecast from review_schedule')
+    sub.set_defaults(handler=cmd_rebuild_forecast)
+
+    sub = commands.add_parser('rebuild-progress',
+                              help='Recount the learning progress counters from words, schedules and study history')
+    sub.set_defaults(handler=cmd_rebuild_progress)
+
+    sub = commands.add_parser('compact-sessions',
+                              help='Roll old study sessions up into daily summaries and delete them')
+    sub.add_argument('--older-than-days', type=int, default=storage.SESSION_RETENTION_DAYS,
+                     help='Compact sessions older than this (default: $WORDS_SESSION_RETENTION_DAYS or 365)')
+    sub.add_argument('--batch-size', type=int, default=50000,
+                     help='Session IDs per transaction')
+    sub.add_argument('--dry-run', action='store_true',
+                     help='Only count the sessions that would be compacted')
+    sub.set_defaults(handler=cmd_compact_sessions)
+
+    sub = commands.add_parser('maintain',
+                              help='Remove orphaned rows, ANALYZE and incrementally vacuum')
+    sub.add_argument('--batch-size', type=int, default=5000,
+                     help='Rows examined per transaction when removing orphans')
+    sub.add_argument('--vacuum-pages', type=int, default=1000,
+                     help='Free pages released per transaction')
+    sub.add_argument('--enable-incremental-vacuum', action='store_true',
+                     help='First switch an older database to incremental auto-vacuum (one full VACUUM)')
+    sub.set_defaults(handler=cmd_maintain)
+
+    sub = commands.add_parser('migrate-timestamps',
+                              help='Convert ISO text timestamps to epoch milliseconds (online, resumable)')
+    sub.add_argument('--batch-size', type=int, default=10000,
+                     help='Rows converted per transaction')
+    sub.add_argument('--status', action='store_true',
+                     help='Only report the stored format and the rows left to convert')
+    sub.add_argument('--verbose', action='store_true',
+                     help='Print progress to stderr')
+    sub.set_defaults(handler=cmd_migrate_timestamps)
+
+    sub = commands.add_parser('backfill-lookup-keys',
+                              help='Fill in the normalized lookup key of words that have none')
+    sub.add_argument('--batch-size', type=int, default=1000,
+                     help='Words updated per transaction')
+    sub.add_argument('--all', action='store_true',
+                     help='Recompute every key, e.g. after the lemmatizer rules changed')
+    sub.add_argument('--verbose', action='store_true',
+                     help='Print progress to stderr')
+    sub.set_defaults(handler=cmd_backfill_lookup_keys)
+
+    sub = commands.add_parser('backfill-phonetic-keys',
+                              help='Fill in the phonetic keys of words that have none')
+    sub.add_argument('--batch-size', type=int, default=1000,
+                     help='Words updated per transaction')
+    sub.add_argument('--all', action='store_true',
+                     help='Recompute every key, e.g. after the phonetic rules changed')
+    sub.add_argument('--verbose', action='store_true',
+                     help='Print progress to stderr')
+    sub.set_defaults(handler=cmd_backfill_phonetic_keys)
+
+    sub = commands.add_parser('build-related',
+                              help='Recompute the related-words neighbor table from TF-IDF vectors')
+    sub.add_argument('--verbose', action='store_true',
+                     help='Print progress to stderr')
+    sub.set_defaults(handler=cmd_build_related)
+
+    sub = commands.add_parser('plan-reviews',
+                              help="Build the day's review plan served by getNextReviewWords (e.g. from cron)")
+    sub.add_argument('--day', help='Day to plan, YYYY-MM-DD (default: today, UTC)')
+    sub.add_argument('--due-limit', type=int, default=storage.PLAN_DUE_LIMIT,
+                     help='Most due words in the plan')
+    sub.add_argument('--new-limit', type=int, default=storage.PLAN_NEW_LIMIT,
+                     help='Most new words in the plan')
+    sub.add_argument('--scheduler', choices=['sm2', 'fsrs'], default=os.environ.get('WORDS_SCHEDULER', 'sm2'),
+                     help='Scheduler the servers use (FSRS orders due words by forgetting)')
+    sub.set_defaults(handler=cmd_plan_reviews)
+
+    sub = commands.add_parser('backup',
+                              help='Copy the live database into a new rotated backup generation')
+    sub.add_argument('--backup-dir', type=str, default=None,
+                     help='Where generations go (default: $WORDS_BACKUP_DIR or backups/ next to the database)')
+    sub.add_argument('--pages', type=int, default=backup.BACKUP_PAGES,
+                     help='Pages copied per step (-1: all at once)')
+    sub.add_argument('--pause-ms', type=float, default=backup.BACKUP_PAUSE * 1000,
+                     help='Pause between steps, leaving the database to the servers')
+    sub.add_argument('--compress', action='store_true', default=backup.BACKUP_COMPRESS,
+                     help='gzip the generation')
+    sub.add_argument('--keep', type=int, default=backup.BACKUP_KEEP,
+                     help='Generations kept; older ones are deleted')
+    sub.add_argument('--verbose', action='store_true',
+                     help='Print progress to stderr')
+    sub.set_defaults(handler=cmd_backup)
+
+    sub = commands.add_parser('list-backups', help='List the backup generations, newest first')
+    sub.add_argument('--backup-dir', type=str, default=None)
+    sub.set_defaults(handler=cmd_list_backups)
+
+    sub = commands.add_parser('verify-backup', help='Run an integrity check on a backup generation')
+    sub.add_argument('path', nargs='?', default=None,
+                     help='Generation to check (default: the newest)')
+    sub.add_argument('--backup-dir', type=str, default=None)
+    sub.set_defaults(handler=cmd_verify_backup)
+
+    sub = commands.add_parser('restore-backup',
+                              help='Verify a backup generation and copy it over the database',
+                              description='Servers may stay up: they see the restored contents with '
+                                          'their next transaction.')
+    sub.add_argument('path', help='Generation to restore')
+    sub.set_defaults(handler=cmd_restore_backup)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    path = args.db
+    if args.learner is not None:
+        if not args.shard_dir:
+            sys.exit('--learner requires --shard-dir or WORDS_SHARD_DIR')
+        path = sharding.ShardRouter(args.shard_dir).path_for(args.learner)
+        if not os.path.exists(path):
+            sys.exit(f'No shard for learner {args.learner!r} in {args.shard_dir}')
+    store = storage.get_storage(path)
+    store.init_db()
+    try:
+        result = args.handler(store, args)
+    finally:
+        store.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,38 @@
+import time
+
+# (phase, perf_counter at its end) checkpoints reported by --profile-startup
+_startup = [("start", time.perf_counter())]
+
 from mcp.server.fastmcp import FastMCP
 import json
-from datetime import datetime, timedelta
 import os
-import sqlite3
-from typing import List, Dict, Optional, Any, Union
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Tuple, Union
 import argparse
 
+_startup.append(("import mcp", time.perf_counter()))
+
+from backup import BACKUP_COMPRESS, BACKUP_INTERVAL, BackupScheduler, backup_database, verify_backup
+from scheduling import (DEFAULT_RETENTION, fsrs_retrievability, load_fsrs_weights, load_sm2_params,
+                        reschedule, review_step)
+from indexes import word_changed
+from quiz import QUIZ_MODES, build_quiz, get_quiz_pool
+from related import NEIGHBORS, get_related_index
+from sharding import get_router
+from storage import (DB_PATH, MEMORY_REPLICA, ON_CONFLICT_ERROR, SCHEMA_VERSION, SESSION_RETENTION_DAYS,
+                     UPDATABLE_FIELDS, DuplicateWordError, WordConflictError, WordRecord, format_timestamp,
+                     get_storage, to_dicts)
+from write_behind import WRITE_BEHIND, WriteBehindLog
+
+_startup.append(("import storage and scheduling", time.perf_counter()))
+
 # Create an MCP server for English Word Learning
 mcp = FastMCP("EnglishWordLearning")
 
-# Initialize SQLite database
-DB_PATH = os.path.join(os.path.dirname(__file__), 'english_words.db')
-
 def parse_args():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description='English Word Learning MCP Server')
@@ -21,59 +42,95 @@ def parse_args():
                       help='Host to bind to when using SSE transport')
     parser.add_argument('--port', type=int, default=5000,
                       help='Port to bind to when using SSE transport')
+    parser.add_argument('--profile-startup', action='store_true',
+                      help='Report import and initialization time and spawn-to-handshake latency, then exit')
+    parser.add_argument('--profile-runs', type=int, default=5,
+                      help='Server processes spawned by --profile-startup')
     return parser.parse_args()
 
+# Shared storage engine (schema, pooled connections, row cache)
+store = get_storage(DB_PATH)
+
+# Multi-learner mode: with WORDS_SHARD_DIR set, tools called with a
+# learner_id read and write that learner's own shard database
+shards = get_router()
+
+# Scheduler used by trackWordStudy and getNextReviewWords: 'sm2' or 'fsrs'
+SCHEDULER = os.environ.get('WORDS_SCHEDULER', 'sm2')
+
+# Target recall probability when scheduling with FSRS
+FSRS_RETENTION = float(os.environ.get('WORDS_FSRS_RETENTION', DEFAULT_RETENTION))
+
+# Set once init_db has run; the schema is checked on first use rather than
+# at import, so a new stdio session answers its handshake without touching
+# the database
+_schema_ready = False
+_init_lock = threading.Lock()
+
+# Write-behind mode (WORDS_WRITE_BEHIND=1): trackWordStudy on the single
+# database acknowledges reviews from this log and stores them in the
+# background; started by init_db, which also replays a crashed server's log
+study_log: Optional[WriteBehindLog] = None
+
+# Scheduled backups of the single database (WORDS_BACKUP_INTERVAL_MINUTES);
+# server processes sharing the database skip a backup another one just made
+backups: Optional[BackupScheduler] = None
+
 def init_db():
     """Initialize the database with the necessary tables"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create words table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS words (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        word TEXT UNIQUE NOT NULL,
-        pronunciation TEXT,
-        translations TEXT,
-        definitions TEXT,
-        examples TEXT,
-        notes TEXT,
-        created_at TIMESTAMP,
-        updated_at TIMESTAMP
-    )
-    ''')
-    
-    # Create study sessions table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS study_sessions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        word_id INTEGER NOT NULL,
-        study_time INTEGER NOT NULL,
-        recall_score INTEGER NOT NULL,
-        studied_at TIMESTAMP NOT NULL,
-        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
-    )
-    ''')
-    
-    # Create review schedule table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS review_schedule (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        word_id INTEGER NOT NULL,
-        next_review TIMESTAMP NOT NULL,
-        ease_factor REAL NOT NULL DEFAULT 2.5,
-        interval INTEGER NOT NULL DEFAULT 1,
-        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-# Initialize the database
-init_db()
+    global _schema_ready, study_log, backups
+    with _init_lock:
+        store.init_db()
+        if MEMORY_REPLICA:
+            # Reads of the single database from memory (WORDS_MEMORY_REPLICA=1)
+            store.start_replica()
+        if WRITE_BEHIND and study_log is None:
+            study_log = WriteBehindLog(store)
+        if BACKUP_INTERVAL > 0 and backups is None:
+            backups = BackupScheduler(store.path, BACKUP_INTERVAL * 60,
+                                      log=lambda message: print(message, file=sys.stderr))
+        _schema_ready = True
+
+@contextmanager
+def store_for(learner_id: Optional[str] = None, create: bool = False):
+    """Storage for a learner's shard, or the single database when learner_id is omitted
+
+    A shard stays open until the block exits. Only tools that add words pass
+    create=True; anything else fails for a learner without a shard.
+    """
+    if learner_id is None:
+        if not _schema_ready:
+            init_db()
+        yield store
+        return
+    if shards is None:
+        raise ValueError("learner_id requires multi-learner mode (set WORDS_SHARD_DIR)")
+    with shards.lease(learner_id, create=create) as db:
+        yield db
+
+def get_fsrs_weights(db=None):
+    """FSRS weights fitted to a database (manage.py fit-fsrs), or the defaults"""
+    return load_fsrs_weights(db or store)
 
 # Helper functions for database operations
+
+def due_words(db, count: int, cursor: int = 0) -> Tuple[List[WordRecord], int]:
+    """The next words of today's review plan (with their schedule) and the cursor after them
+
+    The plan interleaves words due today with words never studied (see
+    Storage.plan_reviews). FSRS serves the words most likely to be
+    forgotten first, with their retrievability.
+    """
+    now = datetime.utcnow()
+    words, cursor = db.get_planned_words(now.date().isoformat(), count, cursor,
+                                         by_retrievability=(SCHEDULER == 'fsrs'))
+    if SCHEDULER == 'fsrs':
+        for word in words:
+            if word.get('stability') and word.get('last_review'):
+                elapsed = (now - datetime.fromisoformat(word['last_review'])).total_seconds() / 86400
+                word['retrievability'] = fsrs_retrievability(elapsed, word['stability'])
+    return words, cursor
+
 def dict_to_json(data: Dict) -> str:
     """Convert dictionary to JSON string"""
     return json.dumps(data)
@@ -82,51 +139,15 @@ def json_to_dict(json_str: str) -> Dict:
     """Convert JSON string to dictionary"""
     return json.loads(json_str) if json_str else {}
 
-def format_timestamp(dt: datetime) -> str:
-    """Format datetime to ISO format"""
-    return dt.isoformat()
-
-def get_word_by_id(word_id: int) -> Dict:
+def get_word_by_id(word_id: int, learner_id: Optional[str] = None) -> Optional[WordRecord]:
     """Get a word by ID from the database"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM words WHERE id = ?", (word_id,))
-    row = cursor.fetchone()
-    
-    if not row:
-        conn.close()
-        return None
-    
-    word = dict(row)
-    word['translations'] = json.loads(word['translations'])
-    word['definitions'] = json.loads(word['definitions'])
-    word['examples'] = json.loads(word['examples'])
-    
-    conn.close()
-    return word
+    with store_for(learner_id) as db:
+        return db.get_word(word_id)
 
-def get_word_by_text(word_text: str) -> Dict:
+def get_word_by_text(word_text: str, learner_id: Optional[str] = None) -> Optional[WordRecord]:
     """Get a word by text from the database"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM words WHERE word = ?", (word_text,))
-    row = cursor.fetchone()
-    
-    if not row:
-        conn.close()
-        return None
-    
-    word = dict(row)
-    word['translations'] = json.loads(word['translations'])
-    word['definitions'] = json.loads(word['definitions'])
-    word['examples'] = json.loads(word['examples'])
-    
-    conn.close()
-    return word
+    with store_for(learner_id) as db:
+        return db.get_word_by_text(word_text)
 
 # Word Management API tools
 
@@ -137,7 +158,9 @@ def saveWord(
     translations: List[str], 
     definitions: List[str], 
     examples: List[str], 
-    notes: str
+    notes: str,
+    onConflict: str = ON_CONFLICT_ERROR,
+    learner_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Store a new word and its information in the database
@@ -149,57 +172,41 @@ def saveWord(
         definitions: List of English definitions
         examples: Example sentences using the word
         notes: Additional usage notes
+        onConflict: If the word is already saved: "error" (default), "merge"
+            (add new translations, definitions and examples; take pronunciation
+            and notes if not empty) or "replace" (overwrite every field)
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
     Returns:
-        Word ID and status
+        Word ID, whether it was created, and status
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check if word already exists
-        cursor.execute("SELECT id FROM words WHERE word = ?", (word,))
-        existing = cursor.fetchone()
-        
-        if existing:
-            word_id = existing[0]
-            conn.close()
-            return {
-                "status": "error",
-                "message": "Word already exists",
-                "word_id": word_id
-            }
-        
-        # Prepare data
-        now = format_timestamp(datetime.utcnow())
-        translations_json = dict_to_json(translations)
-        definitions_json = dict_to_json(definitions)
-        examples_json = dict_to_json(examples)
-        
-        # Insert word
-        cursor.execute(
-            """
-            INSERT INTO words 
-            (word, pronunciation, translations, definitions, examples, notes, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, 
-            (word, pronunciation, translations_json, definitions_json, examples_json, notes, now, now)
-        )
-        
-        # Get the ID of the inserted word
-        word_id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
+        with store_for(learner_id, create=True) as db:
+            word_id, created = db.upsert_word({
+                "word": word,
+                "pronunciation": pronunciation,
+                "translations": translations,
+                "definitions": definitions,
+                "examples": examples,
+                "notes": notes
+            }, onConflict)
+            word_changed(db, word_id)
         
         # Return the word info
-        word_data = get_word_by_id(word_id)
+        word_data = get_word_by_id(word_id, learner_id)
         
         return {
             "status": "success",
-            "message": "Word saved successfully",
+            "message": "Word saved successfully" if created else f"Existing word updated ({onConflict})",
             "word_id": word_id,
-            "word": word_data
+            "created": created,
+            "word": word_data.to_dict()
+        }
+    except DuplicateWordError as e:
+        return {
+            "status": "error",
+            "message": "Word already exists",
+            "word_id": e.word_id
         }
     except Exception as e:
         return {
@@ -208,22 +215,23 @@ def saveWord(
         }
 
 @mcp.tool()
-def getWord(word_id: int = None, word: str = None) -> Dict[str, Any]:
+def getWord(word_id: int = None, word: str = None, learner_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Retrieve information about a specific word
     
     Args:
         word_id: Word identifier (numeric ID)
         word: The actual word text (alternative to word_id)
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
     Returns:
         Complete word information
     """
     try:
         if word_id is not None:
-            word_data = get_word_by_id(word_id)
+            word_data = get_word_by_id(word_id, learner_id)
         elif word is not None:
-            word_data = get_word_by_text(word)
+            word_data = get_word_by_text(word, learner_id)
         else:
             return {
                 "status": "error",
@@ -238,7 +246,7 @@ def getWord(word_id: int = None, word: str = None) -> Dict[str, Any]:
         
         return {
             "status": "success",
-            "word": word_data
+            "word": word_data.to_dict()
         }
     except Exception as e:
         return {
@@ -247,65 +255,83 @@ def getWord(word_id: int = None, word: str = None) -> Dict[str, Any]:
         }
 
 @mcp.tool()
-def updateWord(word_id: int, fieldToUpdate: str, newValue: Union[str, List[str]]) -> Dict[str, Any]:
+def updateWord(word_id: int, fieldToUpdate: Optional[str] = None, newValue: Union[str, List[str], None] = None,
+               changes: Optional[Dict[str, Any]] = None, expectedUpdatedAt: Optional[str] = None,
+               learner_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Update information for an existing word
     
+    Either one field (fieldToUpdate and newValue, returns the whole word) or
+    several at once (changes, returns only the changed fields).
+    
     Args:
         word_id: Word identifier
         fieldToUpdate: Field to be updated
         newValue: New value for the field (string for word/pronunciation/notes, list for translations/definitions/examples)
+        changes: Fields to update together, e.g. {"pronunciation": "...", "notes": "..."}
+        expectedUpdatedAt: The word's updated_at when it was read; the update
+            is refused if the word has changed since
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
     Returns:
         Updated word information
     """
     try:
-        # Check if the field is valid
-        valid_fields = ['word', 'pronunciation', 'translations', 'definitions', 'examples', 'notes']
-        if fieldToUpdate not in valid_fields:
+        if changes is None:
+            if fieldToUpdate is None:
+                return {
+                    "status": "error",
+                    "message": "Give fieldToUpdate and newValue, or changes"
+                }
+            # Check if the field is valid
+            if fieldToUpdate not in UPDATABLE_FIELDS:
+                return {
+                    "status": "error",
+                    "message": f"Invalid field: {fieldToUpdate}"
+                }
+            patch = {fieldToUpdate: newValue}
+        else:
+            patch = changes
+        
+        # Update every field in one statement
+        with store_for(learner_id) as db:
+            updated = db.patch_word(word_id, patch, expectedUpdatedAt)
+            if updated is not None:
+                word_changed(db, word_id)
+        if updated is None:
             return {
                 "status": "error",
-                "message": f"Invalid field: {fieldToUpdate}"
+                "message": "Word not found"
             }
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Check if word exists
-        cursor.execute("SELECT * FROM words WHERE id = ?", (word_id,))
-        word = cursor.fetchone()
-        
-        if not word:
-            conn.close()
+        if changes is not None:
             return {
-                "status": "error",
-                "message": "Word not found"
+                "status": "success",
+                "message": "Word updated successfully",
+                "word_id": word_id,
+                "updated_at": updated["updated_at"],
+                "changed": {field: updated[field] for field in patch}
             }
         
-        # Prepare the new value
-        if fieldToUpdate in ['translations', 'definitions', 'examples']:
-            value = dict_to_json(newValue)
-        else:
-            value = newValue
-            
-        # Update the field
-        now = format_timestamp(datetime.utcnow())
-        cursor.execute(
-            f"UPDATE words SET {fieldToUpdate} = ?, updated_at = ? WHERE id = ?",
-            (value, now, word_id)
-        )
-        
-        conn.commit()
-        conn.close()
-        
         # Get updated word
-        updated_word = get_word_by_id(word_id)
+        updated_word = get_word_by_id(word_id, learner_id)
         
         return {
             "status": "success",
             "message": "Word updated successfully",
-            "word": updated_word
+            "word": updated_word.to_dict()
+        }
+    except WordConflictError as e:
+        return {
+            "status": "error",
+            "message": "Word was changed since expectedUpdatedAt",
+            "updated_at": e.updated_at
+        }
+    except DuplicateWordError as e:
+        return {
+            "status": "error",
+            "message": "Word already exists",
+            "word_id": e.word_id
         }
     except Exception as e:
         return {
@@ -314,35 +340,146 @@ def updateWord(word_id: int, fieldToUpdate: str, newValue: Union[str, List[str]]
         }
 
 @mcp.tool()
-def getAllWords() -> Dict[str, Any]:
+def getAllWords(learner_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Get a list of all words in the database
     
+    Args:
+        learner_id: Learner whose shard to use (multi-learner mode only)
+        
     Returns:
         Array of all words
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with store_for(learner_id) as db:
+            words = db.get_all_words()
         
-        cursor.execute("SELECT * FROM words ORDER BY word")
-        rows = cursor.fetchall()
+        return {
+            "status": "success",
+            "count": len(words),
+            "words": to_dicts(words)
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def getChangesSince(cursor: int = 0, limit: int = 500, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get what changed in words, review schedules and study sessions since a cursor
+    
+    For clients keeping a local copy: pull everything once (getAllWords),
+    then pass the returned cursor back to get only later changes, deletes
+    included. Several changes to a row come back as its current state.
+    
+    Args:
+        cursor: Cursor returned by the previous call (0 for the first)
+        limit: Change log entries read per call (max 5000)
+        learner_id: Learner whose shard to use (multi-learner mode only)
+        
+    Returns:
+        Changes (seq, table, op "upsert" with the row or "delete", id,
+        word_id), the next cursor, has_more, and reset: when true the
+        cursor is no longer usable; pull everything again and continue
+        from the returned cursor
+    """
+    try:
+        if cursor < 0 or not 1 <= limit <= 5000:
+            return {
+                "status": "error",
+                "message": "cursor must not be negative and limit must be between 1 and 5000"
+            }
         
-        words = []
-        for row in rows:
-            word = dict(row)
-            word['translations'] = json.loads(word['translations'])
-            word['definitions'] = json.loads(word['definitions'])
-            word['examples'] = json.loads(word['examples'])
-            words.append(word)
+        with store_for(learner_id) as db:
+            return {
+                "status": "success",
+                **db.get_changes(cursor, limit)
+            }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def getRelatedWords(word_id: int, k: int = 10, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get the saved words most related to a word, by similarity of their
+    definitions, examples and notes
+    
+    Args:
+        word_id: Word identifier
+        k: Number of related words to return (at most WORDS_RELATED_NEIGHBORS, default 20)
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
-        conn.close()
+    Returns:
+        Related words, most similar first, each with a similarity score (0-1)
+    """
+    try:
+        with store_for(learner_id) as db:
+            if db.get_word(word_id) is None:
+                return {
+                    "status": "error",
+                    "message": f"Word with ID {word_id} not found"
+                }
+            k = max(0, min(k, NEIGHBORS))
+            # Neighbors are precomputed: built for the whole vocabulary on
+            # first use, then kept up to date by every word write (MCP tools
+            # and Flask routes call indexes.word_changed)
+            if not db.has_neighbors():
+                get_related_index(db).rebuild()
+            words = db.get_related_words(word_id, k)
+            if not words and k:
+                # Written without word_changed (e.g. by hand or a restored backup)
+                get_related_index(db).refresh(word_id)
+                words = db.get_related_words(word_id, k)
         
         return {
             "status": "success",
+            "word_id": word_id,
             "count": len(words),
-            "words": words
+            "words": to_dicts(words)
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def findSoundAlike(query: str, limit: int = 10, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Find saved words that sound like a spelling or an IPA transcription
+    
+    Args:
+        query: A spelling, possibly wrong ("nolij"), or IPA ("/ˈnɒlɪdʒ/")
+        limit: Maximum number of words to return (default 10, max 100)
+        learner_id: Learner whose shard to use (multi-learner mode only)
+        
+    Returns:
+        Matching words, closest first, each with a similarity score (0-1)
+    """
+    try:
+        if not query or not query.strip():
+            return {
+                "status": "error",
+                "message": "query must not be empty"
+            }
+        if limit < 1 or limit > 100:
+            return {
+                "status": "error",
+                "message": "limit must be between 1 and 100"
+            }
+        with store_for(learner_id) as db:
+            words = db.find_sound_alike(query, limit)
+        
+        return {
+            "status": "success",
+            "query": query,
+            "count": len(words),
+            "words": to_dicts(words)
         }
     except Exception as e:
         return {
@@ -353,7 +490,8 @@ def getAllWords() -> Dict[str, Any]:
 # Learning Progress API tools
 
 @mcp.tool()
-def trackWordStudy(word_id: int, studyTime: int, recall: int) -> Dict[str, Any]:
+def trackWordStudy(word_id: int, studyTime: int, recall: int,
+                   learner_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Record a study session for a word and schedule next review
     
@@ -361,87 +499,95 @@ def trackWordStudy(word_id: int, studyTime: int, recall: int) -> Dict[str, Any]:
         word_id: Word identifier
         studyTime: Time spent studying in seconds
         recall: Recall score (1-5, with 5 being perfect recall)
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
     Returns:
         Updated learning status with next review time
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with store_for(learner_id) as db:
+            # Check if word exists
+            if db.get_word(word_id) is None:
+                return {
+                    "status": "error",
+                    "message": f"Word with ID {word_id} not found"
+                }
+        
+            now = datetime.utcnow()
+            now_str = format_timestamp(now)
+
+            # In write-behind mode the word's newest schedule may not be stored yet
+            log = study_log if learner_id is None else None
+            schedule = (log.schedule(word_id) if log else None) or db.get_schedule(word_id)
+        
+            # New ease factor and interval from SM-2, or with FSRS the interval
+            # from the word's memory stability
+            step = review_step(schedule, recall, now, SCHEDULER,
+                               get_fsrs_weights(db) if SCHEDULER == 'fsrs' else None, FSRS_RETENTION,
+                               load_sm2_params(db))
+            ease_factor, interval = step['ease_factor'], step['interval']
+            stability, difficulty = step['stability'], step['difficulty']
+            next_review_str = format_timestamp(step['next_review'])
+        
+            # Record the study session and update the review schedule together
+            review = (word_id, studyTime, recall, now_str, next_review_str, ease_factor, interval,
+                      stability, difficulty)
+            if log:
+                log.record(review, dict(step, next_review=next_review_str, last_review=now_str))
+            else:
+                db.record_studies([review])
+        
+            result = {
+                "status": "success",
+                "message": "Study session recorded",
+                "word_id": word_id,
+                "study_time": studyTime,
+                "recall": recall,
+                "next_review": next_review_str,
+                "interval": interval,
+                "ease_factor": ease_factor
+            }
+            if SCHEDULER == 'fsrs':
+                result["stability"] = stability
+                result["difficulty"] = difficulty
+            return result
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def getNextReviewWords(count: int = 10, cursor: int = 0, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get a list of words due for review based on spaced repetition
+    
+    Words come from today's review plan, built once a day: words due today
+    interleaved with new words, under daily limits. Studied words drop out.
+    
+    Args:
+        count: Number of words to return
+        cursor: Cursor returned by the previous call, to page through the
+            plan (default 0: the first words not studied yet)
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
-        # Check if word exists
-        cursor.execute("SELECT id FROM words WHERE id = ?", (word_id,))
-        if not cursor.fetchone():
-            conn.close()
+    Returns:
+        Array of words due for review and the cursor after them
+    """
+    try:
+        if cursor < 0:
             return {
                 "status": "error",
-                "message": f"Word with ID {word_id} not found"
+                "message": "cursor must not be negative"
             }
-        
-        # Record the study session
-        now = datetime.utcnow()
-        now_str = format_timestamp(now)
-        
-        cursor.execute(
-            "INSERT INTO study_sessions (word_id, study_time, recall_score, studied_at) VALUES (?, ?, ?, ?)",
-            (word_id, studyTime, recall, now_str)
-        )
-        
-        # Get current schedule if exists
-        cursor.execute("SELECT ease_factor, interval FROM review_schedule WHERE word_id = ?", (word_id,))
-        schedule = cursor.fetchone()
-        
-        if schedule:
-            ease_factor, interval = schedule
-        else:
-            ease_factor, interval = 2.5, 1  # Default values
-        
-        # Calculate new ease factor and interval based on SM-2 algorithm
-        if recall < 3:
-            # If recall was difficult, reset interval but adjust ease factor
-            interval = 1
-            ease_factor = max(1.3, ease_factor - 0.2)
-        else:
-            # Update ease factor
-            ease_factor = ease_factor + (0.1 - (5 - recall) * (0.08 + (5 - recall) * 0.02))
-            ease_factor = max(1.3, ease_factor)
-            
-            # Update interval
-            if interval == 1:
-                interval = 1
-            elif interval == 2:
-                interval = 6
-            else:
-                interval = round(interval * ease_factor)
-        
-        # Calculate next review date
-        next_review = now + timedelta(days=interval)
-        next_review_str = format_timestamp(next_review)
-        
-        # Update or insert review schedule
-        if schedule:
-            cursor.execute(
-                "UPDATE review_schedule SET next_review = ?, ease_factor = ?, interval = ? WHERE word_id = ?",
-                (next_review_str, ease_factor, interval, word_id)
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO review_schedule (word_id, next_review, ease_factor, interval) VALUES (?, ?, ?, ?)",
-                (word_id, next_review_str, ease_factor, interval)
-            )
-        
-        conn.commit()
-        conn.close()
+        with store_for(learner_id) as db:
+            words, cursor = due_words(db, count, cursor)
         
         return {
             "status": "success",
-            "message": "Study session recorded",
-            "word_id": word_id,
-            "study_time": studyTime,
-            "recall": recall,
-            "next_review": next_review_str,
-            "interval": interval,
-            "ease_factor": ease_factor
+            "count": len(words),
+            "cursor": cursor,
+            "words": to_dicts(words)
         }
     except Exception as e:
         return {
@@ -450,67 +596,35 @@ def trackWordStudy(word_id: int, studyTime: int, recall: int) -> Dict[str, Any]:
         }
 
 @mcp.tool()
-def getNextReviewWords(count: int = 10) -> Dict[str, Any]:
+def getQuiz(count: int = 10, mode: str = 'translation', learner_id: Optional[str] = None) -> Dict[str, Any]:
     """
-    Get a list of words due for review based on spaced repetition
+    Get a multiple-choice quiz on the words due for review
+    
+    Each question pairs a word from getNextReviewWords with its correct
+    answer and wrong answers taken from the learner's other words of the
+    same kind (guessed part of speech and length).
     
     Args:
-        count: Number of words to return
+        count: Number of questions
+        mode: "translation" (choose the word's translation) or "definition"
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
     Returns:
-        Array of words due for review
+        Questions with the word, its choices and the index of the correct one
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        now = format_timestamp(datetime.utcnow())
-        
-        # Get words due for review
-        cursor.execute("""
-            SELECT w.* FROM words w
-            JOIN review_schedule rs ON w.id = rs.word_id
-            WHERE rs.next_review <= ?
-            ORDER BY rs.next_review
-            LIMIT ?
-        """, (now, count))
-        
-        rows = cursor.fetchall()
-        
-        # If not enough words due for review, add words without schedules
-        if len(rows) < count:
-            remaining = count - len(rows)
-            cursor.execute("""
-                SELECT w.* FROM words w
-                WHERE w.id NOT IN (SELECT word_id FROM review_schedule)
-                ORDER BY w.created_at
-                LIMIT ?
-            """, (remaining,))
-            rows.extend(cursor.fetchall())
-        
-        words = []
-        for row in rows:
-            word = dict(row)
-            word['translations'] = json.loads(word['translations'])
-            word['definitions'] = json.loads(word['definitions'])
-            word['examples'] = json.loads(word['examples'])
-            
-            # Get review schedule info if available
-            cursor.execute("SELECT next_review, interval FROM review_schedule WHERE word_id = ?", (word['id'],))
-            schedule = cursor.fetchone()
-            if schedule:
-                word['next_review'] = schedule['next_review']
-                word['interval'] = schedule['interval']
-            
-            words.append(word)
-        
-        conn.close()
+        if mode not in QUIZ_MODES:
+            return {
+                "status": "error",
+                "message": f"mode must be one of {', '.join(QUIZ_MODES)}"
+            }
+        with store_for(learner_id) as db:
+            questions = build_quiz(get_quiz_pool(db), due_words(db, count)[0], mode)
         
         return {
             "status": "success",
-            "count": len(words),
-            "words": words
+            "count": len(questions),
+            "questions": questions
         }
     except Exception as e:
         return {
@@ -519,77 +633,252 @@ def getNextReviewWords(count: int = 10) -> Dict[str, Any]:
         }
 
 @mcp.tool()
-def getWordStats(word_id: int) -> Dict[str, Any]:
+def getWordStats(word_id: int, learner_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Retrieve learning statistics for a word
     
     Args:
         word_id: Word identifier
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
     Returns:
         Study history and performance metrics
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with store_for(learner_id) as db:
+            # Get word details
+            word = db.get_word(word_id)
+        
+            if not word:
+                return {
+                    "status": "error",
+                    "message": f"Word with ID {word_id} not found"
+                }
+        
+            # Get study sessions, daily summaries of compacted sessions and review schedule
+            sessions = db.get_sessions(word_id)
+            rollups = db.get_rollups(word_id)
+            schedule = db.get_schedule(word_id)
+        
+            # Calculate metrics over both raw and rolled-up sessions
+            totals = db.get_study_totals(word_id)
+            study_count = totals['study_count']
+            avg_recall = totals['recall_sum'] / study_count if study_count else 0
         
-        # Get word details
-        cursor.execute("SELECT * FROM words WHERE id = ?", (word_id,))
-        word_row = cursor.fetchone()
+            return {
+                "status": "success",
+                "word": word.to_dict(),
+                "study_sessions": sessions,
+                "study_rollups": rollups,
+                "schedule": schedule,
+                "metrics": {
+                    "total_study_time": totals['total_study_time'],
+                    "avg_recall": avg_recall,
+                    "study_count": study_count,
+                    "first_studied": totals['first_studied'],
+                    "last_studied": totals['last_studied']
+                }
+            }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def getReviewForecast(days: int = 7, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get how many reviews come due on each of the next days
+    
+    Args:
+        days: Number of days to forecast, starting today (UTC)
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
-        if not word_row:
-            conn.close()
+    Returns:
+        Overdue count and per-day due counts
+    """
+    try:
+        if days < 1 or days > 366:
             return {
                 "status": "error",
-                "message": f"Word with ID {word_id} not found"
+                "message": "days must be between 1 and 366"
             }
         
-        word = dict(word_row)
-        word['translations'] = json.loads(word['translations'])
-        word['definitions'] = json.loads(word['definitions'])
-        word['examples'] = json.loads(word['examples'])
+        today = datetime.utcnow().date().isoformat()
+        with store_for(learner_id) as db:
+            forecast = db.get_review_forecast(today, days)
         
-        # Get study sessions
-        cursor.execute("""
-            SELECT study_time, recall_score, studied_at
-            FROM study_sessions
-            WHERE word_id = ?
-            ORDER BY studied_at DESC
-        """, (word_id,))
+        return {
+            "status": "success",
+            "overdue": forecast["overdue"],
+            "days": forecast["days"]
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def getLearningProgress(days: int = 30, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Get an overview of learning progress: words by stage and daily activity
+    
+    Args:
+        days: Number of days of recall trend and study time, ending today (UTC)
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
-        sessions_rows = cursor.fetchall()
-        sessions = [dict(row) for row in sessions_rows]
+    Returns:
+        Total words, words by interval bucket (new, learning, young, mature)
+        and per-day reviews, average recall, recall rate, study time and
+        words added
+    """
+    try:
+        if days < 1 or days > 366:
+            return {
+                "status": "error",
+                "message": "days must be between 1 and 366"
+            }
+        
+        today = datetime.utcnow().date().isoformat()
+        with store_for(learner_id) as db:
+            progress = db.get_learning_progress(today, days, load_sm2_params(db).pass_score)
+        
+        return dict({"status": "success"}, **progress)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def rescheduleReviews(dryRun: bool = False, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Recompute every studied word's review schedule from its study history
+    
+    Replays the configured scheduler (SM-2 or FSRS) over all study sessions
+    at once and rewrites the review schedule in bulk. Use after changing
+    scheduler parameters, switching schedulers or importing history.
+    
+    Args:
+        dryRun: Compute the new schedule without saving it
+        learner_id: Learner whose shard to use (multi-learner mode only)
+        
+    Returns:
+        Number of sessions and words processed, with timings
+    """
+    try:
+        with store_for(learner_id) as db:
+            return {
+                "status": "success",
+                **reschedule(db, load_sm2_params(db), dry_run=dryRun, scheduler=SCHEDULER,
+                             fsrs_weights=get_fsrs_weights(db) if SCHEDULER == 'fsrs' else None,
+                             retention=FSRS_RETENTION)
+            }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def compactStudySessions(olderThanDays: int = SESSION_RETENTION_DAYS, dryRun: bool = False,
+                         learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Roll old study sessions up into per-word daily summaries and delete them
+    
+    Keeps each word's session count, total study time and recall histogram
+    per day, so getWordStats totals and rescheduling are unchanged, while
+    the raw study_sessions table stops growing without bound.
+    
+    Args:
+        olderThanDays: Compact sessions older than this many days
+        dryRun: Only count the sessions that would be compacted
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
-        # Get review schedule
-        cursor.execute("""
-            SELECT next_review, ease_factor, interval
-            FROM review_schedule
-            WHERE word_id = ?
-        """, (word_id,))
+    Returns:
+        Cutoff time, number of sessions compacted and batches run
+    """
+    try:
+        if olderThanDays < 1:
+            return {
+                "status": "error",
+                "message": "olderThanDays must be at least 1"
+            }
         
-        schedule_row = cursor.fetchone()
-        schedule = dict(schedule_row) if schedule_row else None
+        cutoff = format_timestamp(datetime.utcnow() - timedelta(days=olderThanDays))
+        with store_for(learner_id) as db:
+            return {
+                "status": "success",
+                **db.compact_sessions(cutoff, dry_run=dryRun)
+            }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def runMaintenance(batchSize: int = 5000, learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Clean up and compact the database without taking it offline
+    
+    Removes study sessions, schedules and rollups left behind by deleted
+    words (in batches), refreshes the query planner statistics, returns free
+    pages to the file system and reports the space reclaimed.
+    
+    Args:
+        batchSize: Rows examined per transaction when removing orphans
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
-        # Calculate metrics
-        total_study_time = sum(session['study_time'] for session in sessions)
-        avg_recall = sum(session['recall_score'] for session in sessions) / len(sessions) if sessions else 0
-        study_count = len(sessions)
+    Returns:
+        Orphans removed per table, space usage before and after, bytes reclaimed
+    """
+    try:
+        if batchSize < 1:
+            return {
+                "status": "error",
+                "message": "batchSize must be at least 1"
+            }
         
-        conn.close()
+        with store_for(learner_id) as db:
+            return {
+                "status": "success",
+                **db.maintain(batch_size=batchSize)
+            }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+@mcp.tool()
+def backupDatabase(compress: bool = BACKUP_COMPRESS, verify: bool = False,
+                   learner_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Back the database up while it stays in use
+    
+    Copies the database a few pages at a time with the SQLite backup API
+    into a new generation in the backup directory and deletes the oldest
+    generations beyond WORDS_BACKUP_KEEP. Reads and writes go on meanwhile.
+    
+    Args:
+        compress: gzip the backup
+        verify: Run an integrity check on the backup afterwards
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
+    Returns:
+        Backup path and size, pages copied, seconds taken, generations deleted
+        and, with verify, the integrity check result
+    """
+    try:
+        with store_for(learner_id) as db:
+            result = backup_database(db.path, compress=compress)
+        if verify:
+            result["verified"] = verify_backup(result["path"])["ok"]
         return {
             "status": "success",
-            "word": word,
-            "study_sessions": sessions,
-            "schedule": schedule,
-            "metrics": {
-                "total_study_time": total_study_time,
-                "avg_recall": avg_recall,
-                "study_count": study_count,
-                "first_studied": sessions[-1]['studied_at'] if sessions else None,
-                "last_studied": sessions[0]['studied_at'] if sessions else None
-            }
+            **result
         }
     except Exception as e:
         return {
@@ -664,45 +953,36 @@ def get_word_resource(word_id: str) -> Dict[str, Any]:
         return getWord(word=word_id)
 
 @mcp.tool()
-def removeWordByText(word: str) -> Dict[str, Any]:
+def removeWordByText(word: str, learner_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Remove a word from the database using the word text
     
     Args:
         word: The text of the word to be deleted
+        learner_id: Learner whose shard to use (multi-learner mode only)
         
     Returns:
         Status of the deletion operation
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        with store_for(learner_id) as db:
+            # Check if word exists
+            word_id = db.find_word_id(word)
+        
+            if word_id is None:
+                return {
+                    "status": "error",
+                    "message": f"Word '{word}' not found"
+                }
         
-        # Check if word exists
-        cursor.execute("SELECT id FROM words WHERE word = ?", (word,))
-        word_row = cursor.fetchone()
+            # Delete the word
+            db.delete_word(word_id)
+            word_changed(db, word_id)
         
-        if not word_row:
-            conn.close()
             return {
-                "status": "error",
-                "message": f"Word '{word}' not found"
+                "status": "success",
+                "message": f"Word '{word}' has been deleted successfully"
             }
-        
-        word_id = word_row[0]
-        
-        # Delete the word
-        cursor.execute("DELETE FROM words WHERE id = ?", (word_id,))
-        
-        # Commit changes
-        conn.commit()
-        
-        conn.close()
-        
-        return {
-            "status": "success",
-            "message": f"Word '{word}' has been deleted successfully"
-        }
     except Exception as e:
         return {
             "status": "error",
@@ -775,10 +1055,60 @@ def removeWordByText(word: str) -> Dict[str, Any]:
 #             "message": str(e)
 #         }
 
+_startup.append(("register tools", time.perf_counter()))
+
+def handshake_latency(runs: int) -> List[float]:
+    """Milliseconds from spawning a stdio server to its initialize response"""
+    request = json.dumps({
+        "jsonrpc": "2.0", "id": 1, "method": "initialize",
+        "params": {"protocolVersion": "2024-11-05", "capabilities": {},
+                   "clientInfo": {"name": "profile-startup", "version": "0"}}
+    }) + "\n"
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            server.stdin.write(request.encode())
+            server.stdin.flush()
+            if not server.stdout.readline():
+                raise RuntimeError("server exited before answering initialize")
+            samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            server.kill()
+            server.wait()
+    return samples
+
+def profile_startup(runs: int) -> Dict[str, Any]:
+    """Time spent in each startup phase of this process, then in spawned servers"""
+    schema_current = store.schema_version() >= SCHEMA_VERSION
+    init_db()
+    _startup.append(("schema check (first use)", time.perf_counter()))
+    phases = {name: round((end - start) * 1000, 2)
+              for (_, start), (name, end) in zip(_startup, _startup[1:])}
+    samples = sorted(handshake_latency(runs)) if runs > 0 else []
+    return {
+        "phases_ms": phases,
+        "module_total_ms": round((_startup[-2][1] - _startup[0][1]) * 1000, 2),
+        "schema_current": schema_current,
+        "handshake_ms": {
+            "runs": len(samples),
+            "min": round(samples[0], 1),
+            "median": round(samples[len(samples) // 2], 1),
+            "max": round(samples[-1], 1),
+        } if samples else None,
+    }
+
 if __name__ == "__main__":
     # Parse command line arguments
     args = parse_args()
     
+    if args.profile_startup:
+        print(json.dumps(profile_startup(args.profile_runs), indent=2))
+        sys.exit(0)
+    
     # Start the MCP server with the specified transport
     if args.transport == 'sse':
         mcp.settings.host = args.host
@@ -0,0 +1,127 @@
+"""Normalized lookup keys for word texts
+
+``lookup_key`` maps the forms a learner (or an LLM) might type for the same
+entry to one key: Unicode NFKC, case folded, whitespace trimmed and
+collapsed, and every token lemmatized, so "Running", "running" and "ran" all
+become "run" and "Looking  up" becomes "look up". Stored in
+``words.lookup_key`` and used by text lookups and the duplicate check on save.
+
+The lemmatizer is local and rule based: an exception list of irregular
+forms, then suffix rules for plurals, -ing and -ed. It prefers leaving a
+word alone over a wrong merge, so unusual forms may keep their own key: a
+past tense or plural that is also a headword of its own ("saw", "found",
+"bit", "felt") is never mapped to another entry.
+Changing the rules changes keys; re-key stored words with
+``manage.py backfill-lookup-keys --all``.
+"""
+import re
+import unicodedata
+
+# Irregular inflections and forms the suffix rules get wrong. Forms that are
+# also common base forms (saw, found, bit, fell, felt, spoke, stole, drunk,
+# being) stay out: mapping them would merge two headwords.
+IRREGULAR = {
+    # be, have, do, go
+    'am': 'be', 'is': 'be', 'are': 'be', 'was': 'be', 'were': 'be', 'been': 'be',
+    'has': 'have', 'had': 'have', 'having': 'have',
+    'does': 'do', 'did': 'do', 'done': 'do', 'doing': 'do',
+    'goes': 'go', 'went': 'go', 'gone': 'go', 'going': 'go',
+    # Irregular verbs
+    'ran': 'run', 'came': 'come', 'became': 'become', 'seen': 'see',
+    'took': 'take', 'taken': 'take', 'gave': 'give', 'given': 'give', 'made': 'make',
+    'got': 'get', 'gotten': 'get', 'said': 'say', 'says': 'say', 'knew': 'know', 'known': 'know',
+    'thought': 'think', 'brought': 'bring', 'bought': 'buy', 'caught': 'catch', 'taught': 'teach',
+    'told': 'tell', 'kept': 'keep', 'began': 'begin',
+    'begun': 'begin', 'wrote': 'write', 'written': 'write', 'spoken': 'speak',
+    'ate': 'eat', 'eaten': 'eat', 'drank': 'drink', 'swam': 'swim',
+    'swum': 'swim', 'sang': 'sing', 'sung': 'sing', 'drove': 'drive', 'driven': 'drive',
+    'rode': 'ride', 'ridden': 'ride', 'chose': 'choose', 'chosen': 'choose', 'broke': 'break',
+    'broken': 'break', 'forgot': 'forget', 'forgotten': 'forget', 'understood': 'understand',
+    'stood': 'stand', 'sat': 'sit', 'met': 'meet', 'paid': 'pay', 'heard': 'hear', 'sent': 'send',
+    'built': 'build', 'spent': 'spend', 'held': 'hold', 'won': 'win', 'lost': 'lose', 'sold': 'sell',
+    'fallen': 'fall', 'grew': 'grow', 'grown': 'grow', 'threw': 'throw',
+    'thrown': 'throw', 'flew': 'fly', 'flown': 'fly', 'drew': 'draw', 'drawn': 'draw',
+    'wore': 'wear', 'worn': 'wear', 'tore': 'tear', 'torn': 'tear', 'slept': 'sleep',
+    'meant': 'mean', 'led': 'lead', 'fed': 'feed', 'fled': 'flee', 'hid': 'hide', 'hidden': 'hide',
+    'bitten': 'bite', 'shook': 'shake', 'shaken': 'shake', 'woke': 'wake',
+    'woken': 'wake', 'froze': 'freeze', 'frozen': 'freeze', 'stolen': 'steal',
+    'using': 'use', 'used': 'use', 'uses': 'use', 'dying': 'die', 'lying': 'lie', 'tying': 'tie',
+    # Irregular plurals
+    'men': 'man', 'women': 'woman', 'children': 'child', 'feet': 'foot', 'teeth': 'tooth',
+    'mice': 'mouse', 'geese': 'goose', 'wives': 'wife', 'knives': 'knife',
+    'wolves': 'wolf', 'halves': 'half', 'shelves': 'shelf', 'selves': 'self',
+    'thieves': 'thief', 'loaves': 'loaf', 'calves': 'calf',
+    'shoes': 'shoe', 'toes': 'toe', 'canoes': 'canoe', 'heroes': 'hero', 'potatoes': 'potato',
+    'tomatoes': 'tomato', 'echoes': 'echo', 'analyses': 'analysis', 'crises': 'crisis',
+    'theses': 'thesis', 'phenomena': 'phenomenon', 'criteria': 'criterion',
+    # -es after a final s
+    'buses': 'bus', 'gases': 'gas', 'bonuses': 'bonus', 'viruses': 'virus', 'campuses': 'campus',
+    'circuses': 'circus', 'statuses': 'status', 'choruses': 'chorus', 'lenses': 'lens',
+    'biases': 'bias', 'atlases': 'atlas', 'aliases': 'alias', 'canvases': 'canvas',
+}
+
+# Words the suffix rules would wrongly shorten
+INVARIANT = frozenset('''
+    news series species means physics mathematics economics politics athletics
+    lens bias atlas alias canvas chaos cosmos ethos pathos kudos diabetes rabies measles
+    lives leaves
+    always perhaps whereas besides towards afterwards sometimes
+    morning evening ceiling wedding pudding during something anything everything nothing
+    building clothing feeling meaning painting
+    darling sibling duckling seedling sapling dumpling starling earthling yearling underling
+    offspring lightning herring awning icing
+    hundred sacred naked wicked crooked rugged ragged jagged dogged wretched beloved learned
+    hatred kindred
+    bed red shed speed seed need indeed
+'''.split())
+
+_VOWELS = set('aeiou')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _has_vowel(stem: str) -> bool:
+    return any(c in _VOWELS for c in stem)
+
+
+def _restore(stem: str) -> str:
+    """Undo spelling changes before -ing/-ed: stopp -> stop, mak -> make, handl -> handle"""
+    if len(stem) >= 3 and stem[-1] == stem[-2] and stem[-1] not in _VOWELS and stem[-1] not in 'lsz':
+        return stem[:-1]
+    # A verb in -le lost its e after a consonant (curl and howl end in plain l)
+    if len(stem) >= 4 and stem[-1] == 'l' and stem[-2] not in _VOWELS | set('lrwy'):
+        return stem + 'e'
+    # One short syllable ending consonant-vowel-consonant lost its final e
+    vowel_groups = re.findall(r'[aeiouy]+', stem[:-1])
+    if (len(stem) >= 3 and len(vowel_groups) == 1 and stem[-1] not in _VOWELS | set('wxy')
+            and stem[-2] in _VOWELS and stem[-3] not in _VOWELS):
+        return stem + 'e'
+    return stem
+
+
+def lemmatize(token: str) -> str:
+    """Base form of one case-folded token"""
+    if token in IRREGULAR:
+        return IRREGULAR[token]
+    if len(token) < 4 or token in INVARIANT or not token.isalpha():
+        return token
+    if token.endswith('ies') and len(token) > 4:
+        return token[:-3] + 'y'
+    if token.endswith(('sses', 'shes', 'ches', 'xes', 'zzes')):
+        return token[:-2]
+    if token.endswith('s') and not token.endswith(('ss', 'us', 'is', 'ous')):
+        return token[:-1]
+    if token.endswith('ing') and _has_vowel(token[:-3]) and len(token) > 5:
+        return _restore(token[:-3])
+    if token.endswith('ied') and len(token) > 4:
+        return token[:-3] + 'y'
+    if token.endswith('eed'):
+        return token
+    if token.endswith('ed') and _has_vowel(token[:-2]) and len(token) > 4:
+        return _restore(token[:-2])
+    return token
+
+
+def lookup_key(text: str) -> str:
+    """Normalized key of a word text (case folded, trimmed, lemmatized)"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return ' '.join(lemmatize(token) for token in _WHITESPACE.split(text.strip()) if token)
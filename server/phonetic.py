@@ -0,0 +1,510 @@
+"""Phonetic keys for sound-alike search
+
+``phonetic_keys`` gives each word two keys in the Double Metaphone code
+alphabet (P T K F S X J 0 for "th", N M L R H, A for a leading vowel). When
+the word has a stored IPA ``pronunciation`` the first key is derived from it,
+which knows how the word actually sounds ("knight" /naɪt/ -> NT); the second
+is the spelling's Double Metaphone code. Without a pronunciation both come
+from the spelling: Double Metaphone's primary and alternate codes.
+
+Stored in ``words.phonetic_key`` and ``words.phonetic_alt`` (both indexed),
+so finding the words that sound like a query is an index probe for the
+query's own codes. ``similarity`` ranks the candidates.
+
+Double Metaphone is Lawrence Philips' algorithm, implemented here so the
+server needs no extra package. Keys are ``KEY_LENGTH`` codes long, as in the
+original; ``length=None`` gives the untruncated codes used for ranking.
+Changing the rules changes keys; re-key stored words with
+``manage.py backfill-phonetic-keys --all``.
+"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Optional, Tuple
+
+# Codes per stored key
+KEY_LENGTH = 4
+
+_VOWELS = frozenset('AEIOUY')
+
+
+def double_metaphone(text: str, length: Optional[int] = KEY_LENGTH) -> Tuple[str, str]:
+    """Primary and alternate Double Metaphone codes of a spelling
+
+    ``length`` caps both codes (None: the whole word).
+    """
+    word = ''.join(c for c in unicodedata.normalize('NFC', text or '').upper() if c.isalpha() or c == ' ')
+    word = word.strip()
+    if not word:
+        return '', ''
+    size = len(word)
+    last = size - 1
+    # Padded, so look-ahead past the end (and 'IER ' style tests) work
+    padded = word + '     '
+    primary = []
+    secondary = []
+    limit = length or 4 * size
+
+    def at(start, *options):
+        if start < 0:
+            return False
+        return any(padded[start:start + len(option)] == option for option in options)
+
+    def vowel(i):
+        return 0 <= i < size and word[i] in _VOWELS
+
+    def add(main, alternate=None):
+        primary.append(main)
+        secondary.append(main if alternate is None else alternate)
+
+    slavo_germanic = any(part in word for part in ('W', 'K', 'CZ', 'WITZ'))
+    germanic = at(0, 'VAN ', 'VON ', 'SCH')
+
+    current = 0
+    # Silent first letters
+    if at(0, 'GN', 'KN', 'PN', 'WR', 'PS'):
+        current = 1
+    # 'Xavier'
+    if word[0] == 'X':
+        add('S')
+        current = 1
+
+    while current < size and (len(''.join(primary)) < limit or len(''.join(secondary)) < limit):
+        c = word[current]
+        if c in _VOWELS:
+            if current == 0:
+                add('A')
+            current += 1
+        elif c == 'B':
+            add('P')
+            current += 2 if at(current + 1, 'B') else 1
+        elif c == 'Ç':
+            add('S')
+            current += 1
+        elif c == 'C':
+            current = _c(word, current, at, vowel, add, germanic)
+        elif c == 'D':
+            if at(current, 'DG'):
+                if at(current + 2, 'I', 'E', 'Y'):
+                    # 'edge'
+                    add('J')
+                    current += 3
+                else:
+                    # 'edgar'
+                    add('TK')
+                    current += 2
+            else:
+                add('T')
+                current += 2 if at(current, 'DT', 'DD') else 1
+        elif c == 'F':
+            add('F')
+            current += 2 if at(current + 1, 'F') else 1
+        elif c == 'G':
+            current = _g(word, current, at, vowel, add, slavo_germanic, germanic)
+        elif c == 'H':
+            # Only before a vowel, and at the start or after a vowel
+            if (current == 0 or vowel(current - 1)) and vowel(current + 1):
+                add('H')
+                current += 2
+            else:
+                current += 1
+        elif c == 'J':
+            if at(current, 'JOSE') or at(0, 'SAN '):
+                # Spanish: 'jose', 'san jacinto'
+                if (current == 0 and at(current + 4, ' ')) or at(0, 'SAN '):
+                    add('H')
+                else:
+                    add('J', 'H')
+            elif current == 0:
+                # 'Yankelovich' / 'Jankelowicz'
+                add('J', 'A')
+            elif vowel(current - 1) and not slavo_germanic and at(current + 1, 'A', 'O'):
+                # Spanish 'bajador'
+                add('J', 'H')
+            elif current == last:
+                add('J', '')
+            elif not at(current + 1, 'L', 'T', 'K', 'S', 'N', 'M', 'B', 'Z') and not at(current - 1, 'S', 'K', 'L'):
+                add('J')
+            current += 2 if at(current + 1, 'J') else 1
+        elif c == 'K':
+            add('K')
+            current += 2 if at(current + 1, 'K') else 1
+        elif c == 'L':
+            if at(current + 1, 'L'):
+                # Spanish 'cabrillo', 'gallegos'
+                if (current == size - 3 and at(current - 1, 'ILLO', 'ILLA', 'ALLE')) or \
+                        ((at(last - 1, 'AS', 'OS') or at(last, 'A', 'O')) and at(current - 1, 'ALLE')):
+                    add('L', '')
+                else:
+                    add('L')
+                current += 2
+            else:
+                add('L')
+                current += 1
+        elif c == 'M':
+            add('M')
+            # 'dumb', 'thumb', 'plumber'
+            if (at(current - 1, 'UMB') and (current + 1 == last or at(current + 2, 'ER'))) or at(current + 1, 'M'):
+                current += 2
+            else:
+                current += 1
+        elif c in 'NÑ':
+            add('N')
+            current += 2 if c == 'N' and at(current + 1, 'N') else 1
+        elif c == 'P':
+            if at(current + 1, 'H'):
+                add('F')
+                current += 2
+            else:
+                # 'campbell', 'raspberry'
+                add('P')
+                current += 2 if at(current + 1, 'P', 'B') else 1
+        elif c == 'Q':
+            add('K')
+            current += 2 if at(current + 1, 'Q') else 1
+        elif c == 'R':
+            # French 'rogier', but not 'hochmeier'
+            if current == last and not slavo_germanic and at(current - 2, 'IE') and not at(current - 4, 'ME', 'MA'):
+                add('', 'R')
+            else:
+                add('R')
+            current += 2 if at(current + 1, 'R') else 1
+        elif c == 'S':
+            current = _s(word, current, at, vowel, add, slavo_germanic, last)
+        elif c == 'T':
+            if at(current, 'TION'):
+                add('X')
+                current += 3
+            elif at(current, 'TIA', 'TCH'):
+                add('X')
+                current += 3
+            elif at(current, 'TH', 'TTH'):
+                # 'thomas', 'thames', Germanic
+                if at(current + 2, 'OM', 'AM') or germanic:
+                    add('T')
+                else:
+                    add('0', 'T')
+                current += 2
+            else:
+                add('T')
+                current += 2 if at(current + 1, 'T', 'D') else 1
+        elif c == 'V':
+            add('F')
+            current += 2 if at(current + 1, 'V') else 1
+        elif c == 'W':
+            if at(current, 'WR'):
+                add('R')
+                current += 2
+                continue
+            if current == 0 and (vowel(current + 1) or at(current, 'WH')):
+                # 'Wasserman' should match 'Vasserman'
+                if vowel(current + 1):
+                    add('A', 'F')
+                else:
+                    add('A')
+            # 'Arnow' should match 'Arnoff'
+            if (current == last and vowel(current - 1)) or germanic or \
+                    at(current - 1, 'EWSKI', 'EWSKY', 'OWSKI', 'OWSKY'):
+                add('', 'F')
+                current += 1
+            elif at(current, 'WICZ', 'WITZ'):
+                # Polish 'filipowicz'
+                add('TS', 'FX')
+                current += 4
+            else:
+                current += 1
+        elif c == 'X':
+            # French 'breaux'
+            if not (current == last and (at(current - 3, 'IAU', 'EAU') or at(current - 2, 'AU', 'OU'))):
+                add('KS')
+            current += 2 if at(current + 1, 'C', 'X') else 1
+        elif c == 'Z':
+            if at(current + 1, 'H'):
+                # Pinyin 'zhao'
+                add('J')
+                current += 2
+            else:
+                if at(current + 1, 'ZO', 'ZI', 'ZA') or (slavo_germanic and current > 0 and word[current - 1] != 'T'):
+                    add('S', 'TS')
+                else:
+                    add('S')
+                current += 2 if at(current + 1, 'Z') else 1
+        else:
+            current += 1
+
+    return ''.join(primary)[:limit], ''.join(secondary)[:limit]
+
+
+def _c(word, current, at, vowel, add, germanic):
+    # Germanic 'bacher', 'macher'
+    if current > 1 and not vowel(current - 2) and at(current - 1, 'ACH') and \
+            not at(current + 2, 'I') and (not at(current + 2, 'E') or at(current - 2, 'BACHER', 'MACHER')):
+        add('K')
+        return current + 2
+    if current == 0 and at(current, 'CAESAR'):
+        add('S')
+        return current + 2
+    # Italian 'chianti'
+    if at(current, 'CHIA'):
+        add('K')
+        return current + 2
+    if at(current, 'CH'):
+        # 'michael'
+        if current > 0 and at(current, 'CHAE'):
+            add('K', 'X')
+            return current + 2
+        # Greek roots: 'chemistry', 'chorus'
+        if current == 0 and (at(current + 1, 'HARAC', 'HARIS') or at(current + 1, 'HOR', 'HYM', 'HIA', 'HEM')) \
+                and not at(0, 'CHORE'):
+            add('K')
+            return current + 2
+        # Germanic, Greek or otherwise a 'kh' sound: 'orchestra', 'architect', 'wachtler'
+        if germanic or at(current - 2, 'ORCHES', 'ARCHIT', 'ORCHID') or at(current + 2, 'T', 'S') or \
+                ((at(current - 1, 'A', 'O', 'U', 'E') or current == 0) and
+                 at(current + 2, 'L', 'R', 'N', 'M', 'B', 'H', 'F', 'V', 'W', ' ')):
+            add('K')
+        elif current > 0:
+            # 'McHugh'
+            if at(0, 'MC'):
+                add('K')
+            else:
+                add('X', 'K')
+        else:
+            add('X')
+        return current + 2
+    # 'czerny'
+    if at(current, 'CZ') and not at(current - 2, 'WICZ'):
+        add('S', 'X')
+        return current + 2
+    # 'focaccia'
+    if at(current + 1, 'CIA'):
+        add('X')
+        return current + 3
+    # Double C, but not 'McClellan'
+    if at(current, 'CC') and not (current == 1 and word[0] == 'M'):
+        # 'bellocchio', but not 'bacchus'
+        if at(current + 2, 'I', 'E', 'H') and not at(current + 2, 'HU'):
+            # 'accident', 'accede', 'succeed'
+            if (current == 1 and word[0] == 'A') or at(current - 1, 'UCCEE', 'UCCES'):
+                add('KS')
+            else:
+                # 'bacci', 'bertucci'
+                add('X')
+            return current + 3
+        add('K')
+        return current + 2
+    if at(current, 'CK', 'CG', 'CQ'):
+        add('K')
+        return current + 2
+    if at(current, 'CI', 'CE', 'CY'):
+        # Italian or English
+        if at(current, 'CIO', 'CIE', 'CIA'):
+            add('S', 'X')
+        else:
+            add('S')
+        return current + 2
+    add('K')
+    # 'mac caffrey', 'mac gregor'
+    if at(current + 1, ' C', ' Q', ' G'):
+        return current + 3
+    if at(current + 1, 'C', 'K', 'Q') and not at(current + 1, 'CE', 'CI'):
+        return current + 2
+    return current + 1
+
+
+def _g(word, current, at, vowel, add, slavo_germanic, germanic):
+    if at(current + 1, 'H'):
+        if current > 0 and not vowel(current - 1):
+            add('K')
+            return current + 2
+        if current == 0:
+            # 'ghislane', 'ghiradelli'
+            add('J' if at(current + 2, 'I') else 'K')
+            return current + 2
+        # Parker's rule: 'hugh', 'bough', 'broughton'
+        if (current > 1 and at(current - 2, 'B', 'H', 'D')) or (current > 2 and at(current - 3, 'B', 'H', 'D')) or \
+                (current > 3 and at(current - 4, 'B', 'H')):
+            return current + 2
+        # 'laugh', 'McLaughlin', 'cough', 'rough', 'tough'
+        if current > 2 and at(current - 1, 'U') and at(current - 3, 'C', 'G', 'L', 'R', 'T'):
+            add('F')
+        elif current > 0 and word[current - 1] != 'I':
+            add('K')
+        return current + 2
+    if at(current + 1, 'N'):
+        if current == 1 and vowel(0) and not slavo_germanic:
+            add('KN', 'N')
+        elif not at(current + 2, 'EY') and not at(current + 1, 'Y') and not slavo_germanic:
+            # Not 'cagney'
+            add('N', 'KN')
+        else:
+            add('KN')
+        return current + 2
+    # 'tagliaro'
+    if at(current + 1, 'LI') and not slavo_germanic:
+        add('KL', 'L')
+        return current + 2
+    # -ges-, -gep-, -gel-, -gie- at the start
+    if current == 0 and (at(current + 1, 'Y') or
+                         at(current + 1, 'ES', 'EP', 'EB', 'EL', 'EY', 'IB', 'IL', 'IN', 'IE', 'EI', 'ER')):
+        add('K', 'J')
+        return current + 2
+    # -ger-, -gy-
+    if (at(current + 1, 'ER') or at(current + 1, 'Y')) and not at(0, 'DANGER', 'RANGER', 'MANGER') and \
+            not at(current - 1, 'E', 'I') and not at(current - 1, 'RGY', 'OGY'):
+        add('K', 'J')
+        return current + 2
+    # Italian 'biaggi'
+    if at(current + 1, 'E', 'I', 'Y') or at(current - 1, 'AGGI', 'OGGI'):
+        if germanic or at(current + 1, 'ET'):
+            add('K')
+        elif at(current + 1, 'IER '):
+            # Always soft with a French ending
+            add('J')
+        else:
+            add('J', 'K')
+        return current + 2
+    add('K')
+    return current + (2 if at(current + 1, 'G') else 1)
+
+
+def _s(word, current, at, vowel, add, slavo_germanic, last):
+    # 'island', 'isle', 'carlisle', 'carlysle'
+    if at(current - 1, 'ISL', 'YSL'):
+        return current + 1
+    if current == 0 and at(current, 'SUGAR'):
+        add('X', 'S')
+        return current + 1
+    if at(current, 'SH'):
+        # Germanic
+        add('S' if at(current + 1, 'HEIM', 'HOEK', 'HOLM', 'HOLZ') else 'X')
+        return current + 2
+    # Italian and Armenian
+    if at(current, 'SIO', 'SIA', 'SIAN'):
+        if slavo_germanic:
+            add('S')
+        else:
+            add('S', 'X')
+        return current + 3
+    # 'smith' matching 'schmidt', 'snider' matching 'schneider'; Slavic -sz-
+    if (current == 0 and at(current + 1, 'M', 'N', 'L', 'W')) or at(current + 1, 'Z'):
+        add('S', 'X')
+        return current + (2 if at(current + 1, 'Z') else 1)
+    if at(current, 'SC'):
+        # Schlesinger's rule
+        if at(current + 2, 'H'):
+            # Dutch 'school', 'schooner'; 'schermerhorn', 'schenker'
+            if at(current + 3, 'OO', 'ER', 'EN', 'UY', 'ED', 'EM'):
+                if at(current + 3, 'ER', 'EN'):
+                    add('X', 'SK')
+                else:
+                    add('SK')
+            elif current == 0 and not vowel(3) and not at(3, 'W'):
+                add('X', 'S')
+            else:
+                add('X')
+            return current + 3
+        if at(current + 2, 'I', 'E', 'Y'):
+            add('S')
+        else:
+            add('SK')
+        return current + 3
+    # French 'resnais', 'artois'
+    if current == last and at(current - 2, 'AI', 'OI'):
+        add('', 'S')
+    else:
+        add('S')
+    return current + (2 if at(current + 1, 'S', 'Z') else 1)
+
+
+# IPA symbols in the Double Metaphone alphabet; affricates before their parts
+_IPA_CODES = [
+    ('tʃ', 'X'), ('ʧ', 'X'), ('dʒ', 'J'), ('ʤ', 'J'),
+    ('p', 'P'), ('b', 'P'), ('t', 'T'), ('d', 'T'), ('ɾ', 'T'), ('k', 'K'), ('g', 'K'), ('ɡ', 'K'),
+    ('x', 'K'), ('f', 'F'), ('v', 'F'), ('θ', '0'), ('ð', '0'), ('s', 'S'), ('z', 'S'),
+    ('ʃ', 'X'), ('ʒ', 'X'), ('h', 'H'), ('m', 'M'), ('n', 'N'), ('ŋ', 'NK'),
+    ('l', 'L'), ('ɫ', 'L'), ('r', 'R'), ('ɹ', 'R'), ('ɻ', 'R'), ('ʁ', 'R'), ('ɚ', 'R'), ('ɝ', 'R'),
+]
+# Vowels, and the glides Double Metaphone treats as vowels (y, w)
+_IPA_VOWELS = frozenset('aeiouyæɐɑɒɔəɛɜɪʊʌøœɯɤɨʉɘɵɞɶjwʏ')
+# Stress, length, syllable and tie marks, delimiters
+_IPA_IGNORED = re.compile(r"[ˈˌːˑ.‿͜͡()\[\]/\\|'ʔ\s-]")
+# Symbols that only occur in IPA: a query holding one is a pronunciation
+_IPA_ONLY = re.compile('[ˈˌːθðʃʒŋɪʊʌəɛɔɑɒæɜɹɾɡʤʧɚɝ]')
+
+
+def is_ipa(text: str) -> bool:
+    """Whether a query looks like an IPA transcription rather than a spelling"""
+    text = (text or '').strip()
+    return bool(_IPA_ONLY.search(text)) or (len(text) > 2 and text[0] in '/[' and text[-1] in '/]')
+
+
+def ipa_code(pronunciation: str, length: Optional[int] = KEY_LENGTH) -> str:
+    """Code of an IPA transcription in the Double Metaphone alphabet
+
+    Reads the first transcription when several are given ("/ˈtəʊmɑːtəʊ/,
+    /təˈmeɪtoʊ/"). Vowels only count at the start, 'h' only before a vowel,
+    and repeated codes collapse, as Double Metaphone treats spellings.
+    """
+    text = unicodedata.normalize('NFD', pronunciation or '').casefold()
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.split(r'[,;]|/\s*/', text.strip().strip('/').strip())[0]
+    text = _IPA_IGNORED.sub('', text)
+    codes = []
+    i = 0
+    while i < len(text):
+        for symbol, code in _IPA_CODES:
+            if text.startswith(symbol, i):
+                if code == 'H' and not (i + 1 < len(text) and text[i + 1] in _IPA_VOWELS):
+                    code = ''
+                i += len(symbol)
+                break
+        else:
+            code = 'A' if text[i] in _IPA_VOWELS and not codes else ''
+            i += 1
+        for letter in code:
+            if not codes or codes[-1] != letter:
+                codes.append(letter)
+    code = ''.join(codes)
+    return code[:length] if length else code
+
+
+def phonetic_keys(word: str, pronunciation: Optional[str] = None,
+                  length: Optional[int] = KEY_LENGTH) -> Tuple[Optional[str], Optional[str]]:
+    """The (phonetic_key, phonetic_alt) stored for a word
+
+    From the IPA pronunciation and the spelling's primary code when the
+    pronunciation gives a code, else the spelling's primary and alternate
+    codes. None for a word with no code at all (no letters).
+    """
+    primary, alternate = double_metaphone(word, length)
+    spoken = ipa_code(pronunciation, length) if pronunciation else ''
+    if spoken:
+        return spoken, primary or None
+    return primary or None, alternate or None
+
+
+def query_keys(query: str, length: Optional[int] = KEY_LENGTH) -> Tuple[str, ...]:
+    """Distinct keys to probe for a query: a spelling's two codes, or an IPA code"""
+    if is_ipa(query):
+        keys = (ipa_code(query, length),)
+    else:
+        keys = double_metaphone(query, length)
+    return tuple(key for key in dict.fromkeys(keys) if key)
+
+
+def similarity(query: str, word: str, pronunciation: Optional[str] = None) -> float:
+    """How closely a matched word sounds like the query, for ranking (0 to 1)
+
+    Compares the untruncated codes (the stored keys only hold the first
+    KEY_LENGTH), then as a tie-breaker the spellings, or for an IPA query
+    the transcriptions.
+    """
+    wanted = set(query_keys(query, None))
+    codes = [code for code in phonetic_keys(word, pronunciation, None) if code]
+    sound = max((SequenceMatcher(None, a, b).ratio() for a in wanted for b in codes), default=0.0)
+    if is_ipa(query):
+        written = _IPA_IGNORED.sub('', query), _IPA_IGNORED.sub('', pronunciation or '')
+    else:
+        written = (query or '').casefold(), (word or '').casefold()
+    return round(0.8 * sound + 0.2 * SequenceMatcher(None, *written).ratio(), 4)
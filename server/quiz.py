@@ -0,0 +1,230 @@
+"""Multiple-choice quizzes with distractors drawn from the learner's own words
+
+``QuizPool`` keeps every word's quiz answers (first translation, first
+definition) in memory, bucketed by a guessed part of speech and by word
+length, so wrong answers look like plausible answers: "quickly" gets other
+adverbs' translations, a long noun other long nouns'. A quiz question samples
+its distractors from the word's bucket, widening to the part of speech and
+then to every word when the bucket is too small; each draw is a few random
+picks, independent of vocabulary size.
+
+The pool is loaded once per database and kept up to date by ``refresh``
+after each word write (``indexes.word_changed``). Writes by another process
+(noticed through the ``words_version`` counter) reload it.
+"""
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import Storage, WordRecord
+
+# Answer fields a quiz can ask for: word -> its first translation or definition
+QUIZ_MODES = ('translation', 'definition')
+
+# Wrong answers per question
+DISTRACTORS = 3
+
+# Databases whose pool is kept in memory (one per learner shard in use)
+MAX_POOLS = int(os.environ.get('WORDS_QUIZ_MAX_POOLS', 8))
+
+# Word length bands: up to 4 letters, 5-7, 8-10, longer
+_LENGTH_BANDS = (4, 7, 10)
+
+_SUFFIXES = [
+    ('adverb', ('ly',)),
+    ('noun', ('tion', 'sion', 'ment', 'ness', 'ity', 'ism', 'ance', 'ence', 'ship', 'hood', 'er', 'or', 'ist')),
+    ('adjective', ('ous', 'ful', 'ive', 'able', 'ible', 'al', 'ic', 'less', 'ish', 'ant', 'ent')),
+    ('verb', ('ize', 'ise', 'ate', 'ify', 'en')),
+]
+_NOUN_DEFINITION = re.compile(r'^(a|an|the|one|someone|something|any)\b')
+_ADJECTIVE_DEFINITION = re.compile(r'^(having|being|full of|relating to|showing|able to|not)\b')
+
+
+def part_of_speech(word: str, definition: str) -> str:
+    """Guess a word's part of speech from its first definition and its suffix"""
+    definition = definition.strip().casefold()
+    word = word.strip().casefold()
+    if definition.startswith('to '):
+        return 'verb'
+    if word.endswith('ly') and len(word) > 4:
+        return 'adverb'
+    if _NOUN_DEFINITION.match(definition):
+        return 'noun'
+    if _ADJECTIVE_DEFINITION.match(definition):
+        return 'adjective'
+    for pos, suffixes in _SUFFIXES:
+        if len(word) > 4 and word.endswith(suffixes):
+            return pos
+    return 'other'
+
+
+def length_band(word: str) -> int:
+    return sum(len(word) > limit for limit in _LENGTH_BANDS)
+
+
+class _Bucket:
+    """Word IDs with O(1) add, remove and random pick"""
+
+    __slots__ = ('ids', 'positions')
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def add(self, word_id: int):
+        if word_id not in self.positions:
+            self.positions[word_id] = len(self.ids)
+            self.ids.append(word_id)
+
+    def remove(self, word_id: int):
+        position = self.positions.pop(word_id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if last != word_id:
+            self.ids[position] = last
+            self.positions[last] = position
+
+
+class QuizPool:
+    """Quiz answers of one database's words, bucketed for distractor sampling"""
+
+    def __init__(self, store: Storage):
+        self.store = store
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        self.version = self.store.words_version()
+        # Word ID -> (answers by mode, bucket keys)
+        self.entries: Dict[int, Tuple[Dict[str, str], Tuple]] = {}
+        self.buckets: Dict[Any, _Bucket] = {}
+        for word in self.store.get_all_words():
+            self._add(word)
+        self._loaded = True
+
+    def _add(self, word: WordRecord):
+        answers = {'translation': word.translations[0] if word.translations else None,
+                   'definition': word.definitions[0] if word.definitions else None}
+        pos = part_of_speech(word.word, answers['definition'] or '')
+        # Most specific first; one bucket per mode so every pick has an answer
+        keys = ((pos, length_band(word.word)), (pos,), ())
+        self.entries[word.id] = (answers, keys)
+        for mode, answer in answers.items():
+            if answer:
+                for key in keys:
+                    self.buckets.setdefault((mode,) + key, _Bucket()).add(word.id)
+
+    def _remove(self, word_id: int):
+        entry = self.entries.pop(word_id, None)
+        if entry is None:
+            return
+        answers, keys = entry
+        for mode in answers:
+            for key in keys:
+                bucket = self.buckets.get((mode,) + key)
+                if bucket is not None:
+                    bucket.remove(word_id)
+
+    def _sync(self):
+        # Writes by another process since the last load or refresh
+        if not self._loaded or self.store.words_version() != self.version:
+            self._load()
+
+    def refresh(self, word_id: int):
+        """Take a saved, changed or deleted word into account
+
+        Call it after every write to a word through this pool's store, so
+        the pool can tell those from changes made elsewhere.
+        """
+        with self._lock:
+            version = self.store.words_version()
+            if not self._loaded or version is None or version > self.version + 1:
+                self._load()
+                return
+            self.version = version
+            self._remove(word_id)
+            word = self.store.get_word(word_id)
+            if word is not None:
+                self._add(word)
+
+    def distractors(self, word_id: int, mode: str, count: int = DISTRACTORS,
+                    rng: Optional[random.Random] = None) -> List[str]:
+        """Up to ``count`` distinct wrong answers for a word, from the most similar bucket that has them"""
+        rng = rng or random
+        with self._lock:
+            self._sync()
+            entry = self.entries.get(word_id)
+            if entry is None:
+                return []
+            answers, keys = entry
+            taken = {answers[mode]}
+            picked = []
+            for key in keys:
+                bucket = self.buckets.get((mode,) + key)
+                if bucket is None:
+                    continue
+                ids = bucket.ids
+                # A few more tries than needed: picks may repeat the word or an answer
+                for _ in range(min(len(ids), 4 * count)):
+                    answer = self.entries[ids[rng.randrange(len(ids))]][0][mode]
+                    if answer not in taken:
+                        taken.add(answer)
+                        picked.append(answer)
+                        if len(picked) == count:
+                            return picked
+            return picked
+
+
+def build_quiz(pool: QuizPool, words: List[WordRecord], mode: str = 'translation',
+               rng: Optional[random.Random] = None) -> List[Dict[str, Any]]:
+    """Multiple-choice questions for words: the word, shuffled choices and the answer's index
+
+    Words without an answer for ``mode`` are skipped.
+    """
+    if mode not in QUIZ_MODES:
+        raise ValueError(f"mode must be one of {', '.join(QUIZ_MODES)}")
+    rng = rng or random.Random()
+    field = 'translations' if mode == 'translation' else 'definitions'
+    questions = []
+    for word in words:
+        values = word[field]
+        if not values:
+            continue
+        choices = pool.distractors(word.id, mode, rng=rng) + [values[0]]
+        rng.shuffle(choices)
+        questions.append({
+            "word_id": word.id,
+            "word": word.word,
+            "pronunciation": word.pronunciation,
+            "choices": choices,
+            "answer": choices.index(values[0]),
+        })
+    return questions
+
+
+_pools: 'OrderedDict[str, QuizPool]' = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def get_quiz_pool(store: Storage) -> QuizPool:
+    """The in-memory pool of a database, kept for the MAX_POOLS most recently used"""
+    with _pools_lock:
+        pool = _pools.get(store.path)
+        if pool is None or pool.store is not store:
+            pool = _pools[store.path] = QuizPool(store)
+        _pools.move_to_end(store.path)
+        while len(_pools) > MAX_POOLS:
+            _pools.popitem(last=False)
+        return pool
+
+
+def refresh_quiz(store: Storage, word_id: int):
+    """Refresh a saved, changed or deleted word in the database's pool, if one is loaded"""
+    with _pools_lock:
+        pool = _pools.get(store.path)
+    if pool is not None and pool.store is store:
+        pool.refresh(word_id)
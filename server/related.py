@@ -0,0 +1,244 @@
+"""Related words from TF-IDF similarity of definitions, examples and notes
+
+Each word is a TF-IDF vector of the lemmatized terms of its definitions,
+examples and notes (stop words and terms in more than MAX_DF of the words
+left out), L2-normalized so a dot product is the cosine similarity. The
+vectors are held as a SciPy sparse matrix (CSC, so the rows sharing a term
+are one column slice) by ``RelatedIndex``, which writes every word's
+NEIGHBORS most similar words to the ``word_neighbors`` table. Queries
+(``Storage.get_related_words``) only read those rows.
+
+``rebuild`` computes every word's neighbors. ``refresh(word_id)``, called
+after every word write by the MCP tools and the Flask routes (through
+``indexes.word_changed``), recomputes that word's neighbors and puts it into
+(or takes it out of) the lists of the words it is now among the most
+similar to, checked for its RELATED_CANDIDATES most similar words. Changed
+vectors are kept beside the matrix until REFRESHES_PER_RELOAD of them have
+piled up; the matrix (and IDF weights) are then reloaded from the database,
+as they are when another process changed words in between.
+"""
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Tuple
+
+from normalize import lemmatize
+from storage import Storage, WordRecord
+
+# Neighbors stored per word: the most getRelatedWords can return
+NEIGHBORS = int(os.environ.get('WORDS_RELATED_NEIGHBORS', 20))
+
+# Terms in more than this share of words carry no signal
+MAX_DF = 0.5
+
+# Most similar words whose lists a refresh checks
+RELATED_CANDIDATES = 10 * NEIGHBORS
+
+# Changed vectors kept beside the matrix before it is reloaded
+REFRESHES_PER_RELOAD = 1000
+
+# Databases whose index is kept in memory (one per learner shard in use)
+MAX_INDEXES = int(os.environ.get('WORDS_RELATED_MAX_INDEXES', 8))
+
+# Dense block of similarities computed at once by rebuild (entries)
+BLOCK_ENTRIES = 1 << 22
+
+STOP_WORDS = frozenset('''
+    a about above after again against all also an and any are as at be because been before being
+    below between both but by can could did do does doing down during each few for from further
+    had has have having he her here hers herself him himself his how i if in into is it its itself
+    just me more most my myself no nor not now of off on once only or other our ours ourselves out
+    over own same she should so some such than that the their theirs them themselves then there
+    these they this those through to too under until up very was we were what when where which
+    while who whom why will with would you your yours yourself yourselves something someone
+    thing things one ones way used use etc e g eg ie
+'''.split())
+
+_TOKEN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def word_terms(word: WordRecord) -> Counter:
+    """Lemmatized term counts of a word's definitions, examples and notes"""
+    text = ' '.join([*word.definitions, *word.examples, word.notes or '']).casefold()
+    return Counter(term for term in map(lemmatize, _TOKEN.findall(text))
+                   if term not in STOP_WORDS and len(term) > 1)
+
+
+class RelatedIndex:
+    """TF-IDF vectors of one database's words and upkeep of its neighbor table"""
+
+    def __init__(self, store: Storage, neighbors: int = NEIGHBORS):
+        self.store = store
+        self.neighbors = neighbors
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    # Model
+
+    def _load(self):
+        """Build the TF-IDF matrix of every stored word"""
+        import numpy as np
+        from scipy import sparse
+
+        version = self.store.words_version()
+        words = self.store.get_all_words()
+        counts = [word_terms(word) for word in words]
+        df = Counter(term for terms in counts for term in terms)
+        limit = max(1.0, MAX_DF * len(words))
+        self.vocabulary = {term: col for col, term in enumerate(sorted(t for t, n in df.items() if n <= limit))}
+        # Smoothed IDF as in scikit-learn. Terms first used after the load
+        # only count once the matrix is reloaded.
+        self.idf = np.array([np.log((1 + len(words)) / (1 + df[term])) + 1 for term in self.vocabulary])
+
+        rows, cols, vals = [], [], []
+        for row, terms in enumerate(counts):
+            col, val = self._weights(terms)
+            rows.append(np.full(len(col), row))
+            cols.append(col)
+            vals.append(val)
+        self.ids = np.array([word.id for word in words], dtype=np.int64)
+        self.row_of = {word.id: row for row, word in enumerate(words)}
+        self.matrix = sparse.csc_matrix(
+            (np.concatenate(vals) if vals else [], (np.concatenate(rows) if rows else [],
+                                                    np.concatenate(cols) if cols else [])),
+            shape=(len(words), len(self.vocabulary)))
+        # Rows replaced by a refresh, and the vectors replacing them
+        self.stale = np.zeros(len(words), dtype=bool)
+        self.changed: Dict[int, Tuple] = {}
+        self.version = version
+        self._loaded = True
+
+    def _weights(self, terms: Counter):
+        """Known column indexes and L2-normalized TF-IDF weights of term counts"""
+        import numpy as np
+
+        col = np.array([self.vocabulary[term] for term in terms if term in self.vocabulary], dtype=np.int64)
+        val = np.array([terms[term] for term in terms if term in self.vocabulary], dtype=np.float64)
+        val = val * self.idf[col] if len(col) else val
+        norm = np.sqrt((val ** 2).sum())
+        return col, (val / norm if norm else val)
+
+    def _similarities(self, col, val):
+        """Cosine similarity of a vector to every word: (IDs, scores)"""
+        import numpy as np
+
+        scores = self.matrix[:, col] @ val if len(col) else np.zeros(len(self.ids))
+        scores[self.stale] = 0.0
+        if not self.changed:
+            return self.ids, scores
+        weights = dict(zip(col.tolist(), val.tolist()))
+        extra_ids = np.fromiter(self.changed, dtype=np.int64, count=len(self.changed))
+        extra = np.array([sum(weights.get(c, 0.0) * v for c, v in zip(other_col.tolist(), other_val.tolist()))
+                          for other_col, other_val in self.changed.values()])
+        return np.concatenate([self.ids, extra_ids]), np.concatenate([scores, extra])
+
+    # Neighbor table
+
+    def rebuild(self, log=None) -> Dict[str, int]:
+        """Recompute every word's neighbors from a fresh matrix"""
+        import numpy as np
+
+        with self._lock:
+            self._load()
+            rows = self.matrix.tocsr()
+            transposed = rows.T.tocsr()
+            n = len(self.ids)
+            k = min(self.neighbors, n - 1)
+            block = max(1, BLOCK_ENTRIES // max(n, 1))
+            word_ids, neighbor_ids, values = [], [], []
+            for start in range(0, n if k > 0 else 0, block):
+                scores = (rows[start:start + block] @ transposed).toarray()
+                size = len(scores)
+                scores[np.arange(size), np.arange(start, start + size)] = 0.0
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                top_scores = np.take_along_axis(scores, top, axis=1)
+                keep = top_scores > 0
+                word_ids.append(np.repeat(self.ids[start:start + size], keep.sum(axis=1)))
+                neighbor_ids.append(self.ids[top[keep]])
+                values.append(top_scores[keep])
+                if log:
+                    log(f"related words: {start + size} of {n} words")
+            if values:
+                word_ids, neighbor_ids, values = map(np.concatenate, (word_ids, neighbor_ids, values))
+            self.store.replace_neighbors(zip(map(int, word_ids), map(int, neighbor_ids), map(float, values)))
+        return {"words": n, "terms": len(self.vocabulary), "neighbors": len(values)}
+
+    @staticmethod
+    def _top(scores, k: int):
+        """Indexes of the k highest positive scores, best first"""
+        import numpy as np
+
+        if len(scores) > k:
+            candidates = np.argpartition(-scores, k)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[scores[candidates] > 0]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    def refresh(self, word_id: int):
+        """Recompute the neighbors of a word that was saved, changed or deleted
+
+        Call it after every write to a word through this index's store, so
+        the index can tell those from changes made elsewhere.
+        """
+        with self._lock:
+            version = self.store.words_version()
+            # Any change but this word's since the load: start from the database
+            if not self._loaded or version is None or version > self.version + 1:
+                self._load()
+            else:
+                self.version = version
+            if word_id in self.row_of:
+                self.stale[self.row_of[word_id]] = True
+            word = self.store.get_word(word_id)
+            if word is None:
+                # Deleted: its rows in word_neighbors went with it
+                self.changed.pop(word_id, None)
+                return
+            col, val = self._weights(word_terms(word))
+            self.changed[word_id] = (col, val)
+
+            ids, scores = self._similarities(col, val)
+            scores[ids == word_id] = 0.0
+            order = self._top(scores, max(self.neighbors, RELATED_CANDIDATES))
+            neighbors = [(int(ids[i]), float(scores[i])) for i in order[:self.neighbors]]
+
+            # Lists the word may now belong in, and lists it was in before
+            candidates = {int(ids[i]): float(scores[i]) for i in order}
+            previous = set(self.store.get_neighbor_ids(word_id, reverse=True))
+            floors = self.store.get_neighbor_floors(list(candidates))
+            reverse = [(other, score) for other, score in candidates.items()
+                       if other in previous or other not in floors
+                       or floors[other][1] < self.neighbors or score > floors[other][0]]
+            dropped = [other for other in previous if other not in candidates]
+            self.store.update_neighbors(word_id, neighbors, reverse, dropped, self.neighbors)
+
+            if len(self.changed) >= REFRESHES_PER_RELOAD:
+                self._loaded = False
+
+
+_indexes: 'OrderedDict[str, RelatedIndex]' = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_related_index(store: Storage) -> RelatedIndex:
+    """The in-memory index of a database, kept for the MAX_INDEXES most recently used"""
+    with _indexes_lock:
+        index = _indexes.get(store.path)
+        if index is None or index.store is not store:
+            index = _indexes[store.path] = RelatedIndex(store)
+        _indexes.move_to_end(store.path)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def refresh_related(store: Storage, word_id: int):
+    """Refresh the neighbors of a saved, changed or deleted word, if related words are in use
+
+    Neighbors are built on the first getRelatedWords call; until then
+    saves do not load the index.
+    """
+    if store.has_neighbors():
+        get_related_index(store).refresh(word_id)
@@ -0,0 +1,590 @@
+"""Spaced repetition scheduling
+
+``sm2_step`` is the per-review SM-2 update; ``review_step`` combines it with
+FSRS into the schedule update used by ``trackWordStudy`` and the study routes.
+``replay_sm2`` applies the same update to every word's full study history at
+once with NumPy, and ``reschedule`` uses it to rebuild ``review_schedule``
+from ``study_sessions`` after the parameters change or history is imported.
+SM-2 parameters are stored per database (``load_sm2_params``), so that
+rebuild and every later review agree.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+class SM2Params(NamedTuple):
+    """Tunable SM-2 parameters"""
+    initial_ease: float = 2.5
+    initial_interval: int = 1
+    ease_floor: float = 1.3
+    # Ease lost when recall < pass_score
+    lapse_penalty: float = 0.2
+    pass_score: int = 3
+    # Fixed next interval for a given current interval (days); others grow by ease
+    seed_intervals: Tuple[Tuple[int, int], ...] = ((1, 1), (2, 6))
+
+
+DEFAULT_SM2 = SM2Params()
+
+
+# Decoded scheduler parameters by (database path, name): (fitted_at, value)
+_saved_params = {}
+
+
+def _load_saved_params(store, name, decode, default):
+    """Parameters saved in a database's scheduler_params, or ``default``
+
+    Each call reads only ``fitted_at``; the parameters are decoded again
+    once a new fit or reschedule has saved them, in this process or any
+    other.
+    """
+    fitted_at = store.get_scheduler_params_fitted_at(name)
+    if fitted_at is None:
+        return default
+    key = (store.path, name)
+    cached = _saved_params.get(key)
+    if cached is None or cached[0] != fitted_at:
+        saved = store.get_scheduler_params(name)
+        if saved is None:
+            return default
+        cached = _saved_params[key] = (saved['fitted_at'], decode(saved['params']))
+    return cached[1]
+
+
+def _decode_sm2_params(values):
+    values = dict(values)
+    values['seed_intervals'] = tuple(tuple(pair) for pair in values.get('seed_intervals', ()))
+    return SM2Params(**values)
+
+
+def load_sm2_params(store) -> SM2Params:
+    """SM-2 parameters saved in a database (manage.py reschedule), or the defaults"""
+    return _load_saved_params(store, 'sm2', _decode_sm2_params, DEFAULT_SM2)
+
+
+def save_sm2_params(store, params: SM2Params):
+    """Make ``params`` the SM-2 parameters every review of a database uses"""
+    store.save_scheduler_params('sm2', params._asdict())
+
+
+def sm2_step(ease_factor: float, interval: int, recall: int,
+             params: SM2Params = DEFAULT_SM2) -> Tuple[float, int]:
+    """Apply one review to a word's (ease_factor, interval)
+
+    Args:
+        ease_factor: Current ease factor
+        interval: Current interval in days
+        recall: Recall score (1-5)
+        params: SM-2 parameters
+
+    Returns:
+        New (ease_factor, interval)
+    """
+    if recall < params.pass_score:
+        # If recall was difficult, reset interval but adjust ease factor
+        return max(params.ease_floor, ease_factor - params.lapse_penalty), params.initial_interval
+
+    ease_factor = ease_factor + (0.1 - (5 - recall) * (0.08 + (5 - recall) * 0.02))
+    ease_factor = max(params.ease_floor, ease_factor)
+
+    seeds = dict(params.seed_intervals)
+    if interval in seeds:
+        interval = seeds[interval]
+    else:
+        interval = round(interval * ease_factor)
+    return ease_factor, interval
+
+
+def replay_sm2(word_ids, recalls, params: SM2Params = DEFAULT_SM2):
+    """Replay SM-2 over every word's review history
+
+    The reviews of one word are sequential, but different words are
+    independent, so the scan runs review-by-review across all words at once.
+    Words are ordered by history length (longest first) so the words still
+    active at step k are always a prefix of the state arrays.
+
+    Args:
+        word_ids: int array of word IDs, grouped by word and in review order
+        recalls: int array of recall scores aligned with word_ids
+
+    Returns:
+        (unique_word_ids, ease_factors, intervals) NumPy arrays
+    """
+    import numpy as np
+
+    word_ids = np.asarray(word_ids, dtype=np.int64)
+    recalls = np.asarray(recalls, dtype=np.int64)
+    if word_ids.size == 0:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty, empty.astype(np.int64)
+
+    # Group boundaries (input is already grouped by word)
+    boundaries = np.flatnonzero(np.diff(word_ids)) + 1
+    starts = np.concatenate(([0], boundaries))
+    lengths = np.diff(np.concatenate((starts, [word_ids.size])))
+
+    order = np.argsort(-lengths, kind='stable')
+    starts = starts[order]
+    lengths = lengths[order]
+    unique_ids = word_ids[starts]
+
+    n_words = unique_ids.size
+    ease = np.full(n_words, params.initial_ease, dtype=np.float64)
+    interval = np.full(n_words, params.initial_interval, dtype=np.int64)
+
+    # Number of words whose history is longer than k, for every step k
+    active_counts = np.searchsorted(-lengths, -np.arange(lengths[0]), side='left')
+    seed_from = np.array([s[0] for s in params.seed_intervals], dtype=np.int64)
+    seed_to = np.array([s[1] for s in params.seed_intervals], dtype=np.int64)
+
+    for k, n in enumerate(active_counts):
+        r = recalls[starts[:n] + k]
+        e = ease[:n]
+        i = interval[:n]
+
+        failed = r < params.pass_score
+        q = 5 - r
+        passed_ease = np.maximum(params.ease_floor, e + (0.1 - q * (0.08 + q * 0.02)))
+        failed_ease = np.maximum(params.ease_floor, e - params.lapse_penalty)
+        new_ease = np.where(failed, failed_ease, passed_ease)
+
+        grown = np.round(i * new_ease).astype(np.int64)
+        for old, new in zip(seed_from, seed_to):
+            grown = np.where(i == old, new, grown)
+        new_interval = np.where(failed, params.initial_interval, grown)
+
+        ease[:n] = new_ease
+        interval[:n] = new_interval
+
+    return unique_ids, ease, interval
+
+
+def reschedule(store, params: SM2Params = DEFAULT_SM2, dry_run: bool = False,
+               scheduler: str = 'sm2', fsrs_weights=None,
+               retention: float = None) -> Dict[str, Any]:
+    """Rebuild review_schedule for every studied word from study_sessions
+
+    Args:
+        store: storage.Storage to read from and write to
+        params: SM-2 parameters to replay with
+        dry_run: Compute the new schedule without writing it
+        scheduler: 'sm2', or 'fsrs' to set intervals, stability and
+            difficulty from FSRS (ease factors are still replayed with SM-2)
+        fsrs_weights: FSRS weights (defaults to DEFAULT_FSRS_WEIGHTS)
+        retention: FSRS target retention (defaults to DEFAULT_RETENTION)
+
+    Returns:
+        Counts and timings of the load, replay and write steps
+    """
+    import numpy as np
+
+    timings = {}
+    started = time.perf_counter()
+    if scheduler == 'fsrs':
+        word_ids, recalls, days, last_studied = store.load_review_history(with_times=True)
+    else:
+        word_ids, recalls, last_studied = store.load_review_history()
+    timings['load_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    unique_ids, ease, interval = replay_sm2(word_ids, recalls, params)
+    stability = difficulty = [None] * unique_ids.size
+    if scheduler == 'fsrs':
+        fsrs_ids, s, d, _ = replay_fsrs(word_ids, recalls, days, fsrs_weights or DEFAULT_FSRS_WEIGHTS)
+        if not np.array_equal(fsrs_ids, unique_ids):
+            # Both replays cover the same words; put the FSRS state in SM-2's order
+            order = np.argsort(fsrs_ids, kind='stable')
+            position = order[np.searchsorted(fsrs_ids, unique_ids, sorter=order)]
+            s, d = s[position], d[position]
+        target = DEFAULT_RETENTION if retention is None else retention
+        interval = np.round(s / FSRS_FACTOR * (target ** (1 / FSRS_DECAY) - 1))
+        interval = np.clip(interval, 1, FSRS_MAX_INTERVAL).astype(np.int64)
+        stability, difficulty = s.tolist(), d.tolist()
+    last_text = [last_studied[word_id] for word_id in unique_ids.tolist()]
+    last = np.array(last_text, dtype='datetime64[us]')
+    next_review = np.datetime_as_string(last + interval.astype('timedelta64[D]'), unit='us')
+    timings['replay_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if not dry_run:
+        store.replace_schedules(zip(unique_ids.tolist(), next_review.tolist(), ease.tolist(),
+                                    interval.tolist(), stability, difficulty, last_text))
+    timings['write_seconds'] = time.perf_counter() - started
+
+    return {
+        "scheduler": scheduler,
+        "sessions": int(len(word_ids)),
+        "words": int(unique_ids.size),
+        "dry_run": dry_run,
+        **{key: round(value, 3) for key, value in timings.items()}
+    }
+
+
+# FSRS (Free Spaced Repetition Scheduler, v4.5 formulas)
+#
+# Each word has a memory stability S (days until recall probability drops to
+# 90%) and a difficulty D in [1, 10]. Recall probability after t days is
+# R = (1 + FSRS_FACTOR * t / S) ** FSRS_DECAY.
+
+FSRS_DECAY = -0.5
+FSRS_FACTOR = 19 / 81
+
+DEFAULT_FSRS_WEIGHTS = (
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+)
+
+# Allowed range of each weight while fitting
+FSRS_BOUNDS = (
+    (0.1, 100.0), (0.1, 100.0), (0.1, 100.0), (0.1, 100.0), (1.0, 10.0),
+    (0.1, 5.0), (0.1, 5.0), (0.0, 0.5), (0.0, 3.0), (0.1, 0.8), (0.01, 2.5),
+    (0.5, 5.0), (0.01, 0.2), (0.01, 0.9), (0.01, 2.0), (0.0, 1.0), (1.0, 4.0),
+)
+
+DEFAULT_RETENTION = 0.9
+
+
+def load_fsrs_weights(store) -> Tuple[float, ...]:
+    """FSRS weights fitted to a database (manage.py fit-fsrs), or the defaults"""
+    return _load_saved_params(store, 'fsrs', tuple, DEFAULT_FSRS_WEIGHTS)
+
+# Longest interval FSRS will schedule, in days
+FSRS_MAX_INTERVAL = 36500
+
+
+def fsrs_grade(recall):
+    """Map recall scores 1-5 onto FSRS grades 1-4 (again, hard, good, easy)
+
+    Works on ints and NumPy arrays. Scores 1 and 2 (below SM-2's pass
+    score) are both "again", so pass/fail agrees between the two schedulers.
+    """
+    return recall - 1 + (recall <= 1)
+
+
+def fsrs_retrievability(elapsed_days, stability):
+    """Probability of recall after ``elapsed_days`` at ``stability``"""
+    return (1 + FSRS_FACTOR * elapsed_days / stability) ** FSRS_DECAY
+
+
+def fsrs_interval(stability, retention=DEFAULT_RETENTION):
+    """Days until recall probability falls to ``retention`` (1 to FSRS_MAX_INTERVAL)"""
+    days = round(stability / FSRS_FACTOR * (retention ** (1 / FSRS_DECAY) - 1))
+    return min(FSRS_MAX_INTERVAL, max(1, days))
+
+
+def _fsrs_init(w, grade, np):
+    stability = np.maximum(np.asarray(w)[grade - 1], 0.01)
+    difficulty = np.clip(w[4] - (grade - 3) * w[5], 1, 10)
+    return stability, difficulty
+
+
+def _fsrs_update(w, stability, difficulty, grade, retrievability, np):
+    """Vectorized FSRS state update after a review"""
+    # Difficulty moves with the grade and reverts toward the initial "good" difficulty
+    new_difficulty = difficulty - w[6] * (grade - 3)
+    new_difficulty = w[7] * w[4] + (1 - w[7]) * new_difficulty
+    new_difficulty = np.clip(new_difficulty, 1, 10)
+
+    hard_penalty = np.where(grade == 2, w[15], 1.0)
+    easy_bonus = np.where(grade == 4, w[16], 1.0)
+    recalled = stability * (1 + np.exp(w[8]) * (11 - difficulty) * stability ** -w[9]
+                            * (np.exp((1 - retrievability) * w[10]) - 1) * hard_penalty * easy_bonus)
+    forgot = (w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1)
+              * np.exp((1 - retrievability) * w[14]))
+    new_stability = np.where(grade == 1, np.minimum(forgot, stability), recalled)
+    return np.maximum(new_stability, 0.01), new_difficulty
+
+
+def fsrs_step(stability: Optional[float], difficulty: Optional[float], elapsed_days: float,
+              recall: int, weights=DEFAULT_FSRS_WEIGHTS) -> Tuple[float, float]:
+    """Apply one review to a word's FSRS (stability, difficulty)
+
+    Args:
+        stability: Current stability, or None for a word's first review
+        difficulty: Current difficulty, or None for a word's first review
+        elapsed_days: Days since the previous review
+        recall: Recall score (1-5)
+        weights: FSRS weights
+
+    Returns:
+        New (stability, difficulty)
+    """
+    import numpy as np
+
+    grade = np.int64(fsrs_grade(recall))
+    if stability is None or difficulty is None:
+        stability, difficulty = _fsrs_init(weights, grade, np)
+    else:
+        r = fsrs_retrievability(max(elapsed_days, 0.0), stability)
+        stability, difficulty = _fsrs_update(weights, np.float64(stability), np.float64(difficulty),
+                                             grade, r, np)
+    return float(stability), float(difficulty)
+
+
+def review_step(schedule: Optional[Dict[str, Any]], recall: int, studied_at: datetime,
+                scheduler: str = 'sm2', fsrs_weights=DEFAULT_FSRS_WEIGHTS,
+                retention: float = DEFAULT_RETENTION, params: SM2Params = DEFAULT_SM2) -> Dict[str, Any]:
+    """Schedule of a word after a review at ``studied_at``
+
+    Args:
+        schedule: The word's current schedule (as from ``Storage.get_schedule``),
+            or None if it was never studied
+        recall: Recall score (1-5)
+        studied_at: Time of the review
+        scheduler: 'sm2', or 'fsrs' to take the interval from FSRS stability
+        fsrs_weights: FSRS weights (scheduler 'fsrs' only)
+        retention: Target recall probability (scheduler 'fsrs' only)
+        params: SM-2 parameters
+
+    Returns:
+        Dict with ``next_review`` (datetime), ``interval``, ``ease_factor``,
+        ``stability`` and ``difficulty`` (None unless scheduler is 'fsrs')
+    """
+    if schedule:
+        ease_factor, interval = schedule['ease_factor'], schedule['interval']
+    else:
+        ease_factor, interval = params.initial_ease, params.initial_interval
+    ease_factor, interval = sm2_step(ease_factor, interval, recall, params)
+
+    stability = difficulty = None
+    if scheduler == 'fsrs':
+        last_review = schedule['last_review'] if schedule else None
+        elapsed = (studied_at - datetime.fromisoformat(last_review)).total_seconds() / 86400 if last_review else 0.0
+        stability, difficulty = fsrs_step(
+            schedule['stability'] if schedule else None,
+            schedule['difficulty'] if schedule else None,
+            elapsed, recall, fsrs_weights)
+        interval = fsrs_interval(stability, retention)
+
+    return {
+        "next_review": studied_at + timedelta(days=interval),
+        "interval": interval,
+        "ease_factor": ease_factor,
+        "stability": stability,
+        "difficulty": difficulty,
+    }
+
+
+def replay_fsrs(word_ids, recalls, days, weights=DEFAULT_FSRS_WEIGHTS):
+    """Replay FSRS over every word's review history
+
+    Uses the same longest-history-first scan as ``replay_sm2``.
+
+    Args:
+        word_ids: int array of word IDs, grouped by word and in review order
+        recalls: int array of recall scores aligned with word_ids
+        days: float array of review times in days, aligned with word_ids
+
+    Returns:
+        (unique_word_ids, stability, difficulty, predicted) where predicted
+        holds, for every review, the recall probability the model gave
+        before it (NaN for a word's first review)
+    """
+    import numpy as np
+
+    word_ids = np.asarray(word_ids, dtype=np.int64)
+    grades = fsrs_grade(np.asarray(recalls, dtype=np.int64))
+    days = np.asarray(days, dtype=np.float64)
+    w = np.asarray(weights, dtype=np.float64)
+    predicted = np.full(word_ids.size, np.nan)
+    if word_ids.size == 0:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty, empty, predicted
+
+    boundaries = np.flatnonzero(np.diff(word_ids)) + 1
+    starts = np.concatenate(([0], boundaries))
+    lengths = np.diff(np.concatenate((starts, [word_ids.size])))
+    order = np.argsort(-lengths, kind='stable')
+    starts = starts[order]
+    lengths = lengths[order]
+    unique_ids = word_ids[starts]
+
+    active_counts = np.searchsorted(-lengths, -np.arange(lengths[0]), side='left')
+    stability, difficulty = _fsrs_init(w, grades[starts], np)
+    last_day = days[starts]
+
+    for k, n in enumerate(active_counts[1:], start=1):
+        idx = starts[:n] + k
+        elapsed = np.maximum(days[idx] - last_day[:n], 0.0)
+        r = fsrs_retrievability(elapsed, stability[:n])
+        predicted[idx] = r
+        stability[:n], difficulty[:n] = _fsrs_update(w, stability[:n], difficulty[:n], grades[idx], r, np)
+        last_day[:n] = days[idx]
+
+    return unique_ids, stability, difficulty, predicted
+
+
+def fsrs_log_loss(word_ids, recalls, days, weights):
+    """Summed binary cross-entropy of FSRS predictions and their count"""
+    import numpy as np
+
+    _, _, _, predicted = replay_fsrs(word_ids, recalls, days, weights)
+    mask = ~np.isnan(predicted)
+    p = np.clip(predicted[mask], 1e-6, 1 - 1e-6)
+    y = np.asarray(recalls)[mask] >= DEFAULT_SM2.pass_score
+    return float(-np.sum(np.where(y, np.log(p), np.log(1 - p)))), int(mask.sum())
+
+
+def _partition_by_word(word_ids, parts):
+    """Split grouped history into ``parts`` slices of similar size at word boundaries"""
+    import numpy as np
+
+    cuts = [0]
+    for i in range(1, parts):
+        cut = int(np.searchsorted(word_ids, word_ids[min(len(word_ids) - 1, i * len(word_ids) // parts)]))
+        cuts.append(max(cut, cuts[-1]))
+    cuts.append(len(word_ids))
+    return [(cuts[i], cuts[i + 1]) for i in range(parts) if cuts[i + 1] > cuts[i]]
+
+
+def _loss_worker(conn, word_ids, recalls, days):
+    """Evaluate batches of weight vectors on one slice of the history"""
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+        conn.send([fsrs_log_loss(word_ids, recalls, days, w) for w in batch])
+    conn.close()
+
+
+class _LossEvaluator:
+    """Sums FSRS log loss over the history, optionally across worker processes"""
+
+    def __init__(self, word_ids, recalls, days, processes=1):
+        import multiprocessing
+
+        self.history = (word_ids, recalls, days)
+        self.workers = []
+        if processes > 1:
+            context = multiprocessing.get_context('fork')
+            for start, end in _partition_by_word(word_ids, processes):
+                parent, child = context.Pipe()
+                process = context.Process(target=_loss_worker, daemon=True, args=(
+                    child, word_ids[start:end], recalls[start:end], days[start:end]))
+                process.start()
+                self.workers.append((process, parent))
+
+    def __call__(self, batch):
+        """Mean log loss for every weight vector in ``batch``"""
+        if not self.workers:
+            results = [[fsrs_log_loss(*self.history, w) for w in batch]]
+        else:
+            for _, conn in self.workers:
+                conn.send(batch)
+            results = [conn.recv() for _, conn in self.workers]
+        losses = []
+        for i in range(len(batch)):
+            total = sum(part[i][0] for part in results)
+            count = sum(part[i][1] for part in results)
+            losses.append(total / count if count else 0.0)
+        return losses
+
+    def close(self):
+        for process, conn in self.workers:
+            conn.send(None)
+            process.join()
+
+
+def fit_fsrs(word_ids, recalls, days, weights=DEFAULT_FSRS_WEIGHTS, iterations=100,
+             learning_rate=0.02, processes=1, log=None):
+    """Fit FSRS weights to a review history by minimizing log loss
+
+    Runs Adam on finite-difference gradients in a space where every weight
+    is scaled to its FSRS_BOUNDS range. Each iteration evaluates the loss for
+    all perturbed weight vectors in one batch, which ``processes`` > 1
+    splits across worker processes by word.
+
+    Returns:
+        (weights, initial_loss, final_loss)
+    """
+    import numpy as np
+
+    lower = np.array([b[0] for b in FSRS_BOUNDS])
+    upper = np.array([b[1] for b in FSRS_BOUNDS])
+    span = upper - lower
+    u = (np.clip(np.asarray(weights, dtype=np.float64), lower, upper) - lower) / span
+
+    evaluate = _LossEvaluator(word_ids, recalls, days, processes)
+    try:
+        step = 1e-4
+        m = np.zeros_like(u)
+        v = np.zeros_like(u)
+        initial_loss = best_loss = evaluate([lower + u * span])[0]
+        best_u = u.copy()
+        for t in range(1, iterations + 1):
+            batch = [lower + u * span]
+            for j in range(u.size):
+                shifted = u.copy()
+                shifted[j] += step
+                batch.append(lower + shifted * span)
+            losses = evaluate(batch)
+            loss = losses[0]
+            if loss < best_loss:
+                best_loss, best_u = loss, u.copy()
+            grad = (np.array(losses[1:]) - loss) / step
+
+            m = 0.9 * m + 0.1 * grad
+            v = 0.999 * v + 0.001 * grad ** 2
+            m_hat = m / (1 - 0.9 ** t)
+            v_hat = v / (1 - 0.999 ** t)
+            u = np.clip(u - learning_rate * m_hat / (np.sqrt(v_hat) + 1e-8), 0.0, 1.0)
+            if log:
+                log(f"iteration {t}: loss {loss:.5f}")
+
+        final_loss = evaluate([lower + u * span])[0]
+        if final_loss > best_loss:
+            u, final_loss = best_u, best_loss
+    finally:
+        evaluate.close()
+    return tuple(float(x) for x in lower + u * span), initial_loss, final_loss
+
+
+def evaluate_fsrs(word_ids, recalls, days, weights=DEFAULT_FSRS_WEIGHTS, bins=10) -> Dict[str, Any]:
+    """Compare FSRS recall predictions with what actually happened
+
+    Every review after a word's first is scored with the probability the
+    model gave before it.
+
+    Returns:
+        Log loss, RMSE over probability bins, mean predicted and actual
+        retention, and a calibration table
+    """
+    import numpy as np
+
+    _, _, _, predicted = replay_fsrs(word_ids, recalls, days, weights)
+    mask = ~np.isnan(predicted)
+    p = predicted[mask]
+    y = (np.asarray(recalls)[mask] >= DEFAULT_SM2.pass_score).astype(np.float64)
+    if p.size == 0:
+        return {"reviews": 0}
+
+    clipped = np.clip(p, 1e-6, 1 - 1e-6)
+    log_loss = float(-np.mean(y * np.log(clipped) + (1 - y) * np.log(1 - clipped)))
+
+    which = np.minimum((p * bins).astype(np.int64), bins - 1)
+    calibration = []
+    squared_error = 0.0
+    for b in range(bins):
+        in_bin = which == b
+        count = int(in_bin.sum())
+        if not count:
+            continue
+        predicted_mean = float(p[in_bin].mean())
+        actual_mean = float(y[in_bin].mean())
+        squared_error += count * (predicted_mean - actual_mean) ** 2
+        calibration.append({
+            "bin": f"{b / bins:.1f}-{(b + 1) / bins:.1f}",
+            "reviews": count,
+            "predicted_retention": round(predicted_mean, 4),
+            "actual_retention": round(actual_mean, 4),
+        })
+
+    return {
+        "reviews": int(p.size),
+        "log_loss": round(log_loss, 5),
+        "rmse_bins": round(float(np.sqrt(squared_error / p.size)), 5),
+        "predicted_retention": round(float(p.mean()), 4),
+        "actual_retention": round(float(y.mean()), 4),
+        "calibration": calibration,
+    }
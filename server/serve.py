@@ -0,0 +1,73 @@
+import argparse
+import multiprocessing
+import os
+
+from app import create_app, db
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='English Word Learning API (production server)')
+    parser.add_argument('--bind', type=str, default=os.environ.get('BIND', '0.0.0.0:5000'),
+                      help='Address to bind to (host:port)')
+    parser.add_argument('--workers', type=int,
+                      default=int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)),
+                      help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 4)),
+                      help='Threads per worker process')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('WEB_TIMEOUT', 30)),
+                      help='Worker timeout in seconds')
+    return parser.parse_args()
+
+
+def main():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("gunicorn is required for serve.py: pip install -r requirements.txt")
+
+    args = parse_args()
+
+    app = create_app()
+
+    # Create tables once in the master process, before any worker starts
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+
+    def post_fork(server, worker):
+        """Never share pooled SQLite connections across a fork"""
+        with app.app_context():
+            db.engine.dispose()
+
+    class WordApplication(BaseApplication):
+        """Gunicorn application serving the preloaded Flask app"""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'keepalive': 5,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'accesslog': os.environ.get('ACCESS_LOG'),
+    }
+    WordApplication(app, options).run()
+
+
+if __name__ == '__main__':
+    main()
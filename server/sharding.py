@@ -0,0 +1,174 @@
+"""Per-learner database shards
+
+In multi-learner mode every learner's words, study sessions and review
+schedule live in their own SQLite file under one shard directory, so
+learners never wait on each other's write lock and each learner can keep
+their own copy of a word (``words.word`` is unique per shard, not
+globally).
+
+``ShardRouter`` maps a learner id to its shard file and keeps an LRU of
+open ``Storage`` handles, closing the least recently used one when more
+than ``max_open`` shards are open so file descriptor use stays bounded.
+Handles are leased (``with router.lease(learner_id) as store:``) and
+counted, so a shard evicted while another thread still uses it is closed
+when the last lease ends. Only leases with ``create=True`` (writes that
+add words) create a shard for a learner that has none.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+
+from storage import Storage
+
+SHARD_DIR = os.environ.get('WORDS_SHARD_DIR')
+
+# Open shard handles kept in the LRU
+MAX_OPEN_SHARDS = int(os.environ.get('WORDS_SHARD_MAX_OPEN', 64))
+
+# Pooled connections per shard; one learner rarely has concurrent writers
+SHARD_POOL_SIZE = int(os.environ.get('WORDS_SHARD_POOL_SIZE', 2))
+
+# Decoded word rows cached per open shard
+SHARD_ROW_CACHE_SIZE = int(os.environ.get('WORDS_SHARD_ROW_CACHE', 512))
+
+# Learner ids that can be used as a file name as they are
+_SAFE_LEARNER_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$')
+
+
+def shard_name(learner_id: str) -> str:
+    """File name of a learner's shard
+
+    Readable ids are kept so shards can be found by hand; anything else
+    (path separators, unicode, very long ids) is hashed.
+    """
+    learner_id = str(learner_id)
+    if not learner_id:
+        raise ValueError("learner_id must not be empty")
+    if _SAFE_LEARNER_ID.match(learner_id):
+        return f"learner_{learner_id}.db"
+    digest = hashlib.sha1(learner_id.encode('utf-8')).hexdigest()
+    return f"learner_{digest}.db"
+
+
+class UnknownLearnerError(LookupError):
+    """Raised when reading from a learner that has no shard yet"""
+
+    def __init__(self, learner_id: str):
+        super().__init__(f"No data stored for learner {learner_id!r}")
+        self.learner_id = learner_id
+
+
+class ShardRouter:
+    """Route learner ids to their own Storage, keeping at most max_open open"""
+
+    def __init__(self, directory: str, max_open: int = MAX_OPEN_SHARDS,
+                 pool_size: int = SHARD_POOL_SIZE, pragmas: Optional[List[str]] = None,
+                 row_cache_size: int = SHARD_ROW_CACHE_SIZE):
+        self.directory = os.path.abspath(directory)
+        self.max_open = max(1, max_open)
+        self.pool_size = pool_size
+        self.pragmas = pragmas
+        self.row_cache_size = row_cache_size
+        self._open = OrderedDict()
+        # Leases by shard path, and evicted shards waiting for theirs to end
+        self._leases = {}
+        self._evicted = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, learner_id: str) -> str:
+        """Path of a learner's shard file"""
+        return os.path.join(self.directory, shard_name(learner_id))
+
+    @contextmanager
+    def lease(self, learner_id: str, create: bool = False):
+        """Context manager yielding a learner's Storage, kept open until it exits
+
+        Args:
+            learner_id: Learner whose shard to open
+            create: Create the shard if the learner has none yet
+
+        Raises:
+            UnknownLearnerError: if the learner has no shard and create is False
+        """
+        path, store = self._acquire(learner_id, create)
+        try:
+            yield store
+        finally:
+            self._release(path, store)
+
+    def _acquire(self, learner_id: str, create: bool):
+        path = self.path_for(learner_id)
+        with self._lock:
+            store = self._open.get(path) or self._evicted.pop(path, None)
+            if store is None:
+                if not create and not os.path.exists(path):
+                    raise UnknownLearnerError(learner_id)
+                store = Storage(path, pool_size=self.pool_size, pragmas=self.pragmas,
+                                row_cache_size=self.row_cache_size)
+                store.init_db()
+            self._open[path] = store
+            self._open.move_to_end(path)
+            self._leases[path] = self._leases.get(path, 0) + 1
+            while len(self._open) > self.max_open:
+                evicted_path, evicted = self._open.popitem(last=False)
+                if evicted_path in self._leases:
+                    # Still in use: closed by the last _release
+                    self._evicted[evicted_path] = evicted
+                else:
+                    evicted.close()
+            return path, store
+
+    def _release(self, path: str, store: Storage):
+        with self._lock:
+            self._leases[path] -= 1
+            if self._leases[path]:
+                return
+            del self._leases[path]
+            if self._evicted.get(path) is store:
+                del self._evicted[path]
+                store.close()
+
+    def learners(self) -> List[str]:
+        """Shard file names present in the shard directory"""
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith('learner_') and name.endswith('.db'))
+
+    def open_count(self) -> int:
+        with self._lock:
+            return len(self._open)
+
+    def close(self):
+        """Close every open shard"""
+        with self._lock:
+            while self._open:
+                _, store = self._open.popitem(last=False)
+                store.close()
+            while self._evicted:
+                _, store = self._evicted.popitem()
+                store.close()
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(directory: Optional[str] = None, **kwargs) -> Optional[ShardRouter]:
+    """Return the process-wide ShardRouter for a directory
+
+    Returns None when no directory is given and WORDS_SHARD_DIR is unset,
+    i.e. when multi-learner mode is off.
+    """
+    directory = directory or SHARD_DIR
+    if not directory:
+        return None
+    directory = os.path.abspath(directory)
+    with _routers_lock:
+        router = _routers.get(directory)
+        if router is None:
+            router = _routers[directory] = ShardRouter(directory, **kwargs)
+        return router
@@ -0,0 +1,2808 @@
+"""Shared storage engine for the English Word Learning database
+
+Both the MCP server (``mcp_server.py``) and the Flask API (``app``) read and
+write words, study sessions and review schedules through this module, so
+they share one schema, one connection pool, SQLite's per-connection
+prepared statement cache and a cache of decoded word rows.
+"""
+import functools
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from normalize import lookup_key
+from phonetic import phonetic_keys, query_keys, similarity
+
+DB_PATH = os.environ.get(
+    'WORDS_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'english_words.db'))
+
+# Columns holding JSON encoded lists
+JSON_FIELDS = ('translations', 'definitions', 'examples')
+
+# Columns that may be written through update_word_field
+UPDATABLE_FIELDS = ('word', 'pronunciation', 'translations', 'definitions', 'examples', 'notes')
+
+POOL_SIZE = int(os.environ.get('WORDS_DB_POOL_SIZE', 8))
+STATEMENT_CACHE_SIZE = int(os.environ.get('WORDS_DB_STATEMENT_CACHE', 256))
+ROW_CACHE_SIZE = int(os.environ.get('WORDS_DB_ROW_CACHE', 4096))
+BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+
+# Study sessions older than this many days are rolled up by compact_sessions
+SESSION_RETENTION_DAYS = int(os.environ.get('WORDS_SESSION_RETENTION_DAYS', 365))
+
+# Replica mode: words and schedules are read from an in-memory copy
+# (MemoryReplica), which picks up other processes' writes this often
+MEMORY_REPLICA = os.environ.get('WORDS_MEMORY_REPLICA', '').lower() in ('1', 'true', 'yes')
+MEMORY_REPLICA_SYNC = int(os.environ.get('WORDS_MEMORY_REPLICA_SYNC_MS', 1000)) / 1000
+
+# Daily review plan (plan_reviews): due and new words queued per day
+PLAN_DUE_LIMIT = int(os.environ.get('WORDS_PLAN_DUE_LIMIT', 200))
+PLAN_NEW_LIMIT = int(os.environ.get('WORDS_PLAN_NEW_LIMIT', 20))
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS words (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        word TEXT UNIQUE NOT NULL,
+        pronunciation TEXT,
+        translations TEXT,
+        definitions TEXT,
+        examples TEXT,
+        notes TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        lookup_key TEXT,
+        phonetic_key TEXT,
+        phonetic_alt TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS study_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        word_id INTEGER NOT NULL,
+        study_time INTEGER NOT NULL,
+        recall_score INTEGER NOT NULL,
+        studied_at TIMESTAMP NOT NULL,
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS review_schedule (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        word_id INTEGER NOT NULL,
+        next_review TIMESTAMP NOT NULL,
+        ease_factor REAL NOT NULL DEFAULT 2.5,
+        interval INTEGER NOT NULL DEFAULT 1,
+        stability REAL,
+        difficulty REAL,
+        last_review TIMESTAMP,
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS study_rollups (
+        word_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        session_count INTEGER NOT NULL,
+        total_study_time INTEGER NOT NULL,
+        recall_1 INTEGER NOT NULL DEFAULT 0,
+        recall_2 INTEGER NOT NULL DEFAULT 0,
+        recall_3 INTEGER NOT NULL DEFAULT 0,
+        recall_4 INTEGER NOT NULL DEFAULT 0,
+        recall_5 INTEGER NOT NULL DEFAULT 0,
+        first_studied_at TIMESTAMP NOT NULL,
+        last_studied_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (word_id, day),
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS scheduler_params (
+        name TEXT PRIMARY KEY,
+        params TEXT NOT NULL,
+        metrics TEXT,
+        fitted_at TIMESTAMP NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS review_forecast (
+        day TEXT PRIMARY KEY,
+        due_count INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS word_neighbors (
+        word_id INTEGER NOT NULL,
+        neighbor_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (word_id, neighbor_id),
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE,
+        FOREIGN KEY (neighbor_id) REFERENCES words(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        word_id INTEGER,
+        op TEXT NOT NULL,
+        changed_at INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS review_plan (
+        position INTEGER PRIMARY KEY AUTOINCREMENT,
+        word_id INTEGER NOT NULL UNIQUE,
+        kind TEXT NOT NULL,
+        done INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (word_id) REFERENCES words(id) ON DELETE CASCADE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS review_plan_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        plan_day TEXT NOT NULL,
+        due_limit INTEGER NOT NULL,
+        new_limit INTEGER NOT NULL,
+        by_retrievability INTEGER NOT NULL,
+        new_planned INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS progress_counts (
+        name TEXT PRIMARY KEY,
+        n INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS progress_daily (
+        day TEXT PRIMARY KEY,
+        reviews INTEGER NOT NULL DEFAULT 0,
+        study_time INTEGER NOT NULL DEFAULT 0,
+        recall_1 INTEGER NOT NULL DEFAULT 0,
+        recall_2 INTEGER NOT NULL DEFAULT 0,
+        recall_3 INTEGER NOT NULL DEFAULT 0,
+        recall_4 INTEGER NOT NULL DEFAULT 0,
+        recall_5 INTEGER NOT NULL DEFAULT 0,
+        words_added INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_study_sessions_word ON study_sessions(word_id, studied_at)',
+    'CREATE INDEX IF NOT EXISTS idx_word_neighbors_neighbor ON word_neighbors(neighbor_id)',
+    'CREATE INDEX IF NOT EXISTS idx_review_schedule_next ON review_schedule(next_review)',
+]
+
+# Version of SCHEMA and everything init_db creates or alters (columns,
+# indexes, triggers). Bump it with every schema change: init_db skips all
+# DDL on databases already at this version.
+SCHEMA_VERSION = 9
+
+# Lookup keys written before this schema version came from lemmatizer rules
+# that merged separate headwords (saw -> see, lives -> life); init_db re-keys
+# every word of an older database
+LOOKUP_KEYS_VERSION = 9
+
+# Timestamps are stored as integer epoch milliseconds (UTC). Databases
+# created before that hold ISO-8601 text until migrate_timestamps() has run.
+TIMESTAMPS_TEXT = 0
+TIMESTAMPS_MIGRATING = 1
+TIMESTAMPS_EPOCH_MS = 2
+
+# PRAGMA user_version holds both: SCHEMA_VERSION * 100 + TIMESTAMPS_*
+_SCHEMA_VERSION_UNIT = 100
+
+# Timestamp columns converted by migrate_timestamps, smallest tables first
+TIMESTAMP_COLUMNS = [
+    ('review_schedule', ('next_review', 'last_review')),
+    ('words', ('created_at', 'updated_at')),
+    ('study_rollups', ('first_studied_at', 'last_studied_at')),
+    ('study_sessions', ('studied_at',)),
+]
+
+# ISO text -> epoch ms, rounded to the nearest millisecond like to_epoch_ms.
+# Integer arithmetic on the fraction keeps the two exactly in agreement.
+TEXT_TO_EPOCH_MS = (
+    "CAST(strftime('%s', substr({0}, 1, 19)) AS INTEGER) * 1000"
+    " + (CAST(substr(substr({0}, 21) || '000000', 1, 6) AS INTEGER) + 500) / 1000"
+)
+# Expressions that accept either format, so triggers and bulk reads stay
+# correct while a migration is converting rows
+JULIAN_DAY = ("(CASE WHEN typeof({0}) = 'integer' THEN {0} / 86400000.0 + 2440587.5"
+              " ELSE julianday({0}) END)")
+UTC_DAY = "(CASE WHEN typeof({0}) = 'integer' THEN date({0} / 1000, 'unixepoch') ELSE date({0}) END)"
+
+# review_forecast holds the number of schedules due on each day; these
+# triggers keep it in step with every write to review_schedule.
+FORECAST_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_forecast_insert AFTER INSERT ON review_schedule
+    BEGIN
+        INSERT INTO review_forecast (day, due_count) VALUES ({new_day}, 1)
+        ON CONFLICT(day) DO UPDATE SET due_count = due_count + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_forecast_update AFTER UPDATE OF next_review ON review_schedule
+    WHEN {old_day} IS NOT {new_day}
+    BEGIN
+        UPDATE review_forecast SET due_count = due_count - 1 WHERE day = {old_day};
+        DELETE FROM review_forecast WHERE day = {old_day} AND due_count <= 0;
+        INSERT INTO review_forecast (day, due_count) VALUES ({new_day}, 1)
+        ON CONFLICT(day) DO UPDATE SET due_count = due_count + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_forecast_delete AFTER DELETE ON review_schedule
+    BEGIN
+        UPDATE review_forecast SET due_count = due_count - 1 WHERE day = {old_day};
+        DELETE FROM review_forecast WHERE day = {old_day} AND due_count <= 0;
+    END
+    ''',
+]
+FORECAST_TRIGGERS = [trigger.format(old_day=UTC_DAY.format('OLD.next_review'),
+                                    new_day=UTC_DAY.format('NEW.next_review'))
+                     for trigger in FORECAST_TRIGGERS]
+FORECAST_INDEX = ('CREATE INDEX IF NOT EXISTS idx_review_schedule_day ON review_schedule({})'
+                  .format(UTC_DAY.format('next_review')))
+REBUILD_FORECAST = [
+    "DELETE FROM review_forecast",
+    """
+    INSERT INTO review_forecast (day, due_count)
+    SELECT {0}, COUNT(*) FROM review_schedule GROUP BY {0}
+    """.format(UTC_DAY.format('next_review')),
+]
+# Triggers and index written by releases that only knew ISO text
+DROP_FORECAST_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS trg_forecast_insert",
+    "DROP TRIGGER IF EXISTS trg_forecast_update",
+    "DROP TRIGGER IF EXISTS trg_forecast_delete",
+    "DROP INDEX IF EXISTS idx_review_schedule_day",
+]
+
+# Learning progress (get_learning_progress) is read from counters these
+# triggers keep in step with every write: progress_counts holds the number of
+# words and of schedules per interval bucket, progress_daily each day's
+# reviews, study time, recall histogram and words added. Deleting words or
+# compacting sessions leaves the days already counted alone.
+# Intervals (days) from which a scheduled word counts as young and as mature
+YOUNG_INTERVAL = 7
+MATURE_INTERVAL = 21
+INTERVAL_BUCKETS = ('learning', 'young', 'mature')
+_BUCKET = (f"(CASE WHEN {{0}}.interval >= {MATURE_INTERVAL} THEN 'mature'"
+           f" WHEN {{0}}.interval >= {YOUNG_INTERVAL} THEN 'young' ELSE 'learning' END)")
+PROGRESS_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_progress_word_insert AFTER INSERT ON words
+    BEGIN
+        UPDATE progress_counts SET n = n + 1 WHERE name = 'words';
+        INSERT INTO progress_daily (day, words_added) VALUES ({created_day}, 1)
+        ON CONFLICT(day) DO UPDATE SET words_added = words_added + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_progress_word_delete AFTER DELETE ON words
+    BEGIN
+        UPDATE progress_counts SET n = n - 1 WHERE name = 'words';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_progress_schedule_insert AFTER INSERT ON review_schedule
+    BEGIN
+        UPDATE progress_counts SET n = n + 1 WHERE name = {new_bucket};
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_progress_schedule_update AFTER UPDATE OF interval ON review_schedule
+    WHEN {old_bucket} IS NOT {new_bucket}
+    BEGIN
+        UPDATE progress_counts SET n = n - 1 WHERE name = {old_bucket};
+        UPDATE progress_counts SET n = n + 1 WHERE name = {new_bucket};
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_progress_schedule_delete AFTER DELETE ON review_schedule
+    BEGIN
+        UPDATE progress_counts SET n = n - 1 WHERE name = {old_bucket};
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_progress_study AFTER INSERT ON study_sessions
+    BEGIN
+        INSERT INTO progress_daily (day, reviews, study_time, recall_1, recall_2, recall_3, recall_4, recall_5)
+        VALUES ({studied_day}, 1, NEW.study_time, NEW.recall_score <= 1, NEW.recall_score = 2,
+                NEW.recall_score = 3, NEW.recall_score = 4, NEW.recall_score >= 5)
+        ON CONFLICT(day) DO UPDATE SET
+            reviews = reviews + 1,
+            study_time = study_time + excluded.study_time,
+            recall_1 = recall_1 + excluded.recall_1,
+            recall_2 = recall_2 + excluded.recall_2,
+            recall_3 = recall_3 + excluded.recall_3,
+            recall_4 = recall_4 + excluded.recall_4,
+            recall_5 = recall_5 + excluded.recall_5;
+    END
+    ''',
+]
+PROGRESS_TRIGGERS = [trigger.format(created_day=UTC_DAY.format('NEW.created_at'),
+                                    studied_day=UTC_DAY.format('NEW.studied_at'),
+                                    old_bucket=_BUCKET.format('OLD'), new_bucket=_BUCKET.format('NEW'))
+                     for trigger in PROGRESS_TRIGGERS]
+# Counted from scratch on the first run on an existing database: raw
+# sessions, compacted days and words by the day they were added
+REBUILD_PROGRESS = [
+    "DELETE FROM progress_counts",
+    "DELETE FROM progress_daily",
+    "INSERT INTO progress_counts (name, n) SELECT 'words', COUNT(*) FROM words",
+    """
+    INSERT INTO progress_counts (name, n)
+    SELECT b.column1, (SELECT COUNT(*) FROM review_schedule WHERE {0} = b.column1)
+    FROM (VALUES ('learning'), ('young'), ('mature')) b
+    """.format(_BUCKET.format('review_schedule')),
+    """
+    INSERT INTO progress_daily
+    (day, reviews, study_time, recall_1, recall_2, recall_3, recall_4, recall_5, words_added)
+    SELECT day, SUM(reviews), SUM(study_time), SUM(recall_1), SUM(recall_2), SUM(recall_3),
+           SUM(recall_4), SUM(recall_5), SUM(words_added)
+    FROM (
+        SELECT {0} AS day, COUNT(*) AS reviews, SUM(study_time) AS study_time,
+               SUM(recall_score <= 1) AS recall_1, SUM(recall_score = 2) AS recall_2,
+               SUM(recall_score = 3) AS recall_3, SUM(recall_score = 4) AS recall_4,
+               SUM(recall_score >= 5) AS recall_5, 0 AS words_added
+        FROM study_sessions GROUP BY 1
+        UNION ALL
+        SELECT day, session_count, total_study_time, recall_1, recall_2, recall_3, recall_4, recall_5, 0
+        FROM study_rollups
+        UNION ALL
+        SELECT {1}, 0, 0, 0, 0, 0, 0, 0, COUNT(*) FROM words GROUP BY 1
+    )
+    GROUP BY day
+    """.format(UTC_DAY.format('studied_at'), UTC_DAY.format('created_at')),
+]
+SELECT_PROGRESS_COUNTS = "SELECT name, n FROM progress_counts"
+SELECT_PROGRESS_DAYS = """
+    SELECT day, reviews, study_time, recall_1, recall_2, recall_3, recall_4, recall_5, words_added
+    FROM progress_daily
+    WHERE day >= ? AND day <= ?
+    ORDER BY day
+"""
+
+# words_version counts commits that changed the words table. The row cache
+# validates against it rather than PRAGMA data_version, so study and schedule
+# writes no longer empty the cache.
+WORDS_VERSION_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS words_version (id INTEGER PRIMARY KEY CHECK (id = 1), n INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO words_version (id, n) VALUES (1, 0)',
+] + [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_words_version_{event.lower()} AFTER {event} ON words
+    BEGIN
+        UPDATE words_version SET n = n + 1 WHERE id = 1;
+    END
+    '''
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+]
+SELECT_WORDS_VERSION = 'SELECT n FROM words_version WHERE id = 1'
+
+# change_log records the inserts, updates and deletes of words, schedules and
+# study sessions for clients keeping a copy in sync (get_changes). Writers are
+# serialized, so seq grows in commit order; AUTOINCREMENT keeps the seqs of
+# pruned entries from being reused. Updates that change nothing clients see
+# (lookup keys, a timestamp converted to epoch ms) are not logged, and neither
+# are the sessions and schedule deleted along with their word: the word's
+# tombstone stands for them.
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('WORDS_CHANGE_LOG_RETENTION_DAYS', 30))
+
+# Logged tables: (table, column holding the word ID, columns clients see)
+CHANGE_LOG_TABLES = [
+    ('words', 'id', ('word', 'pronunciation', 'translations', 'definitions', 'examples', 'notes',
+                     'created_at', 'updated_at')),
+    ('review_schedule', 'word_id', ('word_id', 'next_review', 'ease_factor', 'interval', 'stability',
+                                    'difficulty', 'last_review')),
+    ('study_sessions', 'word_id', ('word_id', 'study_time', 'recall_score', 'studied_at')),
+]
+CHANGE_UPSERT = 'upsert'
+CHANGE_DELETE = 'delete'
+CHANGE_LOG_INDEX = 'CREATE INDEX IF NOT EXISTS idx_change_log_changed ON change_log(changed_at)'
+_NOW_EPOCH_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+
+def _column_changed(table: str, column: str) -> str:
+    """Trigger condition: OLD and NEW differ in a column, a migrated timestamp counting as equal"""
+    if column in dict(TIMESTAMP_COLUMNS)[table]:
+        return (f"(CASE WHEN typeof(OLD.{column}) = 'text' AND typeof(NEW.{column}) = 'integer'"
+                f" THEN {TEXT_TO_EPOCH_MS.format(f'OLD.{column}')} IS NOT NEW.{column}"
+                f" ELSE OLD.{column} IS NOT NEW.{column} END)")
+    return f"OLD.{column} IS NOT NEW.{column}"
+
+
+def _change_log_triggers(table: str, word_column: str, columns: Tuple[str, ...]) -> List[str]:
+    insert = ("INSERT INTO change_log (table_name, row_id, word_id, op, changed_at)"
+              f" VALUES ('{table}', {{row}}.id, {{row}}.{word_column}, '{{op}}', {_NOW_EPOCH_MS});")
+    # A session or schedule deleted with its word is covered by the word's tombstone
+    word_exists = '' if table == 'words' else 'WHEN EXISTS (SELECT 1 FROM words WHERE id = OLD.word_id)'
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_insert AFTER INSERT ON {table}
+        BEGIN
+            {insert.format(row='NEW', op=CHANGE_UPSERT)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_update AFTER UPDATE ON {table}
+        WHEN {' OR '.join(_column_changed(table, column) for column in columns)}
+        BEGIN
+            {insert.format(row='NEW', op=CHANGE_UPSERT)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_delete AFTER DELETE ON {table}
+        {word_exists}
+        BEGIN
+            {insert.format(row='OLD', op=CHANGE_DELETE)}
+        END
+        """,
+    ]
+
+
+CHANGE_LOG_TRIGGERS = [trigger for table in CHANGE_LOG_TABLES for trigger in _change_log_triggers(*table)]
+SELECT_CHANGE_LOG_BOUNDS = """
+    SELECT (SELECT MIN(seq) FROM change_log),
+           (SELECT seq FROM sqlite_sequence WHERE name = 'change_log')
+"""
+SELECT_CHANGES = "SELECT seq, table_name, row_id, word_id, op FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?"
+# Makes cursor 0 older than the log, for a database that had rows before it
+START_CHANGE_LOG = "INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', 1)"
+PRUNE_CHANGES = """
+    DELETE FROM change_log
+    WHERE seq IN (SELECT seq FROM change_log ORDER BY seq LIMIT ?1) AND changed_at < ?2
+"""
+
+# Tables held by MemoryReplica, and the statements copying them into it
+REPLICA_TABLES = ('words', 'review_schedule')
+SELECT_REPLICA_SCHEMA = """
+    SELECT sql FROM sqlite_master
+    WHERE tbl_name IN ('words', 'review_schedule') AND type IN ('table', 'index') AND sql IS NOT NULL
+    ORDER BY type = 'index'
+"""
+SELECT_REPLICA_CHANGES = """
+    SELECT seq, table_name, row_id, op FROM change_log
+    WHERE seq > ? AND table_name IN ('words', 'review_schedule')
+    ORDER BY seq LIMIT ?
+"""
+
+# Columns added after the first release: (table, column, declaration)
+ADDED_COLUMNS = [
+    ('review_schedule', 'stability', 'REAL'),
+    ('review_schedule', 'difficulty', 'REAL'),
+    ('review_schedule', 'last_review', 'TIMESTAMP'),
+    ('words', 'lookup_key', 'TEXT'),
+    ('words', 'phonetic_key', 'TEXT'),
+    ('words', 'phonetic_alt', 'TEXT'),
+]
+
+# words.lookup_key is normalize.lookup_key(word): case folded and
+# lemmatized, so "Running" finds "run". Not unique; filled in for older
+# rows by backfill_lookup_keys.
+LOOKUP_KEY_INDEX = 'CREATE INDEX IF NOT EXISTS idx_words_lookup_key ON words(lookup_key)'
+SELECT_WORDS_BY_KEY = "SELECT * FROM words WHERE lookup_key = ? ORDER BY id"
+# The stored word a save collides with: the same text, else the same key
+SELECT_DUPLICATE_WORD_ID = """
+    SELECT id FROM words WHERE word = ?1 OR lookup_key = ?2
+    ORDER BY word = ?1 DESC, id LIMIT 1
+"""
+SELECT_MISSING_LOOKUP_KEYS = """
+    SELECT id, word, lookup_key FROM words WHERE lookup_key IS NULL AND id > ? ORDER BY id LIMIT ?
+"""
+SELECT_LOOKUP_KEYS_AFTER = "SELECT id, word, lookup_key FROM words WHERE id > ? ORDER BY id LIMIT ?"
+UPDATE_LOOKUP_KEY = "UPDATE words SET lookup_key = ? WHERE id = ?"
+
+# words.phonetic_key and phonetic_alt are phonetic.phonetic_keys(word,
+# pronunciation): codes of how the word sounds, so sound-alike search probes
+# the two indexes for the query's codes. Filled in for older rows by
+# backfill_phonetic_keys.
+PHONETIC_KEY_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_words_phonetic_key ON words(phonetic_key)',
+    'CREATE INDEX IF NOT EXISTS idx_words_phonetic_alt ON words(phonetic_alt)',
+]
+# Candidates for up to two query codes (?1, ?2), ranked in Python
+SELECT_SOUND_ALIKE = """
+    SELECT * FROM words WHERE phonetic_key IN (?1, ?2) OR phonetic_alt IN (?1, ?2) LIMIT ?3
+"""
+# Words matched per query before ranking
+SOUND_ALIKE_CANDIDATES = 200
+SELECT_PHONETIC_SOURCE = "SELECT id, word, pronunciation, phonetic_key, phonetic_alt FROM words WHERE id = ?"
+SELECT_MISSING_PHONETIC_KEYS = """
+    SELECT id, word, pronunciation, phonetic_key, phonetic_alt FROM words
+    WHERE phonetic_key IS NULL AND id > ? ORDER BY id LIMIT ?
+"""
+SELECT_PHONETIC_KEYS_AFTER = """
+    SELECT id, word, pronunciation, phonetic_key, phonetic_alt FROM words WHERE id > ? ORDER BY id LIMIT ?
+"""
+UPDATE_PHONETIC_KEYS = "UPDATE words SET phonetic_key = ?, phonetic_alt = ? WHERE id = ?"
+
+# word_neighbors holds each word's most similar words (related.py), so
+# related-word queries read a handful of rows by primary key
+SELECT_RELATED_WORDS = """
+    SELECT w.*, n.score AS score
+    FROM word_neighbors n
+    JOIN words w ON w.id = n.neighbor_id
+    WHERE n.word_id = ?
+    ORDER BY n.score DESC
+    LIMIT ?
+"""
+HAS_NEIGHBORS = "SELECT EXISTS (SELECT 1 FROM word_neighbors)"
+SELECT_NEIGHBOR_IDS = "SELECT neighbor_id FROM word_neighbors WHERE word_id = ?"
+SELECT_REVERSE_NEIGHBOR_IDS = "SELECT word_id FROM word_neighbors WHERE neighbor_id = ?"
+SELECT_NEIGHBOR_FLOORS = """
+    SELECT word_id, MIN(score), COUNT(*) FROM word_neighbors WHERE word_id IN ({}) GROUP BY word_id
+"""
+INSERT_NEIGHBOR = "INSERT OR REPLACE INTO word_neighbors (word_id, neighbor_id, score) VALUES (?, ?, ?)"
+DELETE_NEIGHBORS = "DELETE FROM word_neighbors WHERE word_id = ?"
+DELETE_NEIGHBOR = "DELETE FROM word_neighbors WHERE word_id = ? AND neighbor_id = ?"
+# Keep the ?2 best neighbors of each word in the JSON array ?1
+TRIM_NEIGHBORS = """
+    DELETE FROM word_neighbors WHERE (word_id, neighbor_id) IN (
+        SELECT word_id, neighbor_id FROM (
+            SELECT word_id, neighbor_id,
+                   ROW_NUMBER() OVER (PARTITION BY word_id ORDER BY score DESC, neighbor_id) AS rank
+            FROM word_neighbors WHERE word_id IN (SELECT value FROM json_each(?1)))
+        WHERE rank > ?2)
+"""
+
+# Older databases may hold more than one schedule row per word; keep the
+# newest before the unique index is created.
+DEDUPE_SCHEDULE = '''
+    DELETE FROM review_schedule
+    WHERE id NOT IN (SELECT MAX(id) FROM review_schedule GROUP BY word_id)
+'''
+SCHEDULE_INDEX = 'CREATE UNIQUE INDEX IF NOT EXISTS idx_review_schedule_word ON review_schedule(word_id)'
+
+# review_plan is the day's review queue (plan_reviews): due and new words
+# interleaved, served in position order, for the day and limits recorded in
+# review_plan_state. These triggers keep it current for every writer:
+# studying a word marks its item done (one probe of the word_id index), and
+# a word saved while the day's new-word quota has room joins the queue.
+# Positions never repeat (AUTOINCREMENT), so a cursor into an older plan
+# starts over at the beginning of the current one.
+PLAN_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_plan_studied AFTER INSERT ON study_sessions
+    BEGIN
+        UPDATE review_plan SET done = 1 WHERE word_id = NEW.word_id AND done = 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_plan_new_word AFTER INSERT ON words
+    WHEN (SELECT new_planned < new_limit FROM review_plan_state WHERE id = 1)
+    BEGIN
+        INSERT INTO review_plan (word_id, kind) VALUES (NEW.id, 'new');
+        UPDATE review_plan_state SET new_planned = new_planned + 1 WHERE id = 1;
+    END
+    ''',
+]
+SELECT_PLAN_STATE = "SELECT plan_day, due_limit, new_limit, by_retrievability FROM review_plan_state WHERE id = 1"
+CLEAR_PLAN = ["DELETE FROM review_plan", "DELETE FROM review_plan_state"]
+INSERT_PLAN_ITEM = "INSERT INTO review_plan (word_id, kind) VALUES (?, ?)"
+INSERT_PLAN_STATE = """
+    INSERT INTO review_plan_state (id, plan_day, due_limit, new_limit, by_retrievability, new_planned)
+    VALUES (1, ?, ?, ?, ?, ?)
+"""
+# A bulk reschedule reorders the due words: the next read plans the day again
+INVALIDATE_PLAN = "DELETE FROM review_plan_state"
+# The next ?2 items not yet studied after position ?1
+SELECT_PLANNED_WORDS = """
+    SELECT w.*, p.position AS position, rs.next_review AS next_review, rs.interval AS interval,
+           rs.stability AS stability, rs.last_review AS last_review
+    FROM review_plan p
+    JOIN words w ON w.id = p.word_id
+    LEFT JOIN review_schedule rs ON rs.word_id = p.word_id
+    WHERE p.position > ? AND p.done = 0
+    ORDER BY p.position
+    LIMIT ?
+"""
+
+# Statements are kept as constants so every call hits sqlite3's statement cache
+SELECT_WORD_BY_ID = "SELECT * FROM words WHERE id = ?"
+SELECT_WORD_BY_TEXT = "SELECT * FROM words WHERE word = ?"
+SELECT_WORD_ID_BY_TEXT = "SELECT id FROM words WHERE word = ?"
+SELECT_ALL_WORDS = "SELECT * FROM words ORDER BY word"
+INSERT_WORD = """
+    INSERT INTO words
+    (word, pronunciation, translations, definitions, examples, notes, created_at, updated_at, lookup_key,
+     phonetic_key, phonetic_alt)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Saves resolve a duplicate word text in one of these ways: raise
+# DuplicateWordError, merge the new lists into the stored ones, or replace
+# every field (keeping the ID, history and created_at)
+ON_CONFLICT_ERROR = 'error'
+ON_CONFLICT_MERGE = 'merge'
+ON_CONFLICT_REPLACE = 'replace'
+ON_CONFLICT_MODES = (ON_CONFLICT_ERROR, ON_CONFLICT_MERGE, ON_CONFLICT_REPLACE)
+# Inserts a new word and returns its ID, or returns nothing for a duplicate
+INSERT_NEW_WORD = INSERT_WORD + "ON CONFLICT(word) DO NOTHING RETURNING id"
+# Items of the stored list first, then new ones not already in it
+MERGE_LIST = ("(SELECT json_group_array(value) FROM ("
+              "SELECT value FROM json_each(words.{0}) UNION ALL "
+              "SELECT value FROM json_each(?{1}) WHERE value NOT IN (SELECT value FROM json_each(words.{0}))))")
+# Bound with the first eight parameters of INSERT_WORD and the stored word's
+# ID as ?9: the stored text (and its lookup key) is kept. Phonetic keys are
+# refreshed afterwards, as they depend on the resulting pronunciation.
+UPDATE_EXISTING_WORD = {
+    ON_CONFLICT_MERGE: f"""
+        UPDATE words SET
+            pronunciation = COALESCE(NULLIF(?2, ''), pronunciation),
+            translations = {MERGE_LIST.format('translations', 3)},
+            definitions = {MERGE_LIST.format('definitions', 4)},
+            examples = {MERGE_LIST.format('examples', 5)},
+            notes = COALESCE(NULLIF(?6, ''), notes),
+            updated_at = ?8
+        WHERE id = ?9
+        RETURNING id
+    """,
+    ON_CONFLICT_REPLACE: """
+        UPDATE words SET
+            pronunciation = ?2, translations = ?3, definitions = ?4, examples = ?5, notes = ?6,
+            updated_at = ?8
+        WHERE id = ?9
+        RETURNING id
+    """,
+}
+DELETE_WORD = "DELETE FROM words WHERE id = ?"
+INSERT_SESSION = "INSERT INTO study_sessions (word_id, study_time, recall_score, studied_at) VALUES (?, ?, ?, ?)"
+# studied_at in both formats, so rows written before or during a migration match
+SELECT_SESSION_EXISTS = """
+    SELECT 1 FROM study_sessions
+    WHERE word_id = ? AND studied_at IN (?, ?) AND study_time = ? AND recall_score = ?
+"""
+SELECT_SCHEDULE = """
+    SELECT next_review, ease_factor, interval, stability, difficulty, last_review
+    FROM review_schedule WHERE word_id = ?
+"""
+SELECT_SCHEDULES = """
+    SELECT word_id, next_review, ease_factor, interval, stability, difficulty, last_review
+    FROM review_schedule WHERE word_id IN ({})
+"""
+UPSERT_SCHEDULE = """
+    INSERT INTO review_schedule
+    (word_id, next_review, ease_factor, interval, stability, difficulty, last_review)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(word_id) DO UPDATE SET
+        next_review = excluded.next_review,
+        ease_factor = excluded.ease_factor,
+        interval = excluded.interval,
+        stability = excluded.stability,
+        difficulty = excluded.difficulty,
+        last_review = excluded.last_review
+"""
+SELECT_DUE_WORDS = """
+    SELECT w.*, rs.next_review AS next_review, rs.interval AS interval
+    FROM review_schedule rs
+    JOIN words w ON w.id = rs.word_id
+    WHERE rs.next_review <= ?
+    ORDER BY rs.next_review
+    LIMIT ?
+"""
+# FSRS: most-forgotten first, i.e. highest elapsed time relative to stability
+SELECT_DUE_WORDS_BY_RETRIEVABILITY = """
+    SELECT w.*, rs.next_review AS next_review, rs.interval AS interval,
+           rs.stability AS stability, rs.last_review AS last_review
+    FROM review_schedule rs
+    JOIN words w ON w.id = rs.word_id
+    WHERE rs.next_review <= ?1
+    ORDER BY ({} - {}) / rs.stability DESC, rs.next_review
+    LIMIT ?2
+""".format(JULIAN_DAY.format('?1'), JULIAN_DAY.format('rs.last_review'))
+SELECT_NEW_WORDS = """
+    SELECT w.* FROM words w
+    WHERE NOT EXISTS (SELECT 1 FROM review_schedule rs WHERE rs.word_id = w.id)
+    ORDER BY w.created_at
+    LIMIT ?
+"""
+# Variants for a database whose timestamps are being migrated. SQLite ranks
+# every INTEGER below every TEXT, so comparing or ordering a column that
+# holds both formats goes through JULIAN_DAY (at the cost of the index)
+_NEXT_REVIEW_DAY = JULIAN_DAY.format('rs.next_review')
+SELECT_DUE_WORDS_MIXED = """
+    SELECT w.*, rs.next_review AS next_review, rs.interval AS interval
+    FROM review_schedule rs
+    JOIN words w ON w.id = rs.word_id
+    WHERE {0} <= {1}
+    ORDER BY {0}
+    LIMIT ?2
+""".format(_NEXT_REVIEW_DAY, JULIAN_DAY.format('?1'))
+SELECT_DUE_WORDS_BY_RETRIEVABILITY_MIXED = """
+    SELECT w.*, rs.next_review AS next_review, rs.interval AS interval,
+           rs.stability AS stability, rs.last_review AS last_review
+    FROM review_schedule rs
+    JOIN words w ON w.id = rs.word_id
+    WHERE {0} <= {1}
+    ORDER BY ({1} - {2}) / rs.stability DESC, {0}
+    LIMIT ?2
+""".format(_NEXT_REVIEW_DAY, JULIAN_DAY.format('?1'), JULIAN_DAY.format('rs.last_review'))
+SELECT_NEW_WORDS_MIXED = SELECT_NEW_WORDS.replace(
+    'ORDER BY w.created_at', 'ORDER BY ' + JULIAN_DAY.format('w.created_at'))
+SELECT_HISTORY = """
+    SELECT s.word_id, s.recall_score
+    FROM study_sessions s
+    WHERE s.word_id IN (SELECT id FROM words)
+    ORDER BY s.word_id, s.studied_at, s.id
+"""
+SELECT_HISTORY_WITH_TIMES = """
+    SELECT s.word_id, s.recall_score, {}
+    FROM study_sessions s
+    WHERE s.word_id IN (SELECT id FROM words)
+    ORDER BY s.word_id, s.studied_at, s.id
+""".format(JULIAN_DAY.format('s.studied_at'))
+SELECT_LAST_STUDIED = """
+    SELECT word_id, MAX(studied_at) FROM study_sessions
+    WHERE word_id IN (SELECT id FROM words)
+    GROUP BY word_id
+"""
+SELECT_FORECAST = """
+    SELECT day, due_count FROM review_forecast
+    WHERE day >= ? AND day < ?
+    ORDER BY day
+"""
+SELECT_OVERDUE = "SELECT COALESCE(SUM(due_count), 0) FROM review_forecast WHERE day < ?"
+SELECT_SCHEDULER_PARAMS = "SELECT params, metrics, fitted_at FROM scheduler_params WHERE name = ?"
+SELECT_SCHEDULER_FITTED_AT = "SELECT fitted_at FROM scheduler_params WHERE name = ?"
+UPSERT_SCHEDULER_PARAMS = """
+    INSERT INTO scheduler_params (name, params, metrics, fitted_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        params = excluded.params,
+        metrics = excluded.metrics,
+        fitted_at = excluded.fitted_at
+"""
+# Session compaction works through study_sessions in rowid ranges, so each
+# batch is a short range scan and a short write transaction
+SELECT_SESSION_ID_RANGE = "SELECT MIN(id), MAX(id) FROM study_sessions"
+COUNT_COMPACTABLE = "SELECT COUNT(*) FROM study_sessions WHERE id > ?1 AND id <= ?2 AND studied_at < ?3"
+ROLLUP_SESSIONS = """
+    INSERT INTO study_rollups
+    (word_id, day, session_count, total_study_time, recall_1, recall_2, recall_3, recall_4, recall_5,
+     first_studied_at, last_studied_at)
+    SELECT word_id, {day}, COUNT(*), SUM(study_time),
+           SUM(recall_score <= 1), SUM(recall_score = 2), SUM(recall_score = 3),
+           SUM(recall_score = 4), SUM(recall_score >= 5), MIN(studied_at), MAX(studied_at)
+    FROM study_sessions
+    WHERE id > ?1 AND id <= ?2 AND studied_at < ?3 AND word_id IN (SELECT id FROM words)
+    GROUP BY word_id, {day}
+    ON CONFLICT(word_id, day) DO UPDATE SET
+        session_count = session_count + excluded.session_count,
+        total_study_time = total_study_time + excluded.total_study_time,
+        recall_1 = recall_1 + excluded.recall_1,
+        recall_2 = recall_2 + excluded.recall_2,
+        recall_3 = recall_3 + excluded.recall_3,
+        recall_4 = recall_4 + excluded.recall_4,
+        recall_5 = recall_5 + excluded.recall_5,
+        first_studied_at = MIN(first_studied_at, excluded.first_studied_at),
+        last_studied_at = MAX(last_studied_at, excluded.last_studied_at)
+""".format(day=UTC_DAY.format('studied_at'))
+DELETE_COMPACTED = "DELETE FROM study_sessions WHERE id > ?1 AND id <= ?2 AND studied_at < ?3"
+HAS_ROLLUPS = "SELECT EXISTS (SELECT 1 FROM study_rollups)"
+# Rolled-up days are replayed as their recall histogram, oldest day first
+SELECT_ROLLUP_HISTORY = """
+    SELECT word_id, recall_1, recall_2, recall_3, recall_4, recall_5, {}
+    FROM study_rollups
+    WHERE word_id IN (SELECT id FROM words)
+    ORDER BY word_id, day
+""".format(JULIAN_DAY.format('first_studied_at'))
+SELECT_ROLLUP_LAST_STUDIED = """
+    SELECT word_id, MAX(last_studied_at) FROM study_rollups
+    WHERE word_id IN (SELECT id FROM words)
+    GROUP BY word_id
+"""
+# Tables whose rows belong to a word; rows left behind by deletes made
+# before foreign keys were enforced are swept in rowid ranges
+WORD_CHILD_TABLES = ('study_sessions', 'review_schedule', 'study_rollups')
+SELECT_ROWID_RANGE = "SELECT MIN(rowid), MAX(rowid) FROM {table}"
+DELETE_ORPHANS = """
+    DELETE FROM {table}
+    WHERE rowid > ?1 AND rowid <= ?2 AND word_id NOT IN (SELECT id FROM words)
+"""
+SELECT_SESSION_TOTALS = """
+    SELECT COUNT(*), COALESCE(SUM(study_time), 0), COALESCE(SUM(recall_score), 0),
+           MIN(studied_at), MAX(studied_at)
+    FROM study_sessions WHERE word_id = ?
+"""
+SELECT_ROLLUP_TOTALS = """
+    SELECT COALESCE(SUM(session_count), 0), COALESCE(SUM(total_study_time), 0),
+           COALESCE(SUM(recall_1 + 2 * recall_2 + 3 * recall_3 + 4 * recall_4 + 5 * recall_5), 0),
+           MIN(first_studied_at), MAX(last_studied_at)
+    FROM study_rollups WHERE word_id = ?
+"""
+SELECT_ROLLUPS = """
+    SELECT day, session_count, total_study_time, recall_1, recall_2, recall_3, recall_4, recall_5
+    FROM study_rollups
+    WHERE word_id = ?
+    ORDER BY day DESC
+"""
+SELECT_SESSIONS = """
+    SELECT study_time, recall_score, studied_at
+    FROM study_sessions
+    WHERE word_id = ?
+    ORDER BY studied_at DESC
+"""
+SELECT_SESSIONS_MIXED = SELECT_SESSIONS.replace(
+    'ORDER BY studied_at', 'ORDER BY ' + JULIAN_DAY.format('studied_at'))
+
+
+class DuplicateWordError(Exception):
+    """Raised when saving a word whose text (or lookup key) is already stored"""
+
+    def __init__(self, word: str, word_id: int):
+        super().__init__(f"Word already exists: {word}")
+        self.word = word
+        self.word_id = word_id
+
+
+class WordConflictError(Exception):
+    """Raised when a word changed since the ``expected_updated_at`` a patch was based on"""
+
+    def __init__(self, word_id: int, updated_at: str):
+        super().__init__(f"Word {word_id} was changed at {updated_at}")
+        self.word_id = word_id
+        self.updated_at = updated_at
+
+
+def sqlite_pragmas(journal_mode: str = 'WAL', synchronous: str = 'NORMAL',
+                   mmap_size: int = 256 * 1024 * 1024, cache_size: int = -64 * 1024,
+                   busy_timeout: int = BUSY_TIMEOUT) -> List[str]:
+    """PRAGMA statements run on every new connection, in order"""
+    return [
+        # Only takes effect on a new, empty database (before WAL writes the
+        # header); existing files need a one-off VACUUM, see enable_incremental_vacuum
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        f"PRAGMA journal_mode={journal_mode}",
+        f"PRAGMA synchronous={synchronous}",
+        f"PRAGMA mmap_size={mmap_size}",
+        f"PRAGMA cache_size={cache_size}",
+        f"PRAGMA busy_timeout={busy_timeout}",
+        "PRAGMA temp_store=MEMORY",
+        # Enforce the ON DELETE CASCADE declared by the schema
+        "PRAGMA foreign_keys=ON",
+    ]
+
+
+DEFAULT_PRAGMAS = sqlite_pragmas(
+    journal_mode=os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    synchronous=os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    mmap_size=int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    cache_size=int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+)
+
+
+def format_timestamp(dt: datetime) -> str:
+    """Format datetime to ISO format"""
+    return dt.isoformat()
+
+
+EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+_HALF_MILLISECOND = timedelta(microseconds=500)
+
+# Columns that may hold epoch milliseconds in rows returned to callers
+ROW_TIMESTAMPS = ('created_at', 'updated_at', 'next_review', 'last_review')
+
+
+def to_epoch_ms(value: Any) -> Optional[int]:
+    """Convert a naive UTC datetime or ISO string to epoch milliseconds"""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - EPOCH + _HALF_MILLISECOND) // _MILLISECOND
+
+
+def from_epoch_ms(value: Any) -> Any:
+    """Convert epoch milliseconds to an ISO string; other values pass through"""
+    if isinstance(value, int):
+        return format_timestamp(EPOCH + timedelta(milliseconds=value))
+    return value
+
+
+def _to_text(value: Any) -> Any:
+    return format_timestamp(value) if isinstance(value, datetime) else value
+
+
+def decode_timestamps(row: Dict[str, Any], fields: Iterable[str] = ROW_TIMESTAMPS) -> Dict[str, Any]:
+    """Render epoch-millisecond columns of a row dict as ISO strings, in place"""
+    for field in fields:
+        value = row.get(field)
+        if isinstance(value, int):
+            row[field] = from_epoch_ms(value)
+    return row
+
+
+def decode_list(value: Optional[str]) -> List[Any]:
+    """Decode a JSON list column, treating NULL/empty as an empty list"""
+    return json.loads(value) if value else []
+
+
+# Columns of the words table, in table order
+WORD_COLUMNS = ('id', 'word', 'pronunciation', 'translations', 'definitions', 'examples',
+                'notes', 'created_at', 'updated_at')
+# Columns after those that only serve queries; records leave them out
+INTERNAL_WORD_COLUMNS = ('lookup_key', 'phonetic_key', 'phonetic_alt')
+
+
+class WordRecord:
+    """A words row that decodes its JSON lists and timestamps on first use
+
+    Holds the column values as SQLite returned them, so reading thousands of
+    rows costs one small slotted object each rather than a dict plus three
+    decoded lists; ``translations``, ``definitions``, ``examples`` and the
+    timestamps are decoded (and kept) the first time they are read. Columns
+    a query selects beyond the words table (``next_review``, ``interval``
+    ...) and keys added by callers live in ``extra``.
+
+    Supports ``record['field']``, ``get``, ``in`` and item assignment like
+    the dicts it replaces; call ``to_dict`` at the response boundary.
+    """
+
+    __slots__ = ('id', 'word', 'pronunciation', '_translations', '_definitions', '_examples',
+                 'notes', '_created_at', '_updated_at', 'extra')
+
+    def __init__(self, id, word, pronunciation, translations, definitions, examples,
+                 notes, created_at, updated_at, extra=None):
+        self.id = id
+        self.word = word
+        self.pronunciation = pronunciation
+        self._translations = translations
+        self._definitions = definitions
+        self._examples = examples
+        self.notes = notes
+        self._created_at = created_at
+        self._updated_at = updated_at
+        self.extra = extra
+
+    @classmethod
+    def from_rows(cls, names: List[str], rows: Iterable[tuple]) -> List['WordRecord']:
+        """Build records from plain tuples of a query selecting ``names``"""
+        names = tuple(names)
+        width = len(WORD_COLUMNS)
+        if names[:width] == WORD_COLUMNS:
+            # SELECT * also returns the internal columns that follow
+            skip = width + len(INTERNAL_WORD_COLUMNS) \
+                if names[width:width + len(INTERNAL_WORD_COLUMNS)] == INTERNAL_WORD_COLUMNS else width
+            extra = names[skip:]
+            if not extra:
+                return [cls(*row) for row in rows] if skip == width else [cls(*row[:width]) for row in rows]
+            return [cls(*row[:width], extra=dict(zip(extra, row[skip:]))) for row in rows]
+        # Columns in another order, e.g. a words table created by SQLAlchemy
+        positions = [names.index(column) for column in WORD_COLUMNS]
+        extra = [(i, name) for i, name in enumerate(names)
+                 if name not in WORD_COLUMNS and name not in INTERNAL_WORD_COLUMNS]
+        return [cls(*[row[i] for i in positions],
+                    extra={name: row[i] for i, name in extra} if extra else None)
+                for row in rows]
+
+    # JSON list columns, decoded on first read
+
+    @property
+    def translations(self) -> List[Any]:
+        if self._translations is None or isinstance(self._translations, str):
+            self._translations = decode_list(self._translations)
+        return self._translations
+
+    @translations.setter
+    def translations(self, value):
+        self._translations = value
+
+    @property
+    def definitions(self) -> List[Any]:
+        if self._definitions is None or isinstance(self._definitions, str):
+            self._definitions = decode_list(self._definitions)
+        return self._definitions
+
+    @definitions.setter
+    def definitions(self, value):
+        self._definitions = value
+
+    @property
+    def examples(self) -> List[Any]:
+        if self._examples is None or isinstance(self._examples, str):
+            self._examples = decode_list(self._examples)
+        return self._examples
+
+    @examples.setter
+    def examples(self, value):
+        self._examples = value
+
+    # Timestamps, rendered as ISO strings on first read
+
+    @property
+    def created_at(self) -> Optional[str]:
+        if isinstance(self._created_at, int):
+            self._created_at = from_epoch_ms(self._created_at)
+        return self._created_at
+
+    @created_at.setter
+    def created_at(self, value):
+        self._created_at = value
+
+    @property
+    def updated_at(self) -> Optional[str]:
+        if isinstance(self._updated_at, int):
+            self._updated_at = from_epoch_ms(self._updated_at)
+        return self._updated_at
+
+    @updated_at.setter
+    def updated_at(self, value):
+        self._updated_at = value
+
+    # Dict-style access
+
+    def __getitem__(self, key: str) -> Any:
+        if key in WORD_COLUMNS:
+            return getattr(self, key)
+        if self.extra is None or key not in self.extra:
+            raise KeyError(key)
+        value = self.extra[key]
+        return from_epoch_ms(value) if key in ROW_TIMESTAMPS else value
+
+    def __setitem__(self, key: str, value: Any):
+        if key in WORD_COLUMNS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in WORD_COLUMNS or (self.extra is not None and key in self.extra)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        return list(WORD_COLUMNS) + (list(self.extra) if self.extra else [])
+
+    def decode(self) -> 'WordRecord':
+        """Decode every lazy column now; returns the record"""
+        self.translations, self.definitions, self.examples
+        self.created_at, self.updated_at
+        return self
+
+    def copy(self) -> 'WordRecord':
+        """Shallow copy that can be decoded and extended independently"""
+        return WordRecord(self.id, self.word, self.pronunciation, self._translations,
+                          self._definitions, self._examples, self.notes, self._created_at,
+                          self._updated_at, dict(self.extra) if self.extra else None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The word as a plain dict with every column decoded"""
+        word = {
+            'id': self.id,
+            'word': self.word,
+            'pronunciation': self.pronunciation,
+            'translations': self.translations,
+            'definitions': self.definitions,
+            'examples': self.examples,
+            'notes': self.notes,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+        if self.extra:
+            for key, value in self.extra.items():
+                word[key] = from_epoch_ms(value) if key in ROW_TIMESTAMPS else value
+        return word
+
+    def __repr__(self) -> str:
+        return f"WordRecord(id={self.id!r}, word={self.word!r})"
+
+
+def to_dicts(records: List[WordRecord]) -> List[Dict[str, Any]]:
+    """Convert a list of records to dicts in place
+
+    Each record is dropped as soon as its dict replaces it, so a large
+    result never holds both forms of every row at once.
+    """
+    for i, record in enumerate(records):
+        records[i] = record.to_dict()
+    return records
+
+
+def fetch_records(conn: sqlite3.Connection, sql: str, params: Iterable[Any] = ()) -> List[WordRecord]:
+    """Run a query selecting words columns and return WordRecords
+
+    Uses a cursor without the pool's sqlite3.Row factory; records are built
+    straight from the plain tuples.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    names = [column[0] for column in cursor.description]
+    return WordRecord.from_rows(names, cursor.fetchall())
+
+
+def _chunked(ids: List[Any], size: int = 500) -> Iterator[Tuple[List[Any], str]]:
+    """Slices of ``ids`` with their ``?,?,...`` placeholders, each short enough
+    for one IN (...) list under SQLite's bound-parameter limit"""
+    for start in range(0, len(ids), size):
+        chunk = ids[start:start + size]
+        yield chunk, ','.join('?' * len(chunk))
+
+
+def _interleave(due: List[int], new: List[int]) -> List[Tuple[int, str]]:
+    """(word ID, kind) in plan order: the new words spread evenly between the due ones"""
+    queue = [(word_id, 'due') for word_id in due]
+    # From the back, so the slots still ahead keep their offsets
+    for i in range(len(new) - 1, -1, -1):
+        queue.insert((i + 1) * len(due) // (len(new) + 1), (new[i], 'new'))
+    return queue
+
+
+class ConnectionPool:
+    """A small pool of SQLite connections shared between threads
+
+    Every connection gets the configured PRAGMAs once on open and keeps its
+    own prepared statement cache, so reusing connections avoids both the
+    open cost and re-preparing the same SQL.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, pragmas: Optional[List[str]] = None,
+                 cached_statements: int = STATEMENT_CACHE_SIZE, uri: bool = False):
+        self.path = path
+        self.size = size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.cached_statements = cached_statements
+        self.uri = uri
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT / 1000.0,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements, uri=self.uri)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def _check_fork(self):
+        # Connections must never be shared with a forked child
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._open = 0
+                    self._pid = os.getpid()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, opening one if the pool is not full"""
+        self._check_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._open < self.size:
+                self._open += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._open -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+
+class RowCache:
+    """LRU cache of WordRecords keyed by word ID
+
+    Records are stored as read and decoded in place on their first hit, so
+    rows that are only read once stay compact.
+
+    Writes made through Storage invalidate their own entries (see
+    local_write). Commits from anywhere else (other processes, or the other
+    server) are detected through the ``words_version`` counter on a dedicated
+    watcher connection, which drops the whole cache. Commits that leave the
+    words table alone (study sessions, schedules) do not touch it.
+    """
+
+    def __init__(self, path: str, capacity: int = ROW_CACHE_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._path = path
+        self._watcher = None
+        self._words_version = None
+        # Bumped whenever entries are dropped, so a row read before a write
+        # is never stored after it (see put)
+        self.generation = 0
+
+    def _validate(self):
+        if self._watcher is None:
+            self._watcher = sqlite3.connect(self._path, check_same_thread=False)
+        try:
+            version = self._watcher.execute(SELECT_WORDS_VERSION).fetchone()[0]
+        except sqlite3.OperationalError:
+            # Not initialized at SCHEMA_VERSION 2 yet: any commit counts
+            version = ('data_version', self._watcher.execute("PRAGMA data_version").fetchone()[0])
+        if version != self._words_version:
+            self._entries.clear()
+            self._words_version = version
+            self.generation += 1
+
+    def get(self, word_id: int) -> Optional[WordRecord]:
+        if not self.capacity:
+            return None
+        with self._lock:
+            self._validate()
+            word = self._entries.get(word_id)
+            if word is not None:
+                self._entries.move_to_end(word_id)
+                word.decode()
+            return word
+
+    def get_many(self, word_ids: Iterable[int]) -> Dict[int, WordRecord]:
+        if not self.capacity:
+            return {}
+        with self._lock:
+            self._validate()
+            found = {}
+            for word_id in word_ids:
+                word = self._entries.get(word_id)
+                if word is not None:
+                    self._entries.move_to_end(word_id)
+                    found[word_id] = word.decode()
+            return found
+
+    def put(self, word: WordRecord, generation: int):
+        """Cache a word read while the cache was at ``generation``"""
+        if not self.capacity:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[word.id] = word
+            self._entries.move_to_end(word.id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, word_id: int):
+        with self._lock:
+            self._entries.pop(word_id, None)
+            self.generation += 1
+
+    def local_write(self, before: int, after: int, word_ids: Iterable[int]):
+        """Account for a committed write that moved words_version from ``before`` to ``after``
+
+        Only ``word_ids`` are dropped. If another commit got in first, the
+        cache no longer knows ``before`` and the next read drops everything.
+        """
+        with self._lock:
+            for word_id in word_ids:
+                self._entries.pop(word_id, None)
+            self.generation += 1
+            if self._words_version == before:
+                self._words_version = after
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def close(self):
+        with self._lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+
+
+def _replicated(method):
+    """Bring the store's replica up to date after a write method returns"""
+    @functools.wraps(method)
+    def write(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._replicate()
+        return result
+    return write
+
+
+class MemoryReplica:
+    """In-memory copy of the words and review_schedule tables of a database
+
+    ``load`` copies both tables (with their indexes) from one snapshot of
+    the file and notes the change_log position; ``sync`` then applies every
+    change logged since. Storage syncs after each of its own writes, so a
+    process always reads what it wrote; a background thread syncs every
+    ``interval`` seconds to pick up other processes' writes. A gap in the
+    log (pruned entries, a restored file) or a new timestamp format reloads
+    the copy.
+
+    The copy lives in SQLite's memdb VFS, so the pool's connections share
+    it and read concurrently.
+    """
+
+    _names = itertools.count()
+
+    def __init__(self, path: str, pool_size: int = POOL_SIZE, interval: float = MEMORY_REPLICA_SYNC):
+        self.path = path
+        uri = f"file:/words-replica-{os.getpid()}-{next(self._names)}?vfs=memdb"
+        self.pool = ConnectionPool(uri, size=pool_size, pragmas=[], uri=True)
+        # Applies changes to the copy, and keeps it alive while the pool's
+        # connections come and go
+        self._writer = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT / 1000.0, check_same_thread=False)
+        self._source = sqlite3.connect(path, timeout=BUSY_TIMEOUT / 1000.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "syncs": 0, "applied": 0}
+        self.load()
+        self._stop = threading.Event()
+        self._thread = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='replica-sync', daemon=True)
+            self._thread.start()
+
+    def load(self):
+        """Copy both tables afresh from the database file"""
+        with self._lock:
+            source, conn = self._source, self._writer
+            # One read transaction: the rows and log position of one snapshot
+            source.execute("BEGIN")
+            try:
+                schema = source.execute(SELECT_REPLICA_SCHEMA).fetchall()
+                row = source.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+                user_version = source.execute("PRAGMA user_version").fetchone()[0]
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for table in REPLICA_TABLES:
+                        conn.execute(f"DROP TABLE IF EXISTS {table}")
+                    # The file's own definitions, so columns keep their order
+                    for (sql,) in schema:
+                        conn.execute(sql)
+                    for table in REPLICA_TABLES:
+                        rows = source.execute(f"SELECT * FROM {table}")
+                        placeholders = ', '.join('?' * len(rows.description))
+                        conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+                    conn.execute(f"PRAGMA user_version = {user_version}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            finally:
+                source.rollback()
+            self.user_version = user_version
+            self.seq = row[0] if row else 0
+            self.stats["loads"] += 1
+
+    def sync(self, batch_size: int = 5000):
+        """Apply the changes logged since the last load or sync"""
+        with self._lock:
+            self.stats["syncs"] += 1
+            while True:
+                source = self._source
+                source.execute("BEGIN")
+                try:
+                    first, latest = source.execute(SELECT_CHANGE_LOG_BOUNDS).fetchone()
+                    latest = latest or 0
+                    floor = first - 1 if first is not None else latest
+                    version = source.execute("PRAGMA user_version").fetchone()[0]
+                    if self.seq < floor or self.seq > latest or version != self.user_version:
+                        stale = True
+                    else:
+                        stale = False
+                        entries = source.execute(SELECT_REPLICA_CHANGES, (self.seq, batch_size)).fetchall()
+                        last = {}
+                        for seq, table, row_id, op in entries:
+                            last.pop((table, row_id), None)
+                            last[(table, row_id)] = op
+                        rows = {table: self._rows(source, table, [row_id for (name, row_id), op in last.items()
+                                                                  if name == table and op == CHANGE_UPSERT])
+                                for table in REPLICA_TABLES}
+                finally:
+                    source.rollback()
+                if stale:
+                    break
+                self._apply(last, rows)
+                self.stats["applied"] += len(entries)
+                if len(entries) < batch_size:
+                    self.seq = latest
+                    return
+                self.seq = entries[-1][0]
+        # load takes the lock itself
+        self.load()
+
+    @staticmethod
+    def _rows(conn: sqlite3.Connection, table: str, row_ids: List[int]) -> Dict[int, Tuple[List[str], tuple]]:
+        rows = {}
+        cursor = conn.cursor()
+        for chunk, placeholders in _chunked(row_ids):
+            cursor.execute(f"SELECT * FROM {table} WHERE id IN ({placeholders})", chunk)
+            names = [column[0] for column in cursor.description]
+            rows.update((row[0], (names, row)) for row in cursor.fetchall())
+        return rows
+
+    def _apply(self, last: Dict[Tuple[str, int], str], rows: Dict[str, Dict[int, Tuple[List[str], tuple]]]):
+        conn = self._writer
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for (table, row_id), op in last.items():
+                row = rows[table].get(row_id)
+                if row is None:
+                    # Deleted, or deleted since it was logged
+                    conn.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+                    if table == 'words':
+                        conn.execute("DELETE FROM review_schedule WHERE word_id = ?", (row_id,))
+                    continue
+                names, values = row
+                conn.execute(f"INSERT OR REPLACE INTO {table} ({', '.join(names)}) "
+                             f"VALUES ({', '.join('?' * len(names))})", values)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+            except sqlite3.Error:
+                # Busy or mid-migration: try again next round
+                pass
+
+    def memory_bytes(self) -> int:
+        """Size of the in-memory copy"""
+        with self._lock:
+            page_size = self._writer.execute("PRAGMA page_size").fetchone()[0]
+            return page_size * self._writer.execute("PRAGMA page_count").fetchone()[0]
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.pool.close()
+        with self._lock:
+            self._source.close()
+            self._writer.close()
+
+
+class Storage:
+    """Data access for words, study sessions and review schedules
+
+    Words are returned as WordRecords (see above); they are copies, so
+    callers may add keys to them freely.
+    """
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = POOL_SIZE,
+                 pragmas: Optional[List[str]] = None, row_cache_size: int = ROW_CACHE_SIZE):
+        self.path = path
+        self.pool = ConnectionPool(path, size=pool_size, pragmas=pragmas)
+        self.cache = RowCache(path, capacity=row_cache_size)
+        # In-memory copy serving word and schedule reads (start_replica)
+        self.replica: Optional[MemoryReplica] = None
+
+    def start_replica(self, interval: float = MEMORY_REPLICA_SYNC):
+        """Serve word and schedule reads from an in-memory replica of the file (see MemoryReplica)"""
+        if self.replica is None:
+            self.replica = MemoryReplica(self.path, pool_size=self.pool.size, interval=interval)
+            # Reading the copy is cheaper than checking cached rows against the file
+            self.cache = RowCache(self.path, capacity=0)
+
+    def _reader(self):
+        """Connection for reading words and schedules: the replica's while one runs"""
+        pool = self.pool if self.replica is None else self.replica.pool
+        return pool.connection()
+
+    def _replicate(self):
+        # After a committed write: bring the replica up to date before returning
+        if self.replica is not None:
+            self.replica.sync()
+
+    # Schema
+
+    def init_db(self):
+        """Create tables and indexes that do not exist yet
+
+        A database already at SCHEMA_VERSION is left alone after reading
+        its user_version, so opening a current database runs no DDL.
+        """
+        with self.pool.connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version // _SCHEMA_VERSION_UNIT >= SCHEMA_VERSION:
+                return
+            is_new = not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'words'"
+            ).fetchone()
+            has_forecast = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'review_forecast'"
+            ).fetchone()
+            has_change_log = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'"
+            ).fetchone()
+            has_progress = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'progress_counts'"
+            ).fetchone()
+            for statement in SCHEMA:
+                conn.execute(statement)
+            for table, column, declaration in ADDED_COLUMNS:
+                existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+            conn.execute(LOOKUP_KEY_INDEX)
+            for statement in PHONETIC_KEY_INDEXES:
+                conn.execute(statement)
+            has_index = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_review_schedule_word'"
+            ).fetchone()
+            if not has_index:
+                conn.execute(DEDUPE_SCHEDULE)
+                conn.execute(SCHEDULE_INDEX)
+            conn.execute(FORECAST_INDEX)
+            for statement in (FORECAST_TRIGGERS + WORDS_VERSION_SCHEMA + CHANGE_LOG_TRIGGERS + PLAN_TRIGGERS
+                              + PROGRESS_TRIGGERS):
+                conn.execute(statement)
+            conn.execute(CHANGE_LOG_INDEX)
+            if not is_new and not has_change_log:
+                # Rows written before the log existed: clients start with a full pull
+                conn.execute(START_CHANGE_LOG)
+            if not has_forecast:
+                # First run on an existing database: count what is already scheduled
+                for statement in REBUILD_FORECAST:
+                    conn.execute(statement)
+            if not has_progress:
+                # Also counts the empty tables of a new database: every row starts at zero
+                for statement in REBUILD_PROGRESS:
+                    conn.execute(statement)
+            conn.commit()
+            if not is_new:
+                # Before the version is written, so an interrupted backfill resumes
+                self.backfill_lookup_keys(recompute=version // _SCHEMA_VERSION_UNIT < LOOKUP_KEYS_VERSION)
+                self.backfill_phonetic_keys()
+            # Nothing to migrate in a new database: start out with
+            # epoch-millisecond timestamps
+            self._write_user_version(conn, schema=SCHEMA_VERSION,
+                                     timestamps=TIMESTAMPS_EPOCH_MS if is_new else None)
+
+    def schema_version(self) -> int:
+        """SCHEMA_VERSION the database was last initialized at (0 if never)"""
+        with self.pool.connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0] // _SCHEMA_VERSION_UNIT
+
+    def close(self):
+        """Close pooled connections"""
+        if self.replica is not None:
+            self.replica.close()
+            self.replica = None
+        self.pool.close()
+        self.cache.close()
+
+    @staticmethod
+    def _timestamp_format(conn: sqlite3.Connection) -> int:
+        """TIMESTAMPS_* constant for the database (read from PRAGMA user_version)"""
+        return conn.execute("PRAGMA user_version").fetchone()[0] % _SCHEMA_VERSION_UNIT
+
+    @staticmethod
+    def _write_user_version(conn: sqlite3.Connection, schema: Optional[int] = None,
+                            timestamps: Optional[int] = None):
+        """Set the schema version and/or timestamp format in PRAGMA user_version
+
+        Read and written in one write transaction, so a concurrent update of
+        the other half is never lost.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if schema is None:
+                schema = current // _SCHEMA_VERSION_UNIT
+            if timestamps is None:
+                timestamps = current % _SCHEMA_VERSION_UNIT
+            conn.execute(f"PRAGMA user_version = {schema * _SCHEMA_VERSION_UNIT + timestamps}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _encoder(self, conn: sqlite3.Connection):
+        """Function converting datetimes and ISO strings to the stored timestamp format
+
+        Checked on every write, so servers switch to epoch milliseconds as soon
+        as a migration starts, without a restart.
+        """
+        return to_epoch_ms if self._timestamp_format(conn) >= TIMESTAMPS_MIGRATING else _to_text
+
+    def _require_migrated(self, conn: sqlite3.Connection):
+        # Bulk jobs compare and order timestamps across rows, which is only
+        # meaningful once every row is in the same format
+        if self._timestamp_format(conn) == TIMESTAMPS_MIGRATING:
+            raise RuntimeError("Timestamp migration in progress; finish it with "
+                               "'manage.py migrate-timestamps' first")
+
+    # Words
+
+    def _remember(self, records: List[WordRecord], generation: int) -> Optional[WordRecord]:
+        if not records:
+            return None
+        self.cache.put(records[0], generation)
+        return records[0].copy()
+
+    def get_word(self, word_id: int) -> Optional[WordRecord]:
+        """Get a word by ID"""
+        cached = self.cache.get(word_id)
+        if cached is not None:
+            return cached.copy()
+        generation = self.cache.generation
+        with self._reader() as conn:
+            records = fetch_records(conn, SELECT_WORD_BY_ID, (word_id,))
+        return self._remember(records, generation)
+
+    def get_word_by_text(self, word_text: str) -> Optional[WordRecord]:
+        """Get a word by its text, or else by its lookup key
+
+        "Running" finds a stored "running", then "Running" in any case, then
+        another form such as "run" (the oldest if several share the key).
+        """
+        generation = self.cache.generation
+        with self._reader() as conn:
+            records = fetch_records(conn, SELECT_WORD_BY_TEXT, (word_text,))
+            if not records:
+                records = fetch_records(conn, SELECT_WORDS_BY_KEY, (lookup_key(word_text),))
+                folded = ' '.join(word_text.casefold().split())
+                records.sort(key=lambda record: record.word.casefold() != folded)
+        return self._remember(records, generation)
+
+    def get_words(self, word_ids: List[int]) -> List[WordRecord]:
+        """Get many words by ID in one query, in the order requested
+
+        IDs that do not exist are skipped.
+        """
+        found = self.cache.get_many(word_ids)
+        generation = self.cache.generation
+        missing = [word_id for word_id in dict.fromkeys(word_ids) if word_id not in found]
+        if missing:
+            with self._reader() as conn:
+                for chunk, placeholders in _chunked(missing):
+                    for word in fetch_records(conn, f"SELECT * FROM words WHERE id IN ({placeholders})", chunk):
+                        self.cache.put(word, generation)
+                        found[word.id] = word
+        return [found[word_id].copy() for word_id in word_ids if word_id in found]
+
+    def get_all_words(self) -> List[WordRecord]:
+        """Get every word ordered by text"""
+        with self._reader() as conn:
+            return fetch_records(conn, SELECT_ALL_WORDS)
+
+    def find_word_id(self, word_text: str) -> Optional[int]:
+        """Get the ID for a word text, or None"""
+        with self._reader() as conn:
+            row = conn.execute(SELECT_WORD_ID_BY_TEXT, (word_text,)).fetchone()
+        return row[0] if row else None
+
+    def find_sound_alike(self, query: str, limit: int = 10) -> List[WordRecord]:
+        """Words that sound like ``query``, closest first, each with its ``score``
+
+        ``query`` is a spelling ("nolij") or an IPA transcription
+        ("/ˈnɒlɪdʒ/"). Words sharing one of its phonetic codes are found
+        through the phonetic key indexes and ranked by phonetic.similarity;
+        the word typed itself is left out.
+        """
+        keys = query_keys(query)
+        if not keys:
+            return []
+        folded = ' '.join(query.casefold().split())
+        with self._reader() as conn:
+            records = fetch_records(conn, SELECT_SOUND_ALIKE, (keys[0], keys[-1], SOUND_ALIKE_CANDIDATES))
+        matches = []
+        for record in records:
+            if record.word.casefold() == folded:
+                continue
+            record['score'] = similarity(query, record.word, record.pronunciation)
+            matches.append(record)
+        matches.sort(key=lambda record: (-record['score'], record.word))
+        return matches[:limit]
+
+    @staticmethod
+    def _word_params(data: Dict[str, Any], now: str) -> Tuple:
+        return (
+            data.get('word'),
+            data.get('pronunciation'),
+            json.dumps(data.get('translations') or []),
+            json.dumps(data.get('definitions') or []),
+            json.dumps(data.get('examples') or []),
+            data.get('notes'),
+            now,
+            now,
+            lookup_key(data.get('word')),
+        ) + phonetic_keys(data.get('word'), data.get('pronunciation'))
+
+    @contextmanager
+    def _words_transaction(self, conn: sqlite3.Connection):
+        """Write transaction for changes to the words table
+
+        Yields a list the caller fills with the IDs of words it changed.
+        After the commit only those are dropped from the row cache: the
+        words_version counter is read on both sides of the change inside the
+        transaction, so the cache can tell this commit from foreign ones.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self._read_words_version(conn)
+            changed = []
+            yield changed
+            after = self._read_words_version(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self.cache.local_write(before, after, changed)
+
+    @staticmethod
+    def _read_words_version(conn: sqlite3.Connection) -> Optional[int]:
+        try:
+            return conn.execute(SELECT_WORDS_VERSION).fetchone()[0]
+        except sqlite3.OperationalError:
+            return None
+
+    @staticmethod
+    def _upsert_word(conn: sqlite3.Connection, params: Tuple, on_conflict: str) -> Tuple[int, bool]:
+        # A word with the same text or lookup key ("Running" for a stored
+        # "run") is a duplicate. Checked and resolved in the caller's write
+        # transaction, so concurrent saves of one word never fail.
+        row = conn.execute(SELECT_DUPLICATE_WORD_ID, (params[0], params[8])).fetchone()
+        if row is None:
+            rows = conn.execute(INSERT_NEW_WORD, params).fetchall()
+            if rows:
+                return rows[0][0], True
+            # Same text, stored under an outdated key
+            row = conn.execute(SELECT_WORD_ID_BY_TEXT, (params[0],)).fetchone()
+        if on_conflict == ON_CONFLICT_ERROR:
+            raise DuplicateWordError(params[0], row[0])
+        word_id = conn.execute(UPDATE_EXISTING_WORD[on_conflict], params[:8] + (row[0],)).fetchall()[0][0]
+        Storage._refresh_phonetic_keys(conn, word_id)
+        return word_id, False
+
+    @staticmethod
+    def _refresh_phonetic_keys(conn: sqlite3.Connection, word_id: int):
+        # After an update of the text or pronunciation, in its transaction
+        row = conn.execute(SELECT_PHONETIC_SOURCE, (word_id,)).fetchone()
+        keys = phonetic_keys(row['word'], row['pronunciation'])
+        if keys != (row['phonetic_key'], row['phonetic_alt']):
+            conn.execute(UPDATE_PHONETIC_KEYS, keys + (word_id,))
+
+    @staticmethod
+    def _check_on_conflict(on_conflict: str):
+        if on_conflict not in ON_CONFLICT_MODES:
+            raise ValueError(f"on_conflict must be one of {', '.join(ON_CONFLICT_MODES)}")
+
+    @_replicated
+    def upsert_word(self, data: Dict[str, Any], on_conflict: str = ON_CONFLICT_ERROR) -> Tuple[int, bool]:
+        """Save a word, resolving an already stored word by ``on_conflict``
+
+        A word is already stored if its text or its lookup key matches
+        ("Running" for a stored "run"); merges and replaces keep the stored
+        text.
+
+        Modes: 'error' raises DuplicateWordError; 'merge' appends new
+        translations, definitions and examples to the stored ones and takes
+        pronunciation and notes when they are not empty; 'replace' overwrites
+        every field. Merged and replaced words keep their ID and history.
+
+        Returns:
+            (word ID, True if the word was created)
+        """
+        self._check_on_conflict(on_conflict)
+        with self.pool.connection() as conn:
+            params = self._word_params(data, self._encoder(conn)(datetime.utcnow()))
+            with self._words_transaction(conn) as changed:
+                word_id, created = self._upsert_word(conn, params, on_conflict)
+                if not created:
+                    changed.append(word_id)
+        return word_id, created
+
+    def save_word(self, data: Dict[str, Any], on_conflict: str = ON_CONFLICT_ERROR) -> int:
+        """Save a word and return its ID (see upsert_word)
+
+        Raises:
+            DuplicateWordError: if the word text is already stored and
+                on_conflict is 'error'
+        """
+        return self.upsert_word(data, on_conflict)[0]
+
+    @_replicated
+    def save_words(self, items: List[Dict[str, Any]], on_conflict: str = ON_CONFLICT_ERROR) -> Dict[str, Any]:
+        """Save many words in a single transaction
+
+        With on_conflict 'error', words whose text is already stored (or
+        repeated in the batch) are skipped; otherwise they are merged or
+        replaced as by upsert_word, in batch order.
+
+        Returns:
+            Dict with ``saved`` (new word text -> ID), ``updated`` (merged or
+            replaced word text -> ID) and ``skipped`` (word texts)
+        """
+        self._check_on_conflict(on_conflict)
+        saved = {}
+        updated = {}
+        skipped = []
+        with self.pool.connection() as conn:
+            now = self._encoder(conn)(datetime.utcnow())
+            with self._words_transaction(conn) as changed:
+                for data in items:
+                    params = self._word_params(data, now)
+                    try:
+                        word_id, created = self._upsert_word(conn, params, on_conflict)
+                    except DuplicateWordError:
+                        skipped.append(params[0])
+                        continue
+                    if created:
+                        saved[params[0]] = word_id
+                    elif params[0] not in saved:
+                        updated[params[0]] = word_id
+                        changed.append(word_id)
+        return {"saved": saved, "updated": updated, "skipped": skipped}
+
+    @_replicated
+    def patch_word(self, word_id: int, changes: Dict[str, Any],
+                   expected_updated_at: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Update several fields of a word in one statement
+
+        Args:
+            word_id: Word to update
+            changes: Field name -> new value, for any of UPDATABLE_FIELDS
+            expected_updated_at: The ``updated_at`` the changes were based on;
+                the update is refused if the word has changed since
+
+        Returns:
+            ``id``, the new ``updated_at`` and the changed fields, or None
+            if the word does not exist
+
+        Raises:
+            WordConflictError: if ``expected_updated_at`` is out of date
+            DuplicateWordError: if ``word`` is changed to a text already stored
+        """
+        if not changes:
+            raise ValueError("No fields to update")
+        invalid = [field for field in changes if field not in UPDATABLE_FIELDS]
+        if invalid:
+            raise ValueError(f"Invalid field: {', '.join(invalid)}")
+        fields = list(changes)
+        values = [json.dumps(changes[field] or []) if field in JSON_FIELDS else changes[field] for field in fields]
+        assignments = [f'{field} = ?' for field in fields]
+        if 'word' in changes:
+            assignments.append('lookup_key = ?')
+            values.append(lookup_key(changes['word']))
+        sql = f"UPDATE words SET {', '.join(assignments)}, updated_at = ? WHERE id = ?"
+        with self.pool.connection() as conn:
+            params = values + [self._encoder(conn)(datetime.utcnow()), word_id]
+            if expected_updated_at is not None:
+                # Either format, so a patch based on a read from before a
+                # timestamp migration still matches
+                sql += " AND updated_at IN (?, ?)"
+                params += [to_epoch_ms(expected_updated_at), _to_text(expected_updated_at)]
+            sql += f" RETURNING {', '.join(fields)}, updated_at"
+            try:
+                with self._words_transaction(conn) as changed:
+                    row = conn.execute(sql, params).fetchone()
+                    if row is None:
+                        current = conn.execute("SELECT updated_at FROM words WHERE id = ?", (word_id,)).fetchone()
+                        if current is None:
+                            return None
+                        raise WordConflictError(word_id, from_epoch_ms(current[0]))
+                    if 'word' in changes or 'pronunciation' in changes:
+                        self._refresh_phonetic_keys(conn, word_id)
+                    changed.append(word_id)
+            except sqlite3.IntegrityError:
+                existing = self.find_word_id(changes.get('word'))
+                if existing is None:
+                    raise
+                raise DuplicateWordError(changes['word'], existing)
+        result = {"id": word_id, "updated_at": from_epoch_ms(row['updated_at'])}
+        result.update((field, decode_list(row[field]) if field in JSON_FIELDS else row[field]) for field in fields)
+        return result
+
+    def update_word_field(self, word_id: int, field: str, value: Any) -> bool:
+        """Update one field of a word; returns False if the word is missing"""
+        return self.patch_word(word_id, {field: value}) is not None
+
+    @_replicated
+    def delete_word(self, word_id: int) -> bool:
+        """Delete a word by ID; returns False if it did not exist"""
+        with self.pool.connection() as conn:
+            with self._words_transaction(conn) as changed:
+                cursor = conn.execute(DELETE_WORD, (word_id,))
+                changed.append(word_id)
+        return cursor.rowcount > 0
+
+    # Related words
+
+    def get_related_words(self, word_id: int, count: int) -> List[WordRecord]:
+        """A word's stored neighbors, most similar first, each with its ``score``"""
+        with self.pool.connection() as conn:
+            return fetch_records(conn, SELECT_RELATED_WORDS, (word_id, count))
+
+    def has_neighbors(self) -> bool:
+        """Whether related-word neighbors were ever built for this database"""
+        with self.pool.connection() as conn:
+            return bool(conn.execute(HAS_NEIGHBORS).fetchone()[0])
+
+    def get_neighbor_ids(self, word_id: int, reverse: bool = False) -> List[int]:
+        """IDs of a word's stored neighbors, or with ``reverse`` of the words it is a neighbor of"""
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute(
+                SELECT_REVERSE_NEIGHBOR_IDS if reverse else SELECT_NEIGHBOR_IDS, (word_id,))]
+
+    def get_neighbor_floors(self, word_ids: List[int]) -> Dict[int, Tuple[float, int]]:
+        """Word ID -> (lowest neighbor score, neighbor count) for words with neighbors"""
+        floors = {}
+        with self.pool.connection() as conn:
+            for chunk, placeholders in _chunked(word_ids):
+                for word_id, lowest, count in conn.execute(SELECT_NEIGHBOR_FLOORS.format(placeholders), chunk):
+                    floors[word_id] = (lowest, count)
+        return floors
+
+    def update_neighbors(self, word_id: int, neighbors: List[Tuple[int, float]],
+                         reverse: List[Tuple[int, float]], dropped: List[int], keep: int):
+        """Replace one word's neighbors and its place in other words' lists, in one transaction
+
+        Args:
+            word_id: The word whose neighbors changed
+            neighbors: (neighbor ID, score) pairs for the word
+            reverse: (word ID, score) pairs: word_id becomes (or stays) a
+                neighbor of these words with the new score
+            dropped: Words word_id is no longer a neighbor of
+            keep: Neighbors kept per word; lists that grew are trimmed to it
+        """
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(DELETE_NEIGHBORS, (word_id,))
+                conn.executemany(INSERT_NEIGHBOR, [(word_id, neighbor, score) for neighbor, score in neighbors])
+                conn.executemany(INSERT_NEIGHBOR, [(other, word_id, score) for other, score in reverse])
+                conn.executemany(DELETE_NEIGHBOR, [(other, word_id) for other in dropped])
+                if reverse:
+                    conn.execute(TRIM_NEIGHBORS, (json.dumps([other for other, _ in reverse]), keep))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def replace_neighbors(self, rows: Iterable[Tuple[int, int, float]]):
+        """Replace every stored neighbor with (word ID, neighbor ID, score) rows in one transaction"""
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM word_neighbors")
+                conn.executemany(INSERT_NEIGHBOR, rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def words_version(self) -> Optional[int]:
+        """Counter of commits that changed the words table (None before SCHEMA_VERSION 2)"""
+        with self.pool.connection() as conn:
+            return self._read_words_version(conn)
+
+    # Study sessions and review schedule
+
+    def get_schedule(self, word_id: int) -> Optional[Dict[str, Any]]:
+        """Get the review schedule of a word, or None if it was never studied"""
+        with self._reader() as conn:
+            row = conn.execute(SELECT_SCHEDULE, (word_id,)).fetchone()
+        return decode_timestamps(dict(row)) if row else None
+
+    def get_schedules(self, word_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Review schedules of many words by word ID; unstudied words are absent"""
+        schedules = {}
+        word_ids = list(dict.fromkeys(word_ids))
+        with self._reader() as conn:
+            for chunk, placeholders in _chunked(word_ids):
+                for row in conn.execute(SELECT_SCHEDULES.format(placeholders), chunk):
+                    schedule = decode_timestamps(dict(row))
+                    schedules[schedule.pop('word_id')] = schedule
+        return schedules
+
+    def record_study(self, word_id: int, study_time: int, recall: int, studied_at: str,
+                     next_review: str, ease_factor: float, interval: int,
+                     stability: Optional[float] = None, difficulty: Optional[float] = None):
+        """Store a study session and the word's new schedule in one transaction"""
+        self.record_studies([(word_id, study_time, recall, studied_at, next_review, ease_factor, interval,
+                              stability, difficulty)])
+
+    @_replicated
+    def record_studies(self, reviews: List[Tuple]):
+        """Store many study sessions and schedules in one transaction
+
+        Args:
+            reviews: Tuples of (word_id, study_time, recall, studied_at,
+                next_review, ease_factor, interval[, stability, difficulty])
+        """
+        with self.pool.connection() as conn:
+            encode = self._encoder(conn)
+            sessions = []
+            schedules = []
+            for review in reviews:
+                review = tuple(review) + (None,) * (9 - len(review))
+                studied_at, next_review = encode(review[3]), encode(review[4])
+                sessions.append(review[:3] + (studied_at,))
+                # The review being recorded is the word's last review
+                schedules.append((review[0], next_review) + review[5:9] + (studied_at,))
+            try:
+                conn.executemany(INSERT_SESSION, sessions)
+                conn.executemany(UPSERT_SCHEDULE, schedules)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def unrecorded_studies(self, reviews: List[Tuple]) -> List[Tuple]:
+        """The reviews (as for record_studies) with no matching study session stored yet"""
+        with self.pool.connection() as conn:
+            return [review for review in reviews
+                    if conn.execute(SELECT_SESSION_EXISTS, (review[0], to_epoch_ms(review[3]), _to_text(review[3]),
+                                                            review[1], review[2])).fetchone() is None]
+
+    def get_due_words(self, now: str, count: int, by_retrievability: bool = False) -> List[WordRecord]:
+        """Words due for review, padded with never-studied words
+
+        Due words carry ``next_review`` and ``interval``; ordered by due date,
+        or with ``by_retrievability`` by FSRS forgetting (and then also carry
+        ``stability`` and ``last_review``).
+        """
+        with self._reader() as conn:
+            encode, query, new_words = self._due_queries(conn, by_retrievability)
+            words = fetch_records(conn, query, (encode(now), count))
+            if len(words) < count:
+                words.extend(fetch_records(conn, new_words, (count - len(words),)))
+        return words
+
+    def _due_queries(self, conn: sqlite3.Connection, by_retrievability: bool):
+        """(timestamp encoder, due words query, new words query) for the database's timestamp format"""
+        state = self._timestamp_format(conn)
+        encode = to_epoch_ms if state >= TIMESTAMPS_MIGRATING else _to_text
+        if state == TIMESTAMPS_MIGRATING:
+            query = SELECT_DUE_WORDS_BY_RETRIEVABILITY_MIXED if by_retrievability else SELECT_DUE_WORDS_MIXED
+            return encode, query, SELECT_NEW_WORDS_MIXED
+        query = SELECT_DUE_WORDS_BY_RETRIEVABILITY if by_retrievability else SELECT_DUE_WORDS
+        return encode, query, SELECT_NEW_WORDS
+
+    def plan_reviews(self, day: str, by_retrievability: bool = False, due_limit: int = PLAN_DUE_LIMIT,
+                     new_limit: int = PLAN_NEW_LIMIT, force: bool = True) -> Optional[Dict[str, Any]]:
+        """Build the review plan of ``day``, replacing the current one
+
+        Queues up to ``due_limit`` words due by the end of the day (in
+        get_due_words order) and up to ``new_limit`` never-studied words
+        (oldest first), the new words spread evenly between the due ones.
+
+        Args:
+            day: The day planned, YYYY-MM-DD (UTC)
+            by_retrievability: Order due words by FSRS forgetting
+            due_limit: Most due words in the plan
+            new_limit: Most new words in the plan
+            force: Plan again even if the current plan is for the same day
+                and limits
+
+        Returns:
+            Dict with ``plan_day`` and the numbers of ``due`` and ``new``
+            words queued, or None if the plan was current (``force`` False)
+        """
+        key = (day, due_limit, new_limit, int(by_retrievability))
+        cutoff = format_timestamp(datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1))
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(SELECT_PLAN_STATE).fetchone()
+                if not force and row is not None and tuple(row) == key:
+                    # Planned by another request or process meanwhile
+                    conn.rollback()
+                    return None
+                encode, query, new_words = self._due_queries(conn, by_retrievability)
+                due = [word.id for word in fetch_records(conn, query, (encode(cutoff), due_limit))] \
+                    if due_limit > 0 else []
+                new = [word.id for word in fetch_records(conn, new_words, (new_limit,))] if new_limit > 0 else []
+                for statement in CLEAR_PLAN:
+                    conn.execute(statement)
+                conn.executemany(INSERT_PLAN_ITEM, _interleave(due, new))
+                conn.execute(INSERT_PLAN_STATE, key + (len(new),))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return {"plan_day": day, "due": len(due), "new": len(new)}
+
+    def get_planned_words(self, day: str, count: int, cursor: int = 0, by_retrievability: bool = False,
+                          due_limit: int = PLAN_DUE_LIMIT,
+                          new_limit: int = PLAN_NEW_LIMIT) -> Tuple[List[WordRecord], int]:
+        """The next words of the day's review plan not studied yet
+
+        Plans the day first if the current plan is for another day or other
+        limits; otherwise reads ``count`` rows of review_plan, however many
+        words and schedules there are.
+
+        Args:
+            day: Today, YYYY-MM-DD (UTC)
+            count: Most words returned
+            cursor: The cursor returned with the previous page, to continue
+                after it (0: from the start)
+            by_retrievability, due_limit, new_limit: As for plan_reviews
+
+        Returns:
+            (words, cursor for the next page). Due words carry
+            ``next_review`` and ``interval`` (and with ``by_retrievability``
+            ``stability`` and ``last_review``), as from get_due_words.
+        """
+        key = (day, due_limit, new_limit, int(by_retrievability))
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_PLAN_STATE).fetchone()
+            current = row is not None and tuple(row) == key
+            if current:
+                words = fetch_records(conn, SELECT_PLANNED_WORDS, (cursor, count))
+        if not current:
+            self.plan_reviews(day, by_retrievability, due_limit, new_limit, force=False)
+            with self.pool.connection() as conn:
+                words = fetch_records(conn, SELECT_PLANNED_WORDS, (cursor, count))
+        fields = ('next_review', 'interval', 'stability', 'last_review') if by_retrievability \
+            else ('next_review', 'interval')
+        for word in words:
+            cursor = word.extra['position']
+            # New words have no schedule
+            word.extra = {field: word.extra[field] for field in fields if word.extra[field] is not None} or None
+        return words, cursor
+
+    def load_review_history(self, with_times: bool = False):
+        """Load every study session for bulk rescheduling or model fitting
+
+        Days compacted into study_rollups are replayed before the word's raw
+        sessions, as their recall histogram at the day's first study time.
+        This is exact for the usual case of at most one review per word per
+        day.
+
+        Returns:
+            (word_ids, recalls, last_studied): NumPy int arrays ordered by
+            word and study time, and a dict of word ID -> latest studied_at.
+            With ``with_times`` a float array of study times in days (Julian
+            day numbers) is returned after recalls.
+        """
+        import numpy as np
+
+        with self.pool.connection() as conn:
+            self._require_migrated(conn)
+            cursor = conn.cursor()
+            # Plain tuples are much cheaper than sqlite3.Row for a million rows
+            cursor.row_factory = None
+            if with_times:
+                history = np.fromiter(cursor.execute(SELECT_HISTORY_WITH_TIMES), dtype=[
+                    ('word_id', np.int64), ('recall', np.int64), ('day', np.float64)])
+            else:
+                history = np.fromiter(cursor.execute(SELECT_HISTORY),
+                                      dtype=[('word_id', np.int64), ('recall', np.int64)])
+            last_studied = dict(conn.execute(SELECT_LAST_STUDIED).fetchall())
+            if conn.execute(HAS_ROLLUPS).fetchone()[0]:
+                rollups = np.array(cursor.execute(SELECT_ROLLUP_HISTORY).fetchall(), dtype=np.float64)
+                for word_id, studied_at in conn.execute(SELECT_ROLLUP_LAST_STUDIED):
+                    # Raw sessions are always newer than the word's rollups
+                    last_studied.setdefault(word_id, studied_at)
+                if len(rollups):
+                    history = self._merge_rollups(history, rollups, with_times)
+        last_studied = {word_id: from_epoch_ms(studied_at) for word_id, studied_at in last_studied.items()}
+        if with_times:
+            return history['word_id'], history['recall'], history['day'], last_studied
+        return history['word_id'], history['recall'], last_studied
+
+    @staticmethod
+    def _merge_rollups(history, rollups, with_times: bool):
+        """Expand rollup rows into sessions and put them before each word's raw sessions"""
+        import numpy as np
+
+        counts = rollups[:, 1:6].astype(np.int64)
+        per_row = counts.sum(axis=1)
+        expanded = np.zeros(int(per_row.sum()), dtype=history.dtype)
+        expanded['word_id'] = np.repeat(rollups[:, 0].astype(np.int64), per_row)
+        expanded['recall'] = np.repeat(np.tile(np.arange(1, 6), len(rollups)), counts.ravel())
+        if with_times:
+            expanded['day'] = np.repeat(rollups[:, 6], per_row)
+        merged = np.concatenate([expanded, history])
+        # A stable sort by word keeps rollups (older) ahead of raw sessions
+        return merged[np.argsort(merged['word_id'], kind='stable')]
+
+    def compact_sessions(self, cutoff: str, batch_size: int = 50000,
+                         dry_run: bool = False) -> Dict[str, Any]:
+        """Roll study sessions older than ``cutoff`` up into daily summaries
+
+        Sessions are folded into study_rollups (one row per word and day
+        with the session count, total study time and a recall histogram) and
+        then deleted. Each batch of ``batch_size`` session IDs is its own
+        short transaction, so other writers are never blocked for long.
+        Sessions of words that no longer exist are dropped.
+
+        Returns:
+            Sessions compacted (or, with ``dry_run``, that would be) and batches run
+        """
+        with self.pool.connection() as conn:
+            self._require_migrated(conn)
+            cutoff_value = self._encoder(conn)(cutoff)
+            low, high = conn.execute(SELECT_SESSION_ID_RANGE).fetchone()
+            compacted = batches = 0
+            if low is None:
+                return {"cutoff": cutoff, "sessions": 0, "batches": 0, "dry_run": dry_run}
+            start = low - 1
+            while start < high:
+                end = start + batch_size
+                if dry_run:
+                    compacted += conn.execute(COUNT_COMPACTABLE, (start, end, cutoff_value)).fetchone()[0]
+                else:
+                    try:
+                        conn.execute(ROLLUP_SESSIONS, (start, end, cutoff_value))
+                        compacted += conn.execute(DELETE_COMPACTED, (start, end, cutoff_value)).rowcount
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                batches += 1
+                start = end
+        return {"cutoff": cutoff, "sessions": compacted, "batches": batches, "dry_run": dry_run}
+
+    # Change feed
+
+    def get_changes(self, cursor: int = 0, limit: int = 500) -> Dict[str, Any]:
+        """Changes to words, schedules and study sessions after ``cursor``
+
+        Reads up to ``limit`` change_log entries and returns the current row
+        of each inserted or updated one (several changes to a row in the
+        batch come back once, at its last seq) and a tombstone for each
+        deleted one, oldest first. A client stores the returned cursor and
+        passes it to the next call; the log and rows come from one
+        snapshot, so nothing is missed or repeated between calls.
+
+        Returns:
+            ``changes`` (seq, table, op, id, word_id and, for upserts, row),
+            ``cursor``, ``has_more``, and ``reset``: true when the cursor is
+            older than the log (entries pruned, or the rows predate it) or
+            newer (the database was restored). The client then re-pulls
+            everything and continues from the returned cursor.
+        """
+        with self.pool.connection() as conn:
+            # One read transaction, so the rows match the log entries read
+            conn.execute("BEGIN")
+            try:
+                first, latest = conn.execute(SELECT_CHANGE_LOG_BOUNDS).fetchone()
+                latest = latest or 0
+                floor = first - 1 if first is not None else latest
+                if cursor < floor or cursor > latest:
+                    return {"changes": [], "cursor": latest, "has_more": False, "reset": True}
+                entries = conn.execute(SELECT_CHANGES, (cursor, limit + 1)).fetchall()
+                has_more = len(entries) > limit
+                entries = entries[:limit]
+                # Last change of each row, in the order of those changes
+                last: Dict[Tuple[str, int], Tuple[int, Optional[int], str]] = {}
+                for seq, table, row_id, word_id, op in entries:
+                    last.pop((table, row_id), None)
+                    last[(table, row_id)] = (seq, word_id, op)
+                rows = {table: self._changed_rows(conn, table, [row_id for (name, row_id), (_, _, op) in last.items()
+                                                                if name == table and op == CHANGE_UPSERT])
+                        for table, _, _ in CHANGE_LOG_TABLES}
+            finally:
+                conn.rollback()
+        changes = []
+        for (table, row_id), (seq, word_id, op) in last.items():
+            change = {"seq": seq, "table": table, "op": op, "id": row_id, "word_id": word_id}
+            if op == CHANGE_UPSERT:
+                row = rows[table].get(row_id)
+                if row is None:
+                    # Deleted since with its word, whose tombstone follows
+                    continue
+                change["row"] = row
+            changes.append(change)
+        return {"changes": changes, "cursor": entries[-1][0] if entries else cursor,
+                "has_more": has_more, "reset": False}
+
+    @staticmethod
+    def _changed_rows(conn: sqlite3.Connection, table: str, row_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        rows = {}
+        for chunk, placeholders in _chunked(row_ids):
+            sql = f"SELECT * FROM {table} WHERE id IN ({placeholders})"
+            if table == 'words':
+                rows.update((record.id, record.to_dict()) for record in fetch_records(conn, sql, chunk))
+            else:
+                fields = dict(TIMESTAMP_COLUMNS)[table]
+                rows.update((row['id'], decode_timestamps(dict(row), fields)) for row in conn.execute(sql, chunk))
+        return rows
+
+    def prune_changes(self, older_than_days: int = CHANGE_LOG_RETENTION_DAYS, batch_size: int = 5000) -> int:
+        """Delete change_log entries older than ``older_than_days``, oldest first
+
+        One short transaction per ``batch_size`` entries. Clients whose
+        cursor falls in the pruned range get ``reset`` from get_changes.
+
+        Returns:
+            Entries deleted
+        """
+        cutoff = to_epoch_ms(datetime.utcnow() - timedelta(days=older_than_days))
+        deleted = 0
+        with self.pool.connection() as conn:
+            while True:
+                try:
+                    count = conn.execute(PRUNE_CHANGES, (batch_size, cutoff)).rowcount
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                deleted += count
+                # Entries are in time order: a batch not wholly old reached the cutoff
+                if count < batch_size:
+                    return deleted
+
+    # Maintenance
+
+    def sweep_orphans(self, batch_size: int = 5000) -> Dict[str, int]:
+        """Delete sessions, schedules and rollups of words that no longer exist
+
+        Each table is walked in rowid ranges of ``batch_size``, one short
+        transaction per range.
+
+        Returns:
+            Rows removed per table
+        """
+        removed = {}
+        with self.pool.connection() as conn:
+            for table in WORD_CHILD_TABLES:
+                removed[table] = 0
+                low, high = conn.execute(SELECT_ROWID_RANGE.format(table=table)).fetchone()
+                if low is None:
+                    continue
+                start = low - 1
+                while start < high:
+                    try:
+                        removed[table] += conn.execute(
+                            DELETE_ORPHANS.format(table=table), (start, start + batch_size)).rowcount
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    start += batch_size
+        return removed
+
+    def analyze(self, analysis_limit: int = 1000):
+        """Refresh the query planner statistics
+
+        ``analysis_limit`` caps the rows sampled per index, so this stays
+        quick on large tables.
+        """
+        with self.pool.connection() as conn:
+            conn.execute(f"PRAGMA analysis_limit={int(analysis_limit)}")
+            conn.execute("ANALYZE")
+            conn.commit()
+
+    def space_usage(self) -> Dict[str, int]:
+        """Page counts and on-disk size of the database (including its WAL)"""
+        with self.pool.connection() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        file_bytes = sum(os.path.getsize(path) for path in (self.path, self.path + '-wal')
+                         if os.path.exists(path))
+        return {"page_size": page_size, "page_count": page_count,
+                "free_pages": freelist, "file_bytes": file_bytes}
+
+    def incremental_vacuum(self, pages_per_step: int = 1000) -> Optional[int]:
+        """Return free pages to the file system, ``pages_per_step`` per transaction
+
+        Returns:
+            Pages released, or None if the database was created without
+            incremental auto-vacuum (see enable_incremental_vacuum)
+        """
+        released = 0
+        with self.pool.connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return None
+            while True:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    break
+                # sqlite3's execute() steps a PRAGMA once, which frees a single
+                # page; executescript() runs it to completion
+                conn.executescript(f"PRAGMA incremental_vacuum({min(free, pages_per_step)});")
+                released += free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # Truncation reaches the file once the WAL is checkpointed;
+            # PASSIVE never waits for readers
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        return released
+
+    def enable_incremental_vacuum(self):
+        """Switch an existing database to incremental auto-vacuum
+
+        Rewrites the whole file with VACUUM, blocking writers while it runs;
+        run it once, offline.
+        """
+        with self.pool.connection() as conn:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+
+    def maintain(self, batch_size: int = 5000, vacuum_pages: int = 1000) -> Dict[str, Any]:
+        """Sweep orphans, prune the change log, refresh statistics and reclaim free space, in small steps"""
+        before = self.space_usage()
+        orphans = self.sweep_orphans(batch_size)
+        changes = self.prune_changes(batch_size=batch_size)
+        self.analyze()
+        released = self.incremental_vacuum(vacuum_pages)
+        after = self.space_usage()
+        return {
+            "orphans_removed": orphans,
+            "changes_pruned": changes,
+            "analyzed": True,
+            "incremental_vacuum": released is not None,
+            "pages_released": released or 0,
+            "before": before,
+            "after": after,
+            "reclaimed_bytes": max(0, before["file_bytes"] - after["file_bytes"])
+        }
+
+    # Timestamp migration
+
+    def timestamp_status(self) -> Dict[str, Any]:
+        """Stored timestamp format and the rows still holding ISO text per table"""
+        with self.pool.connection() as conn:
+            state = self._timestamp_format(conn)
+            remaining = {}
+            if state < TIMESTAMPS_EPOCH_MS:
+                for table, columns in TIMESTAMP_COLUMNS:
+                    text = ' OR '.join(f"typeof({column}) = 'text'" for column in columns)
+                    remaining[table] = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {text}").fetchone()[0]
+        names = {TIMESTAMPS_TEXT: 'text', TIMESTAMPS_MIGRATING: 'migrating', TIMESTAMPS_EPOCH_MS: 'epoch_ms'}
+        return {"format": names.get(state, state), "remaining": remaining}
+
+    def backfill_lookup_keys(self, batch_size: int = 1000, recompute: bool = False, log=None) -> int:
+        """Fill in words.lookup_key in ID ranges, one short transaction per batch
+
+        Args:
+            batch_size: Words per transaction
+            recompute: Re-key every word, e.g. after the lemmatizer rules
+                changed, rather than only words without a key
+            log: Optional callable receiving progress messages
+
+        Returns:
+            Words whose key was written
+        """
+        query = SELECT_LOOKUP_KEYS_AFTER if recompute else SELECT_MISSING_LOOKUP_KEYS
+        written = 0
+        last_id = 0
+        with self.pool.connection() as conn:
+            while True:
+                rows = conn.execute(query, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                updates = [(key, row['id']) for row in rows
+                           for key in (lookup_key(row['word']),) if key != row['lookup_key']]
+                if updates:
+                    # Keys are not part of cached records: nothing to drop
+                    with self._words_transaction(conn):
+                        conn.executemany(UPDATE_LOOKUP_KEY, updates)
+                    written += len(updates)
+                if log:
+                    log(f"lookup keys: {written} written, up to word {last_id}")
+        if written and self.replica is not None:
+            # Key updates are not in the change log
+            self.replica.load()
+        return written
+
+    def backfill_phonetic_keys(self, batch_size: int = 1000, recompute: bool = False, log=None) -> int:
+        """Fill in words.phonetic_key and phonetic_alt like backfill_lookup_keys
+
+        Args:
+            batch_size: Words per transaction
+            recompute: Re-key every word, e.g. after the phonetic rules
+                changed, rather than only words without keys
+            log: Optional callable receiving progress messages
+
+        Returns:
+            Words whose keys were written
+        """
+        query = SELECT_PHONETIC_KEYS_AFTER if recompute else SELECT_MISSING_PHONETIC_KEYS
+        written = 0
+        last_id = 0
+        with self.pool.connection() as conn:
+            while True:
+                rows = conn.execute(query, (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                updates = [keys + (row['id'],) for row in rows
+                           for keys in (phonetic_keys(row['word'], row['pronunciation']),)
+                           if keys != (row['phonetic_key'], row['phonetic_alt'])]
+                if updates:
+                    with self._words_transaction(conn):
+                        conn.executemany(UPDATE_PHONETIC_KEYS, updates)
+                    written += len(updates)
+                if log:
+                    log(f"phonetic keys: {written} written, up to word {last_id}")
+        if written and self.replica is not None:
+            self.replica.load()
+        return written
+
+    @_replicated
+    def migrate_timestamps(self, batch_size: int = 10000, log=None) -> Dict[str, Any]:
+        """Convert ISO text timestamps to integer epoch milliseconds in place
+
+        Marks the database as migrating (so every Storage starts writing
+        epoch milliseconds), then converts each table in rowid ranges of
+        ``batch_size``, one short transaction per range, so readers are never
+        blocked and writers only wait for one batch. The rows still holding
+        text are the progress record: an interrupted run is resumed by
+        running it again. The database is marked migrated once no text is
+        left.
+
+        Args:
+            batch_size: Rows per transaction
+            log: Optional callable receiving progress messages
+
+        Returns:
+            Rows converted per table and the final format
+        """
+        converted = {table: 0 for table, _ in TIMESTAMP_COLUMNS}
+        with self.pool.connection() as conn:
+            state = self._timestamp_format(conn)
+            if state >= TIMESTAMPS_EPOCH_MS:
+                return {"format": "epoch_ms", "converted": converted}
+            if state == TIMESTAMPS_TEXT:
+                try:
+                    # The forecast triggers and index of earlier releases only parse text
+                    for statement in DROP_FORECAST_TRIGGERS + [FORECAST_INDEX] + FORECAST_TRIGGERS:
+                        conn.execute(statement)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                self._write_user_version(conn, timestamps=TIMESTAMPS_MIGRATING)
+            while True:
+                for table, columns in TIMESTAMP_COLUMNS:
+                    converted[table] += self._convert_timestamps(conn, table, columns, batch_size, log)
+                # A writer still running an older release may have added text
+                # behind the scan; go round again until none is left
+                leftover = [table for table, columns in TIMESTAMP_COLUMNS if conn.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {table} WHERE "
+                    + ' OR '.join(f"typeof({column}) = 'text'" for column in columns) + ")").fetchone()[0]]
+                if not leftover:
+                    break
+            self._write_user_version(conn, timestamps=TIMESTAMPS_EPOCH_MS)
+        return {"format": "epoch_ms", "converted": converted}
+
+    @staticmethod
+    def _convert_timestamps(conn: sqlite3.Connection, table: str, columns: Tuple[str, ...],
+                            batch_size: int, log=None) -> int:
+        assignments = ', '.join(
+            f"{column} = CASE WHEN typeof({column}) = 'text' THEN {TEXT_TO_EPOCH_MS.format(column)} "
+            f"ELSE {column} END" for column in columns)
+        text = ' OR '.join(f"typeof({column}) = 'text'" for column in columns)
+        update = f"UPDATE {table} SET {assignments} WHERE rowid > ? AND rowid <= ? AND ({text})"
+        low, high = conn.execute(SELECT_ROWID_RANGE.format(table=table)).fetchone()
+        converted = 0
+        if low is None:
+            return converted
+        start = low - 1
+        while start < high:
+            try:
+                converted += conn.execute(update, (start, start + batch_size)).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            start += batch_size
+            if log:
+                log(f"{table}: {converted} rows converted, rowid {min(start, high)}/{high}")
+        return converted
+
+    def get_study_totals(self, word_id: int) -> Dict[str, Any]:
+        """Study count, time, recall sum and first/last study over raw and rolled-up sessions"""
+        with self.pool.connection() as conn:
+            raw = conn.execute(SELECT_SESSION_TOTALS, (word_id,)).fetchone()
+            rolled = conn.execute(SELECT_ROLLUP_TOTALS, (word_id,)).fetchone()
+        firsts = [from_epoch_ms(t) for t in (raw[3], rolled[3]) if t is not None]
+        lasts = [from_epoch_ms(t) for t in (raw[4], rolled[4]) if t is not None]
+        return {
+            "study_count": raw[0] + rolled[0],
+            "total_study_time": raw[1] + rolled[1],
+            "recall_sum": raw[2] + rolled[2],
+            "first_studied": min(firsts) if firsts else None,
+            "last_studied": max(lasts) if lasts else None,
+        }
+
+    def get_rollups(self, word_id: int) -> List[Dict[str, Any]]:
+        """Daily summaries of a word's compacted sessions, newest first"""
+        with self.pool.connection() as conn:
+            return [dict(row) for row in conn.execute(SELECT_ROLLUPS, (word_id,))]
+
+    @_replicated
+    def replace_schedules(self, schedules: Iterable[Tuple]):
+        """Write many review schedules in one transaction
+
+        Args:
+            schedules: Tuples of (word_id, next_review, ease_factor, interval,
+                stability, difficulty, last_review)
+        """
+        with self.pool.connection() as conn:
+            encode = self._encoder(conn)
+            schedules = ((word_id, encode(next_review), ease, interval, stability, difficulty, encode(last_review))
+                         for word_id, next_review, ease, interval, stability, difficulty, last_review in schedules)
+            try:
+                conn.executemany(UPSERT_SCHEDULE, schedules)
+                conn.execute(INVALIDATE_PLAN)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def get_review_forecast(self, today: str, days: int) -> Dict[str, Any]:
+        """Reviews due per day for ``days`` days starting at ``today``
+
+        Reads the per-day counters, so the cost depends on ``days`` rather
+        than on the number of scheduled words.
+
+        Args:
+            today: First day as YYYY-MM-DD
+            days: Number of days
+
+        Returns:
+            Dict with ``overdue`` (due before today) and ``days``, a list of
+            {"date", "due"} with zero-count days included
+        """
+        start = datetime.strptime(today, '%Y-%m-%d').date()
+        end = start + timedelta(days=days)
+        with self.pool.connection() as conn:
+            counts = dict(conn.execute(SELECT_FORECAST, (start.isoformat(), end.isoformat())).fetchall())
+            overdue = conn.execute(SELECT_OVERDUE, (start.isoformat(),)).fetchone()[0]
+        calendar = []
+        for offset in range(days):
+            day = (start + timedelta(days=offset)).isoformat()
+            calendar.append({"date": day, "due": counts.get(day, 0)})
+        return {"overdue": overdue, "days": calendar}
+
+    def rebuild_review_forecast(self) -> int:
+        """Recount review_forecast from review_schedule; returns the number of days"""
+        with self.pool.connection() as conn:
+            try:
+                for statement in REBUILD_FORECAST:
+                    conn.execute(statement)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return conn.execute("SELECT COUNT(*) FROM review_forecast").fetchone()[0]
+
+    def get_learning_progress(self, today: str, days: int = 30, pass_score: int = 3) -> Dict[str, Any]:
+        """Overview of the learner's progress, from the progress counters
+
+        Reads a handful of counters and one row per day, so the cost
+        depends on ``days`` rather than on the size of the vocabulary or
+        study history.
+
+        Args:
+            today: Last day reported, YYYY-MM-DD (UTC)
+            days: Number of days ending with ``today``
+            pass_score: Lowest recall counted as recalled
+
+        Returns:
+            ``total_words``; ``buckets``: words never studied ("new") and
+            scheduled words by interval ("learning" below YOUNG_INTERVAL
+            days, "young", "mature" from MATURE_INTERVAL days); and ``days``,
+            a list of {"date", "reviews", "average_recall", "recall_rate",
+            "study_time", "words_added"} oldest first, with zero-count days
+            included (averages None without reviews)
+        """
+        end = datetime.strptime(today, '%Y-%m-%d').date()
+        start = end - timedelta(days=days - 1)
+        with self.pool.connection() as conn:
+            counts = dict(conn.execute(SELECT_PROGRESS_COUNTS).fetchall())
+            rows = {row['day']: row for row in conn.execute(SELECT_PROGRESS_DAYS, (start.isoformat(), today))}
+        buckets = {bucket: counts.get(bucket, 0) for bucket in INTERVAL_BUCKETS}
+        total = counts.get('words', 0)
+        calendar = []
+        for offset in range(days):
+            day = (start + timedelta(days=offset)).isoformat()
+            row = rows.get(day)
+            reviews = row['reviews'] if row else 0
+            recalls = [row[f'recall_{score}'] for score in range(1, 6)] if row else [0] * 5
+            calendar.append({
+                "date": day,
+                "reviews": reviews,
+                "average_recall": round(sum(score * n for score, n in enumerate(recalls, 1)) / reviews, 2)
+                if reviews else None,
+                "recall_rate": round(sum(recalls[max(pass_score, 1) - 1:]) / reviews, 3) if reviews else None,
+                "study_time": row['study_time'] if row else 0,
+                "words_added": row['words_added'] if row else 0,
+            })
+        return {
+            "total_words": total,
+            "buckets": dict(new=max(total - sum(buckets.values()), 0), **buckets),
+            "days": calendar,
+        }
+
+    def rebuild_progress(self) -> int:
+        """Recount the progress counters from words, schedules and study history; returns the number of days"""
+        with self.pool.connection() as conn:
+            try:
+                for statement in REBUILD_PROGRESS:
+                    conn.execute(statement)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            return conn.execute("SELECT COUNT(*) FROM progress_daily").fetchone()[0]
+
+    def get_scheduler_params(self, name: str) -> Optional[Dict[str, Any]]:
+        """Get fitted scheduler parameters by scheduler name, or None"""
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_SCHEDULER_PARAMS, (name,)).fetchone()
+        if not row:
+            return None
+        return {
+            "params": json.loads(row['params']),
+            "metrics": json.loads(row['metrics']) if row['metrics'] else None,
+            "fitted_at": row['fitted_at']
+        }
+
+    def get_scheduler_params_fitted_at(self, name: str) -> Optional[str]:
+        """When scheduler parameters were last saved, or None if never"""
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_SCHEDULER_FITTED_AT, (name,)).fetchone()
+        return row[0] if row else None
+
+    def save_scheduler_params(self, name: str, params: Any, metrics: Optional[Dict[str, Any]] = None):
+        """Store fitted scheduler parameters, replacing earlier ones"""
+        with self.pool.connection() as conn:
+            conn.execute(UPSERT_SCHEDULER_PARAMS, (
+                name, json.dumps(params), json.dumps(metrics) if metrics is not None else None,
+                format_timestamp(datetime.utcnow())))
+            conn.commit()
+
+    def get_sessions(self, word_id: int) -> List[Dict[str, Any]]:
+        """Study sessions of a word, newest first"""
+        with self.pool.connection() as conn:
+            query = (SELECT_SESSIONS_MIXED if self._timestamp_format(conn) == TIMESTAMPS_MIGRATING
+                     else SELECT_SESSIONS)
+            return [decode_timestamps(dict(row), ('studied_at',))
+                    for row in conn.execute(query, (word_id,))]
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_storage(path: Optional[str] = None, **kwargs) -> Storage:
+    """Return the process-wide Storage for a database path"""
+    path = os.path.abspath(path or DB_PATH)
+    with _instances_lock:
+        store = _instances.get(path)
+        if store is None:
+            store = _instances[path] = Storage(path, **kwargs)
+        return store
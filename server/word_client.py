@@ -0,0 +1,518 @@
+"""Python client for the English Word Learning REST API
+
+Three ways to talk to the Flask API (``run.py`` / ``serve.py``):
+
+- ``WordClient``: synchronous, on a pooled ``requests.Session`` (keep-alive
+  connections) with timeouts and retries with exponential backoff
+- ``AsyncWordClient``: asyncio on ``aiohttp``, running many calls
+  concurrently over a bounded connection pool
+- ``BatchWriter``: queues word saves and review results and sends them as
+  ``/api/words/batch`` and ``/api/learning/study/batch`` requests
+
+Every method returns the decoded response (or the part of it named in its
+docstring) and raises ``WordAPIError`` when the API reports an error or
+cannot be reached after retrying.
+
+    with WordClient('http://localhost:5000') as client:
+        word = client.save_word('example', translations=['例子'])
+        client.record_study(word['id'], study_time=30, recall=4)
+
+Retries: requests that failed to connect are retried for every method,
+since the server never saw them. Timeouts, dropped connections and 429/502/
+503/504 responses are retried only for GET, PUT and DELETE. Retrying a POST
+after the server may have handled it could record a review twice.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = os.environ.get('WORDS_API_URL', 'http://localhost:5000')
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 30.0)
+DEFAULT_RETRIES = 3
+# Retry n waits backoff * 2 ** (n - 1) seconds
+DEFAULT_BACKOFF = 0.2
+DEFAULT_POOL_SIZE = 10
+
+# Statuses that mean "try again later"
+RETRY_STATUSES = (429, 502, 503, 504)
+# Methods safe to repeat after the server may have processed them
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+# Items per batch request; the server accepts up to WORDS_MAX_BATCH (1000)
+DEFAULT_BATCH_SIZE = 500
+
+
+class WordAPIError(Exception):
+    """An error response from the API, or no response at all (status None)"""
+
+    def __init__(self, message: str, status: Optional[int] = None,
+                 payload: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.status = status
+        self.payload = payload or {}
+
+
+class _Call(NamedTuple):
+    """One API request and the key of the response to return"""
+    method: str
+    path: str
+    json: Any = None
+    params: Optional[Dict[str, Any]] = None
+    result: Optional[str] = None
+
+
+def _word_body(word: str, pronunciation: str = '', translations: Iterable[str] = (),
+               definitions: Iterable[str] = (), examples: Iterable[str] = (), notes: str = '') -> Dict[str, Any]:
+    return {
+        "word": word,
+        "pronunciation": pronunciation,
+        "translations": list(translations),
+        "definitions": list(definitions),
+        "examples": list(examples),
+        "notes": notes,
+    }
+
+
+def _conflict_params(on_conflict: str) -> Optional[Dict[str, Any]]:
+    return None if on_conflict == 'error' else {"on_conflict": on_conflict}
+
+
+def _review_body(word_id: int, study_time: int, recall: int, studied_at: Any = None) -> Dict[str, Any]:
+    body = {"word_id": word_id, "study_time": study_time, "recall": recall}
+    if studied_at is not None:
+        body["studied_at"] = studied_at.isoformat() if isinstance(studied_at, datetime) else studied_at
+    return body
+
+
+class _Calls:
+    """Request builders shared by the sync and async clients"""
+
+    @staticmethod
+    def save_word(*args, on_conflict: str = 'error', **kwargs) -> _Call:
+        return _Call('POST', '/api/words/', _word_body(*args, **kwargs),
+                     params=_conflict_params(on_conflict), result='word')
+
+    @staticmethod
+    def save_words(words: List[Dict[str, Any]], on_conflict: str = 'error') -> _Call:
+        return _Call('POST', '/api/words/batch', {"words": [_word_body(**word) for word in words]},
+                     params=_conflict_params(on_conflict))
+
+    @staticmethod
+    def get_word(word_id: int) -> _Call:
+        return _Call('GET', f'/api/words/{word_id}', result='word')
+
+    @staticmethod
+    def find_word(text: str) -> _Call:
+        return _Call('GET', '/api/words/search', params={"word": text}, result='word')
+
+    @staticmethod
+    def get_all_words() -> _Call:
+        return _Call('GET', '/api/words/', result='words')
+
+    @staticmethod
+    def update_word(word_id: int, field: str, value: Any) -> _Call:
+        return _Call('PUT', f'/api/words/{word_id}', {"fieldToUpdate": field, "newValue": value}, result='word')
+
+    @staticmethod
+    def patch_word(word_id: int, changes: Dict[str, Any], expected_updated_at: Optional[str] = None) -> _Call:
+        body = {"changes": changes}
+        if expected_updated_at is not None:
+            body["expected_updated_at"] = expected_updated_at
+        return _Call('PATCH', f'/api/words/{word_id}', body)
+
+    @staticmethod
+    def record_study(*args, **kwargs) -> _Call:
+        return _Call('POST', '/api/learning/study', _review_body(*args, **kwargs))
+
+    @staticmethod
+    def record_studies(reviews: List[Dict[str, Any]]) -> _Call:
+        return _Call('POST', '/api/learning/study/batch', {"reviews": [_review_body(**review) for review in reviews]})
+
+    @staticmethod
+    def get_review_words(count: int) -> _Call:
+        return _Call('GET', '/api/learning/review', params={"count": count}, result='words')
+
+    @staticmethod
+    def get_forecast(days: int) -> _Call:
+        return _Call('GET', '/api/learning/forecast', params={"days": days})
+
+
+def _result(call: _Call, status: int, payload: Any) -> Any:
+    """Unwrap a decoded response, raising WordAPIError for errors"""
+    if not isinstance(payload, dict):
+        raise WordAPIError(f"Unexpected response ({status})", status)
+    if status >= 400 or payload.get('status') == 'error':
+        raise WordAPIError(payload.get('message', f"HTTP {status}"), status, payload)
+    return payload[call.result] if call.result else payload
+
+
+def _chunks(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _merge_saved(responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the responses of a word batch split into several requests"""
+    merged = {"saved": {}, "updated": {}, "skipped": []}
+    for response in responses:
+        merged["saved"].update(response["saved"])
+        merged["updated"].update(response.get("updated", {}))
+        merged["skipped"].extend(response["skipped"])
+    return merged
+
+
+def _merge_recorded(responses: List[Dict[str, Any]], chunk_size: int) -> Dict[str, Any]:
+    """Combine the responses of a review batch split into chunk_size requests"""
+    merged = {"recorded": 0, "results": [], "errors": []}
+    for chunk, response in enumerate(responses):
+        merged["recorded"] += response["recorded"]
+        merged["results"].extend(response["results"])
+        # Error indexes refer to the whole list, not the chunk
+        merged["errors"].extend(dict(error, index=error["index"] + chunk * chunk_size)
+                                for error in response["errors"])
+    return merged
+
+
+class WordClient:
+    """Synchronous client with pooled keep-alive connections and retries
+
+    Thread-safe: share one client between threads, with ``pool_size`` at
+    least the number of threads.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, learner_id: Optional[str] = None,
+                 timeout=DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 pool_size: int = DEFAULT_POOL_SIZE, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.learner_id = learner_id
+        self.timeout = timeout
+        self.batch_size = batch_size
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=IDEMPOTENT_METHODS, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _call(self, call: _Call) -> Any:
+        params = dict(call.params or {})
+        if self.learner_id is not None:
+            params['learner_id'] = self.learner_id
+        try:
+            response = self.session.request(call.method, self.base_url + call.path, json=call.json,
+                                            params=params or None, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise WordAPIError(f"{call.method} {call.path} failed: {e}") from e
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        return _result(call, response.status_code, payload)
+
+    # Words
+
+    def save_word(self, word: str, pronunciation: str = '', translations: Iterable[str] = (),
+                  definitions: Iterable[str] = (), examples: Iterable[str] = (), notes: str = '',
+                  on_conflict: str = 'error') -> Dict[str, Any]:
+        """Save a word; returns the stored word
+
+        An existing word is an error (409) unless on_conflict is 'merge' or
+        'replace'.
+        """
+        return self._call(_Calls.save_word(word, pronunciation, translations, definitions, examples, notes,
+                                           on_conflict=on_conflict))
+
+    def save_words(self, words: List[Dict[str, Any]], on_conflict: str = 'error') -> Dict[str, Any]:
+        """Save many words (dicts of save_word arguments) in batch requests
+
+        Returns ``saved`` (new word text -> ID), ``updated`` (merged or
+        replaced text -> ID) and ``skipped`` (texts already stored).
+        """
+        return _merge_saved([self._call(_Calls.save_words(chunk, on_conflict))
+                             for chunk in _chunks(words, self.batch_size)])
+
+    def get_word(self, word_id: int) -> Dict[str, Any]:
+        """Get a word by ID"""
+        return self._call(_Calls.get_word(word_id))
+
+    def find_word(self, text: str) -> Dict[str, Any]:
+        """Get a word by its text"""
+        return self._call(_Calls.find_word(text))
+
+    def get_all_words(self) -> List[Dict[str, Any]]:
+        """Get every word"""
+        return self._call(_Calls.get_all_words())
+
+    def update_word(self, word_id: int, field: str, value: Any) -> Dict[str, Any]:
+        """Update one field of a word; returns the updated word"""
+        return self._call(_Calls.update_word(word_id, field, value))
+
+    def patch_word(self, word_id: int, changes: Dict[str, Any],
+                   expected_updated_at: Optional[str] = None) -> Dict[str, Any]:
+        """Update several fields at once; returns ``updated_at`` and the ``changed`` fields
+
+        With expected_updated_at (the word's updated_at when read), a word
+        changed since is an error (409) instead of being overwritten.
+        """
+        return self._call(_Calls.patch_word(word_id, changes, expected_updated_at))
+
+    # Learning progress
+
+    def record_study(self, word_id: int, study_time: int, recall: int, studied_at: Any = None) -> Dict[str, Any]:
+        """Record a review; returns the word's new schedule"""
+        return self._call(_Calls.record_study(word_id, study_time, recall, studied_at))
+
+    def record_studies(self, reviews: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Record many reviews (dicts of record_study arguments) in batch requests
+
+        Returns ``recorded``, per-review ``results`` and ``errors`` for
+        reviews of unknown words.
+        """
+        return _merge_recorded([self._call(_Calls.record_studies(chunk))
+                                for chunk in _chunks(reviews, self.batch_size)], self.batch_size)
+
+    def get_review_words(self, count: int = 10) -> List[Dict[str, Any]]:
+        """Words to review next"""
+        return self._call(_Calls.get_review_words(count))
+
+    def get_forecast(self, days: int = 7) -> Dict[str, Any]:
+        """Reviews due on each upcoming day (``overdue`` and ``days``)"""
+        return self._call(_Calls.get_forecast(days))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncWordClient:
+    """asyncio client running many calls concurrently (requires aiohttp)
+
+    Start any number of calls with ``asyncio.gather``. At most
+    ``concurrency`` are in flight at once, on as many pooled connections.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, learner_id: Optional[str] = None,
+                 timeout=DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 concurrency: int = 32, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.learner_id = learner_id
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self._session = None
+        self._slots = None
+
+    async def _open(self):
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError("AsyncWordClient requires aiohttp (pip install aiohttp)") from e
+        connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read))
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def _call(self, call: _Call) -> Any:
+        import aiohttp
+
+        if self._session is None:
+            await self._open()
+        params = dict(call.params or {})
+        if self.learner_id is not None:
+            params['learner_id'] = self.learner_id
+        idempotent = call.method in IDEMPOTENT_METHODS
+        attempt = 0
+        async with self._slots:
+            while True:
+                try:
+                    async with self._session.request(call.method, self.base_url + call.path, json=call.json,
+                                                     params=params or None) as response:
+                        if not (idempotent and response.status in RETRY_STATUSES and attempt < self.retries):
+                            try:
+                                payload = await response.json(content_type=None)
+                            except ValueError:
+                                payload = None
+                            return _result(call, response.status, payload)
+                except aiohttp.ClientConnectorError as e:
+                    # Never reached the server: safe to retry any method
+                    if attempt >= self.retries:
+                        raise WordAPIError(f"{call.method} {call.path} failed: {e}") from e
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not idempotent or attempt >= self.retries:
+                        raise WordAPIError(f"{call.method} {call.path} failed: {e!r}") from e
+                attempt += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (0.5 + random.random() / 2))
+
+    # Words
+
+    async def save_word(self, word: str, pronunciation: str = '', translations: Iterable[str] = (),
+                        definitions: Iterable[str] = (), examples: Iterable[str] = (),
+                        notes: str = '', on_conflict: str = 'error') -> Dict[str, Any]:
+        """Save a word; returns the stored word (see WordClient.save_word)"""
+        return await self._call(_Calls.save_word(word, pronunciation, translations, definitions, examples, notes,
+                                                 on_conflict=on_conflict))
+
+    async def save_words(self, words: List[Dict[str, Any]], on_conflict: str = 'error') -> Dict[str, Any]:
+        """Save many words in batch requests sent concurrently; see WordClient.save_words"""
+        responses = await asyncio.gather(*(self._call(_Calls.save_words(chunk, on_conflict))
+                                           for chunk in _chunks(words, self.batch_size)))
+        return _merge_saved(list(responses))
+
+    async def get_word(self, word_id: int) -> Dict[str, Any]:
+        """Get a word by ID"""
+        return await self._call(_Calls.get_word(word_id))
+
+    async def find_word(self, text: str) -> Dict[str, Any]:
+        """Get a word by its text"""
+        return await self._call(_Calls.find_word(text))
+
+    async def get_all_words(self) -> List[Dict[str, Any]]:
+        """Get every word"""
+        return await self._call(_Calls.get_all_words())
+
+    async def update_word(self, word_id: int, field: str, value: Any) -> Dict[str, Any]:
+        """Update one field of a word; returns the updated word"""
+        return await self._call(_Calls.update_word(word_id, field, value))
+
+    async def patch_word(self, word_id: int, changes: Dict[str, Any],
+                         expected_updated_at: Optional[str] = None) -> Dict[str, Any]:
+        """Update several fields at once; see WordClient.patch_word"""
+        return await self._call(_Calls.patch_word(word_id, changes, expected_updated_at))
+
+    # Learning progress
+
+    async def record_study(self, word_id: int, study_time: int, recall: int,
+                           studied_at: Any = None) -> Dict[str, Any]:
+        """Record a review; returns the word's new schedule"""
+        return await self._call(_Calls.record_study(word_id, study_time, recall, studied_at))
+
+    async def record_studies(self, reviews: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Record many reviews in batch requests; see WordClient.record_studies
+
+        Chunks are sent one after another, so repeated reviews of a word are
+        applied in order.
+        """
+        responses = []
+        for chunk in _chunks(reviews, self.batch_size):
+            responses.append(await self._call(_Calls.record_studies(chunk)))
+        return _merge_recorded(responses, self.batch_size)
+
+    async def get_review_words(self, count: int = 10) -> List[Dict[str, Any]]:
+        """Words to review next"""
+        return await self._call(_Calls.get_review_words(count))
+
+    async def get_forecast(self, days: int = 7) -> Dict[str, Any]:
+        """Reviews due on each upcoming day (``overdue`` and ``days``)"""
+        return await self._call(_Calls.get_forecast(days))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class BatchWriter:
+    """Queue word saves and review results, sending them in batch requests
+
+    A queue is sent when it holds ``batch_size`` items, when an item is
+    added more than ``max_delay`` seconds after the oldest pending one, on
+    ``flush()``, and when the ``with`` block exits. Pending words are always
+    sent before pending reviews. Reviews are stamped with the time they were
+    queued, so a late flush does not shift the schedule.
+
+    Queues are sent in requests of ``client.batch_size`` items, and each
+    request's items leave the queue as soon as it succeeds. After a
+    WordAPIError, calling ``flush()`` again resends only the items that were
+    not recorded. The exception is a request whose response was lost after
+    the server committed it (status None).
+
+        with BatchWriter(client) as batch:
+            for review in session_results:
+                batch.record_study(**review)
+        print(batch.totals)
+    """
+
+    def __init__(self, client: WordClient, batch_size: int = 100, max_delay: float = 1.0):
+        self.client = client
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.totals = {"saved": 0, "skipped": 0, "recorded": 0, "errors": []}
+        self._words = []
+        self._reviews = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def save_word(self, word: str, pronunciation: str = '', translations: Iterable[str] = (),
+                  definitions: Iterable[str] = (), examples: Iterable[str] = (), notes: str = ''):
+        """Queue a word to save"""
+        self._add(self._words, {"word": word, "pronunciation": pronunciation, "translations": translations,
+                                "definitions": definitions, "examples": examples, "notes": notes})
+
+    def record_study(self, word_id: int, study_time: int, recall: int, studied_at: Any = None):
+        """Queue a review result"""
+        self._add(self._reviews, {"word_id": word_id, "study_time": study_time, "recall": recall,
+                                  "studied_at": studied_at or datetime.utcnow()})
+
+    def _add(self, queue: List[Dict[str, Any]], item: Dict[str, Any]):
+        with self._lock:
+            now = time.monotonic()
+            if self._oldest is None:
+                self._oldest = now
+            queue.append(item)
+            if len(queue) >= self.batch_size or now - self._oldest >= self.max_delay:
+                self._flush()
+
+    def flush(self) -> Dict[str, Any]:
+        """Send everything pending; returns the running totals"""
+        with self._lock:
+            self._flush()
+            return self.totals
+
+    def _flush(self):
+        # One request at a time, dropping each chunk once it is stored, so a
+        # failure part way through never resends what was already recorded
+        while self._words:
+            chunk = self._words[:self.client.batch_size]
+            result = self.client.save_words(chunk)
+            del self._words[:len(chunk)]
+            self.totals["saved"] += len(result["saved"])
+            self.totals["skipped"] += len(result["skipped"])
+        while self._reviews:
+            chunk = self._reviews[:self.client.batch_size]
+            result = self.client.record_studies(chunk)
+            del self._reviews[:len(chunk)]
+            self.totals["recorded"] += result["recorded"]
+            self.totals["errors"].extend(result["errors"])
+        self._oldest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.flush()
@@ -0,0 +1,261 @@
+"""Write-behind logging of study sessions
+
+In write-behind mode trackWordStudy computes the new schedule from memory
+and returns without waiting for SQLite. ``WriteBehindLog.record`` appends
+the review to a spill file (once it is there, a crash of the server does
+not lose it), remembers the word's new schedule so the next review of the
+word builds on it, and queues the review. A background thread stores queued
+reviews with ``Storage.record_studies``, many per transaction (group
+commit), as soon as ``batch_size`` are waiting or ``interval`` seconds after
+the first one arrived, and then deletes the spill segment they came from.
+
+Spill segments live in ``<database>-studylog/``: JSON lines, one segment per
+batch and process, each locked (flock) by the process writing it and named
+after the process and a random run ID, so a restarted server that gets the
+same PID never appends to (and deletes) a segment left for recovery. On
+start the segments no live process holds are replayed, skipping reviews
+already in study_sessions (a crash between a commit and deleting its
+segment). A batch that cannot be stored stays in its segment for the next
+start; the writer thread goes on with the following batches.
+
+Reads (getNextReviewWords, getWordStats, the Flask API) see a review once
+its batch is committed, at most ``interval`` seconds later.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import Storage
+
+WRITE_BEHIND = os.environ.get('WORDS_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+
+# Reviews per group commit, and seconds a review waits for its batch to fill
+BATCH_SIZE = int(os.environ.get('WORDS_WRITE_BEHIND_BATCH', 256))
+FLUSH_INTERVAL = int(os.environ.get('WORDS_WRITE_BEHIND_INTERVAL_MS', 200)) / 1000
+
+# Reviews queued or being written before record() blocks
+MAX_PENDING = int(os.environ.get('WORDS_WRITE_BEHIND_MAX_PENDING', 10000))
+
+# fsync every spill write: survives power loss, not just a crash of the server
+FSYNC = os.environ.get('WORDS_WRITE_BEHIND_FSYNC', '').lower() in ('1', 'true', 'yes')
+
+# Attempts at storing a batch before its segment is left for the next start
+WRITE_ATTEMPTS = 3
+
+
+def _warn(message: str):
+    print(f"write-behind: {message}", file=sys.stderr)
+
+
+class WriteBehindLog:
+    """Queue of acknowledged study reviews, stored in the background in group commits"""
+
+    def __init__(self, store: Storage, directory: Optional[str] = None, batch_size: int = BATCH_SIZE,
+                 interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING, fsync: bool = FSYNC):
+        self.store = store
+        self.directory = directory or f"{store.path}-studylog"
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.fsync = fsync
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[Tuple, Dict[str, Any]]] = []
+        self._first_pending = 0.0
+        # Reviews queued or being written; record() blocks at max_pending
+        self._queued = 0
+        # Newest schedule of words with reviews not yet committed
+        self._schedules: Dict[int, Dict[str, Any]] = {}
+        self._run_id = uuid.uuid4().hex
+        self._sequence = 0
+        self._closed = False
+        self._flush_requested = False
+        self.stats = {'recorded': 0, 'committed': 0, 'batches': 0, 'dropped': 0, 'recovered': 0}
+        self.stats['recovered'] = self._recover()
+
+        self._segment = self._new_segment()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def schedule(self, word_id: int) -> Optional[Dict[str, Any]]:
+        """The word's schedule after its newest review still waiting to be written, or None"""
+        with self._cond:
+            return self._schedules.get(word_id)
+
+    def record(self, review: Tuple, schedule: Dict[str, Any]):
+        """Acknowledge a review: returns once it is in the spill file
+
+        Args:
+            review: Tuple as for Storage.record_studies, timestamps as ISO strings
+            schedule: The word's schedule after this review, as Storage.get_schedule
+                returns it; served by schedule() until the review is written
+        """
+        line = json.dumps(list(review)) + '\n'
+        with self._cond:
+            while self._queued >= self.max_pending and not self._closed and self._thread.is_alive():
+                self._cond.wait(self.interval)
+            if self._closed:
+                raise RuntimeError("write-behind log is closed")
+            if not self._thread.is_alive():
+                raise RuntimeError("write-behind writer thread has stopped")
+            self._segment.write(line)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            if not self._pending:
+                self._first_pending = time.monotonic()
+            self._pending.append((tuple(review), schedule))
+            self._schedules[review[0]] = schedule
+            self._queued += 1
+            self.stats['recorded'] += 1
+            self._cond.notify_all()
+
+    def flush(self):
+        """Write everything queued so far and wait until it is committed"""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._queued and self._thread.is_alive():
+                self._cond.wait()
+
+    def close(self):
+        """Write what is queued and stop the writer thread"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+
+    def _new_segment(self):
+        self._sequence += 1
+        path = os.path.join(self.directory, f"{os.getpid()}-{self._run_id}-{self._sequence}.jsonl")
+        # 'x': never reuse a file, even if the name came up again
+        segment = open(path, 'x', encoding='utf-8')
+        fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return segment
+
+    def _take_batch(self):
+        """Wait for a batch to fill (or time out); returns it with its segment"""
+        with self._cond:
+            while True:
+                if self._pending:
+                    waited = time.monotonic() - self._first_pending
+                    if (len(self._pending) >= self.batch_size or waited >= self.interval
+                            or self._flush_requested or self._closed):
+                        break
+                    self._cond.wait(self.interval - waited)
+                elif self._closed:
+                    return None, None
+                else:
+                    self._flush_requested = False
+                    self._cond.wait()
+            # The segment holds exactly the reviews of this batch; later
+            # ones go to a new segment (none are accepted once closed)
+            batch, segment = self._pending, self._segment
+            self._segment = None if self._closed else self._new_segment()
+            self._pending = []
+            return batch, segment
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    batch, segment = self._take_batch()
+                except Exception as e:
+                    # No new segment: the batch stays queued for the next try
+                    _warn(f"opening a spill segment failed: {e}")
+                    time.sleep(self.interval)
+                    continue
+                if batch is None:
+                    if self._segment is not None:
+                        self._discard(self._segment)
+                    return
+                try:
+                    if self._write([review for review, _ in batch]):
+                        self._discard(segment)
+                except Exception as e:
+                    # Reviews stored before the failure are skipped on replay
+                    _warn(f"left {len(batch)} reviews in the spill file for the next start: {e}")
+                finally:
+                    segment.close()
+                    with self._cond:
+                        for review, schedule in batch:
+                            # Later reviews of the word may still be queued
+                            if self._schedules.get(review[0]) is schedule:
+                                del self._schedules[review[0]]
+                        self._queued -= len(batch)
+                        self.stats['batches'] += 1
+                        self._cond.notify_all()
+        finally:
+            # Wake record() and flush() callers if the thread stops for good
+            with self._cond:
+                self._cond.notify_all()
+
+    @staticmethod
+    def _discard(segment):
+        """Delete a stored segment; one left behind is replayed (as duplicates, skipped) later"""
+        try:
+            os.remove(segment.name)
+        except OSError as e:
+            _warn(f"could not delete {segment.name}: {e}")
+        segment.close()
+
+    def _write(self, reviews: List[Tuple]) -> bool:
+        """Store reviews in one transaction; False leaves them in their segment"""
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                self.store.record_studies(reviews)
+                self.stats['committed'] += len(reviews)
+                return True
+            except sqlite3.IntegrityError:
+                # A word deleted after its review was acknowledged fails the
+                # whole batch: store the others one by one
+                for review in reviews:
+                    try:
+                        self.store.record_studies([review])
+                        self.stats['committed'] += 1
+                    except sqlite3.IntegrityError as e:
+                        self.stats['dropped'] += 1
+                        _warn(f"dropped review of word {review[0]}: {e}")
+                return True
+            except Exception as e:
+                _warn(f"storing {len(reviews)} reviews failed (attempt {attempt + 1}): {e}")
+                time.sleep(self.interval * (attempt + 1))
+        _warn(f"left {len(reviews)} reviews in the spill file for the next start")
+        return False
+
+    def _recover(self) -> int:
+        """Replay segments left by processes that stopped; returns reviews stored"""
+        recovered = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.jsonl')), key=os.path.getmtime):
+            with open(path, 'r', encoding='utf-8') as segment:
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue   # a live process is writing it
+                reviews = []
+                for line in segment:
+                    try:
+                        reviews.append(tuple(json.loads(line)))
+                    except ValueError:
+                        break  # torn last line of a crash: never acknowledged
+                reviews = self.store.unrecorded_studies(reviews)
+                if reviews and not self._write(reviews):
+                    continue
+                recovered += len(reviews)
+                os.remove(path)
+        if recovered:
+            _warn(f"recovered {recovered} reviews from {self.directory}")
+        return recovered